@@ -1,30 +1,28 @@
 import os
-import re
-import json
+import asyncio
 from datetime import datetime
 from bson import ObjectId
 from dotenv import load_dotenv
-import google.generativeai as genai
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from db.mongodb import lost_collection, found_collection, matches_collection, notifications_collection
-from config.gemini import GEMINI_API_URL
+from db.mongodb import (
+    lost_collection, found_collection, matches_collection, notifications_collection, sync_state_collection,
+)
+from .index import CandidateIndex
+from .cache import match_cache
+from .matchers import matcher
+from cure.mail_queue import enqueue_email
+from cure.jobs import jobs
+from cure.unread import unread
+from cure.metrics import matching_run_seconds
 
 BATCH_SIZE = 5
 
-load_dotenv()
+# Matches scoring above this are notified
+MATCH_SCORE_THRESHOLD = 0.60
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("SMTP_EMAIL"),
-    MAIL_PASSWORD=os.getenv("SMTP_PASSWORD"),
-    MAIL_FROM=os.getenv("SMTP_EMAIL"),
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_PORT=465,
-    MAIL_STARTTLS=False,   # REQUIRED (new)
-    MAIL_SSL_TLS=True,     # REQUIRED (new)
-    USE_CREDENTIALS=True,
-)
+# Only the top-K found posts ranked by the local index are sent to Gemini
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "10"))
 
-mail_client = FastMail(conf)
+load_dotenv()
 
 # Helper: Convert ObjectId to string recursively
 def convert_objectid(obj):
@@ -36,64 +34,77 @@ def convert_objectid(obj):
         return str(obj)
     return obj
 
-# Fetch posts from DB
-async def fetch_all_lost_posts():
-    return [doc async for doc in lost_collection.find({})]
-
-async def fetch_all_found_posts():
-    return [doc async for doc in found_collection.find({})]
-
-# Call Google Gemini API to get matches
-async def send_to_gemini(payload: dict):
-    try:
-        genai.configure(api_key=GEMINI_API_URL)
-        model = genai.GenerativeModel("gemini-2.5-flash")
-
-        json_template = """
-        {
-          "matches": [
-            {
-              "found_post_id": "string",
-              "user_email": "string",
-              "score": 0.85
-            }
-          ]
-        }
-        """
+# Bookkeeping on the working copies; it says nothing about the item and
+# (matched_at is a datetime) would not serialize into the prompt
+PROMPT_EXCLUDED_FIELDS = ("id", "matched_at", "is_solved")
 
-        prompt = f"""
-            You are a lost-and-found matching AI.
+def prompt_post(post):
+    """The post as the matcher sees it: its content, with ObjectIds as strings."""
+    return convert_objectid({k: v for k, v in post.items() if k not in PROMPT_EXCLUDED_FIELDS})
 
-            Compare the LOST post with FOUND posts and return matches in JSON.
-
-            LOST POST:
-            {json.dumps(payload['lost_post'], indent=2)}
-
-            FOUND POSTS:
-            {json.dumps(payload['found_posts'], indent=2)}
-
-            Return ONLY valid JSON in this format:
-            {json_template}
-        """
-
-        response = model.generate_content(prompt)
-
-        raw_text = response.text
-        clean_text = re.sub(r"```json|```", "", raw_text).strip()
-
-        matches_data = json.loads(clean_text)
-
-        return matches_data
+# Fetch posts from DB
+OPEN_POSTS = {"is_solved": {"$ne": True}}
+
+async def fetch_new_posts(collection):
+    """Posts that have never been through a matching run."""
+    query = {**OPEN_POSTS, "matched_at": {"$exists": False}}
+    return [doc async for doc in collection.find(query)]
+
+MATCHED_AT_BACKFILL_ID = "matched_at_backfill"
+
+async def backfill_matched_at():
+    """
+    One-off for data from before `matched_at`, when every run rescanned
+    both collections and skipped lost posts that had a matches document.
+    Those lost posts, and the found posts older than the last matches
+    document (already compared with them), are marked as matched so the
+    first incremental run does not score and notify them again. Recorded
+    in sync_state, so it runs once per deployment.
+    """
+    if await sync_state_collection.find_one({"_id": MATCHED_AT_BACKFILL_ID}):
+        return
+
+    now = datetime.utcnow()
+    matched_lost_ids = await matches_collection.distinct("lost_post_id")
+    lost = await lost_collection.update_many(
+        {"matched_at": {"$exists": False}, "id": {"$in": matched_lost_ids}},
+        {"$set": {"matched_at": now}}
+    )
 
-    except Exception as e:
-        print(f"Gemini SDK error: {e}")
-        return None
+    found_modified = 0
+    last_match = await matches_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if last_match:
+        found = await found_collection.update_many(
+            {"matched_at": {"$exists": False}, "_id": {"$lt": last_match["_id"]}},
+            {"$set": {"matched_at": now}}
+        )
+        found_modified = found.modified_count
+
+    await sync_state_collection.update_one(
+        {"_id": MATCHED_AT_BACKFILL_ID},
+        {"$set": {"lost": lost.modified_count, "found": found_modified, "done_at": now}},
+        upsert=True
+    )
+    print(f"Backfilled matched_at on {lost.modified_count} lost and {found_modified} found posts")
+
+async def mark_matched(collection, posts):
+    if not posts:
+        return
+    await collection.update_many(
+        {"_id": {"$in": [post["_id"] for post in posts]}},
+        {"$set": {"matched_at": datetime.utcnow()}}
+    )
 
-# Send notification email and save notification to DB
+# Save notification to DB and queue the email for the mail worker
 async def send_email_notification(user_email: str, payload: dict):
+    # Notifications and unread counters are keyed by Firebase uid, like chat;
+    # jobs queued before the uid was carried fall back to the email
+    user_id = payload.get("user_uid") or user_email
+
     # Store notification in DB
     await notifications_collection.insert_one({
-        "user_id": user_email,
+        "user_id": user_id,
+        "email": user_email,
         "title": payload["title"],
         "message": payload["message"],
         "type": payload.get("type", "notification"),
@@ -101,69 +112,240 @@ async def send_email_notification(user_email: str, payload: dict):
         "read": False,
         "created_at": datetime.utcnow(),
     })
+    await unread.add(user_id, "notifications", 1)
 
-    # Prepare email
-    message = MessageSchema(
-        subject=payload["title"],
-        recipients=[user_email],
-        body=f"{payload['message']}\n\nLink: {payload.get('post_link', 'N/A')}",
-        subtype="plain"
+    await enqueue_email(
+        user_email,
+        payload["title"],
+        f"{payload['message']}\n\nLink: {payload.get('post_link', 'N/A')}",
     )
 
-    try:
-        await mail_client.send_message(message)
-    except Exception as e:
-        print(f"Failed to send email to {user_email}: {e}")
+async def run_notify_job(payload: dict):
+    await send_email_notification(payload["user_email"], payload)
 
-# Main function to perform lost-found matching and notify users
-async def match_lost_found():
-    lost_posts = await fetch_all_lost_posts()
-    found_posts = await fetch_all_found_posts()
+jobs.register("notify", run_notify_job)
 
-    print(f"Matching {len(lost_posts)} lost posts with {len(found_posts)} found posts")
+# Working set kept between runs: open lost and found posts indexed in memory
+class MatchingState:
+    def __init__(self):
+        self.lost_index = CandidateIndex()
+        self.found_index = CandidateIndex()
+        self.loaded = False
 
-    for lost_post in lost_posts:
-        lost_id = lost_post["_id"]
+    async def refresh(self):
+        """
+        Bring both indexes in line with Mongo. Match jobs run on whichever
+        worker claims them, so another worker may have matched new posts,
+        and solves and deletes may have hit any worker: open matched posts
+        missing here are loaded, and indexed posts that are no longer open
+        are dropped. Only `_id`s are read for posts already indexed.
+        """
+        added = removed = 0
+        for index, collection in ((self.lost_index, lost_collection), (self.found_index, found_collection)):
+            open_ids = {str(doc["_id"]) async for doc in collection.find(
+                {**OPEN_POSTS, "matched_at": {"$exists": True}}, {"_id": 1}
+            )}
+
+            gone = [post_id for post_id in index.docs if post_id not in open_ids]
+            for post_id in gone:
+                index.remove(post_id)
+
+            missing = [ObjectId(post_id) for post_id in open_ids if post_id not in index]
+            if missing:
+                index.add_many([doc async for doc in collection.find({"_id": {"$in": missing}})])
+
+            added += len(missing)
+            removed += len(gone)
+
+        self.loaded = True
+        if added or removed:
+            print(f"Matching state: loaded {added} and dropped {removed} posts "
+                  f"({len(self.lost_index)} open lost, {len(self.found_index)} open found)")
+
+    def forget(self, post_id):
+        self.lost_index.remove(post_id)
+        self.found_index.remove(post_id)
+
+state = MatchingState()
+
+# Runs triggered from the splitter and from startup never overlap
+match_lock = asyncio.Lock()
+
+def forget_post(post_id):
+    """Drop a solved or deleted post from the matching working set."""
+    state.forget(post_id)
+
+class MatchingIncomplete(RuntimeError):
+    """Some batches failed; their posts keep no `matched_at` and the job is retried."""
+
+# Send one lost post and its candidate found posts to the matcher in batches.
+# Returns False if any batch failed, so its posts are scored again next run.
+async def match_candidates(lost_post, found_posts):
+    found_posts = [post for post in found_posts if not post.get("is_solved")]
+
+    if not found_posts:
+        print(f"No candidates for lost post {lost_post['_id']}")
+        return True
+
+    # Pairs with the same content as an already scored pair reuse its score
+    candidates = {str(post["_id"]): post for post in found_posts}
+    cached, found_posts = await match_cache.lookup(lost_post, found_posts, matcher.version)
+    if cached:
+        await match_cached(lost_post, cached, candidates)
+
+    # Batches are dispatched together; the Gemini client bounds how many are in flight
+    results = await asyncio.gather(*(
+        match_batch(lost_post, found_posts[i : i + BATCH_SIZE])
+        for i in range(0, len(found_posts), BATCH_SIZE)
+    ))
+    return all(results)
+
+async def match_batch(lost_post, batch):
+    payload = {
+        "lost_post": prompt_post(lost_post),
+        "found_posts": [prompt_post(post) for post in batch],
+    }
+
+    result = await matcher.match(payload)
+
+    if not result:
+        return False
+
+    await match_cache.store(lost_post, batch, result["matches"], matcher.version)
+    await record_matches(lost_post, result["matches"], {str(post["_id"]): post for post in batch})
+    return True
+
+async def match_cached(lost_post, cached, candidates):
+    """
+    Cache entries are keyed by content, so a hit may come from other posts
+    with the same text: the pair is new for these ids and is recorded and
+    notified like a fresh result, unless these very posts were already notified.
+    """
+    hits = {
+        found_id: entry for found_id, entry in cached.items()
+        if entry.get("score", 0) > MATCH_SCORE_THRESHOLD
+    }
+    if not hits:
+        return
+
+    notified = await notified_pairs(lost_post["_id"], list(hits))
+    matches = [
+        {
+            "found_post_id": found_id,
+            "user_email": (candidates[found_id].get("user") or {}).get("email"),
+            "score": entry["score"],
+        }
+        for found_id, entry in hits.items()
+        if found_id not in notified
+    ]
+    if matches:
+        await record_matches(lost_post, matches, candidates)
+
+async def notified_pairs(lost_post_id, found_ids):
+    """Found post ids among `found_ids` that a notified match with this lost post was recorded for."""
+    notified = set()
+    async for doc in matches_collection.find(
+        {
+            "lost_post_id": str(lost_post_id),
+            "matches": {"$elemMatch": {"found_post_id": {"$in": found_ids}, "score": {"$gt": MATCH_SCORE_THRESHOLD}}},
+        },
+        {"matches": 1},
+    ):
+        for match in doc["matches"]:
+            if match.get("score", 0) > MATCH_SCORE_THRESHOLD:
+                notified.add(str(match.get("found_post_id")))
+    return notified
+
+async def record_matches(lost_post, matches, found_posts):
+    """`found_posts` maps found post id -> post, for the owner of each match."""
+    # Store matches in DB
+    await matches_collection.insert_one({
+        "lost_post_id": str(lost_post["_id"]),
+        "matches": matches
+    })
 
-        # Skip already matched lost posts
-        existing_matches = await matches_collection.distinct("lost_post_id")
-        if lost_id in existing_matches:
-            print(f"Skipping already matched lost post: {lost_id}")
+    # Notify users by email
+    for match in matches:
+        if match.get("score", 0) <= MATCH_SCORE_THRESHOLD:
             continue
-
-        print(f"\nChecking lost post: {lost_id}")
-
-        for i in range(0, len(found_posts), BATCH_SIZE):
-            batch = found_posts[i : i + BATCH_SIZE]
-
-            payload = {
-                "lost_post": convert_objectid(lost_post),
-                "found_posts": convert_objectid(batch),
-            }
-
-            gemini_result = await send_to_gemini(payload)
-
-            if not gemini_result:
-                continue
-
-            # Store matches in DB
-            await matches_collection.insert_one({
-                "lost_post_id": payload["lost_post"]["_id"],
-                "matches": gemini_result["matches"]
-            })
-
-            # Notify users by email
-            for match in gemini_result["matches"]:
-                if match.get("score", 0) <= 0.60:
-                    continue
-                else:
-                    user_email = match["user_email"]
-                    message = f"Found a match for your lost post: {lost_post['title']}"
-                    await send_email_notification(user_email, {
-                        "title": "Match Found!",
-                        "message": message,
-                        "post_link": f"https://hack-zenith.vercel.app/index/post/{match['found_post_id']}"
-                    })
-
         else:
-            print(f"No matches found for lost post {lost_id}")
+            owner = (found_posts.get(str(match["found_post_id"])) or {}).get("user") or {}
+            user_email = match.get("user_email") or owner.get("email")
+            if not user_email:
+                # Recorded above; without an owner address there is nobody to notify
+                print(f"No owner email for found post {match['found_post_id']}, skipping notification")
+                continue
+            message = f"Found a match for your lost post: {lost_post['title']}"
+            # One notification per pair, even if this batch is retried
+            await jobs.enqueue("notify", {
+                "user_email": user_email,
+                "user_uid": owner.get("uid"),
+                "title": "Match Found!",
+                "message": message,
+                "post_link": f"https://hack-zenith.vercel.app/index/post/{match['found_post_id']}"
+            }, key=f"notify:{lost_post['_id']}:{match['found_post_id']}:{user_email}")
+
+# Main function to perform lost-found matching and notify users.
+# Only posts without `matched_at` are scored, so a run costs O(new posts):
+# new lost posts against every open found post, and new found posts
+# against the lost posts that were already open before this run.
+async def match_lost_found():
+    async with match_lock:
+        with matching_run_seconds.time():
+            await _match_new_posts()
+
+async def _match_new_posts():
+    if not state.loaded:
+        await backfill_matched_at()
+    await state.refresh()
+
+    new_lost = await fetch_new_posts(lost_collection)
+    new_found = await fetch_new_posts(found_collection)
+
+    if not new_lost and not new_found:
+        print("No new posts to match")
+        return
+
+    print(f"Matching {len(new_lost)} new lost posts and {len(new_found)} new found posts")
+
+    state.found_index.add_many(new_found)
+
+    print(f"Checking {len(new_lost)} new lost posts")
+    lost_ok = await asyncio.gather(*(
+        match_candidates(lost_post, state.found_index.top_k(lost_post, MATCH_TOP_K))
+        for lost_post in new_lost
+    ))
+
+    # Group new found posts under the open lost posts they rank for
+    pending = {}
+    for found_post in new_found:
+        for lost_post in state.lost_index.top_k(found_post, MATCH_TOP_K):
+            pending.setdefault(str(lost_post["_id"]), (lost_post, []))[1].append(found_post)
+
+    print(f"Checking {len(pending)} open lost posts against new found posts")
+    groups_ok = await asyncio.gather(*(
+        match_candidates(lost_post, found_posts)
+        for lost_post, found_posts in pending.values()
+    ))
+
+    # Only posts whose every batch was scored count as matched; the others
+    # stay new, and the next run scores them again
+    matched_lost = [post for post, ok in zip(new_lost, lost_ok) if ok]
+    failed_found = {
+        str(found_post["_id"])
+        for (_, found_posts), ok in zip(pending.values(), groups_ok) if not ok
+        for found_post in found_posts
+    }
+    matched_found = [post for post in new_found if str(post["_id"]) not in failed_found]
+
+    state.lost_index.add_many(matched_lost)
+
+    await mark_matched(lost_collection, matched_lost)
+    await mark_matched(found_collection, matched_found)
+
+    print(f"Matcher: {matcher.stats()}")
+    print(f"Match cache: {match_cache.stats()}")
+
+    unmatched = len(new_lost) - len(matched_lost) + len(new_found) - len(matched_found)
+    if unmatched:
+        raise MatchingIncomplete(f"{unmatched} post(s) could not be scored, retrying")
@@ -1,21 +1,22 @@
-from db.mongodb import posts_collection, found_collection, lost_collection
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
+from db.mongodb import posts_collection, found_collection, lost_collection, sync_state_collection
+from cure.jobs import jobs
 from .ai import match_lost_found
 import asyncio
+from datetime import timedelta
 
 BATCH_SIZE = 50
 
-async def monitor_found_collection():
+# Polling interval for the tail fallback when change streams are unavailable
+TAIL_INTERVAL = 2
 
-    previous_count = await found_collection.count_documents({})
+# Every poll re-reads the `_id`s inserted this long before the newest one it has
+# seen: `_id`s come from the inserting clients, so a post can be committed
+# after one with a higher `_id`, and clients' clocks disagree
+TAIL_LOOKBACK = timedelta(seconds=60)
 
-    old_count = 0
-
-    if old_count < previous_count:
-        await match_lost_found()
-        old_count = previous_count
-    
-    else:
-        print("No new found posts. Skipping matching.")
+SPLITTER_STATE_ID = "posts_splitter"
 
 async def insert_without_duplicates(collection, documents):
     ids = [doc["id"] for doc in documents]
@@ -30,7 +31,25 @@ async def insert_without_duplicates(collection, documents):
     new_docs = [doc for doc in documents if doc["id"] not in existing_ids]
 
     if new_docs:
-        await collection.insert_many(new_docs, ordered=False)
+        try:
+            await collection.insert_many(new_docs, ordered=False)
+        except BulkWriteError as e:
+            # The unique `id` index rejects posts split concurrently elsewhere
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+
+def to_working_copy(post: dict) -> dict:
+    post_data = post.copy()
+    post_data.pop("created_at", None)
+    post_data.pop("images", None)
+    post_data.pop("image_variants", None)
+
+    if isinstance(post_data.get("user"), dict):
+        post_data["user"] = dict(post_data["user"])
+        post_data["user"].pop("avatar", None)
+
+    return post_data
 
 
 async def break_posts_collection():
@@ -41,22 +60,20 @@ async def break_posts_collection():
 
     lost_batch = []
     found_batch = []
+    split = 0
 
     async for post in posts_collection.find({}):
         post_type = post.get("types", "").lower()
 
-        post_data = post.copy()
-        post_data.pop("created_at", None)
-        post_data.pop("images", None)
-
-        if isinstance(post_data.get("user"), dict):
-            post_data["user"].pop("avatar", None)
+        post_data = to_working_copy(post)
 
         if post_type == "lost":
             lost_batch.append(post_data)
+            split += 1
 
         elif post_type == "found":
             found_batch.append(post_data)
+            split += 1
 
         if len(lost_batch) >= BATCH_SIZE:
             await insert_without_duplicates(lost_collection, lost_batch)
@@ -68,11 +85,12 @@ async def break_posts_collection():
 
     if lost_batch:
         await insert_without_duplicates(lost_collection, lost_batch)
-        await monitor_found_collection()
 
     if found_batch:
         await insert_without_duplicates(found_collection, found_batch)
-        await monitor_found_collection()
+
+    if split:
+        await schedule_matching()
 
     return {
         "status": "success",
@@ -80,4 +98,161 @@ async def break_posts_collection():
     }
 
 
+# ------------------- INCREMENTAL SPLITTER -------------------
+
+async def split_post(post: dict):
+    """
+    Route a single post into the lost or found working set.
+    Idempotent: replaying the same post is a no-op.
+    """
+    post_type = post.get("types", "").lower()
+
+    if post_type == "lost":
+        collection = lost_collection
+    elif post_type == "found":
+        collection = found_collection
+    else:
+        return
+
+    post_data = to_working_copy(post)
+    post_data.setdefault("id", str(post["_id"]))
+
+    await collection.update_one(
+        {"id": post_data["id"]},
+        {"$setOnInsert": post_data},
+        upsert=True
+    )
+
+
+async def load_splitter_state() -> dict:
+    return await sync_state_collection.find_one({"_id": SPLITTER_STATE_ID}) or {}
+
+
+async def save_splitter_state(**fields):
+    await sync_state_collection.update_one(
+        {"_id": SPLITTER_STATE_ID},
+        {"$set": fields},
+        upsert=True
+    )
+
+
+# ------------------- JOBS -------------------
+
+async def schedule_matching():
+    """
+    Queue a matching run. Runs are coalesced: any number of triggers while
+    one is pending fold into that single run, which survives restarts.
+    """
+    await jobs.enqueue("match", coalesce=True)
+
+
+async def schedule_split(post_id):
+    await jobs.enqueue("split_post", {"post_id": str(post_id)}, key=f"split_post:{post_id}")
+
+
+async def run_split_job(payload: dict):
+    post = await posts_collection.find_one({"_id": ObjectId(payload["post_id"])})
+    if post is None:
+        # Deleted before it was split
+        return
+    await split_post(post)
+    await schedule_matching()
+
+
+async def run_match_job(payload: dict):
+    await match_lost_found()
+
+
+jobs.register("split_post", run_split_job)
+jobs.register("match", run_match_job)
+
+
+async def watch_posts_collection():
+    """
+    Follow inserts on posts_collection and queue a split job for each new
+    post. The change stream resume token is persisted after every event
+    (the job is already durable by then) so nothing is skipped across
+    restarts. Falls back to tailing
+    by `_id` when the deployment does not support change streams.
+    """
+    state = await load_splitter_state()
+    token = state.get("resume_token")
+
+    while True:
+        try:
+            async with posts_collection.watch(
+                [{"$match": {"operationType": "insert"}}],
+                resume_after=token,
+            ) as stream:
+                if token is None:
+                    # First start: the stream is already open, so posts
+                    # inserted during the backfill are replayed after it.
+                    await break_posts_collection()
+
+                async for change in stream:
+                    await schedule_split(change["documentKey"]["_id"])
+                    token = stream.resume_token
+                    await save_splitter_state(resume_token=token)
+
+        except OperationFailure as e:
+            # 40573: change streams require a replica set
+            if e.code == 40573:
+                print("Change streams unavailable, tailing posts collection instead")
+                await tail_posts_collection()
+                return
+
+            print(f"Post change stream error: {e}")
+            if e.has_error_label("NonResumableChangeStreamError"):
+                token = None
+            await asyncio.sleep(TAIL_INTERVAL)
+
+        except Exception as e:
+            print(f"Post change stream error: {e}")
+            await asyncio.sleep(TAIL_INTERVAL)
+
+
+async def tail_posts_collection():
+    """
+    Poll posts_collection for `_id`s past the last queued one, starting
+    TAIL_LOOKBACK before it. `_id` only roughly follows commit order, so the
+    window is read again on every poll, `_id`s only. The ones queued from it
+    are remembered until they leave the window and skipped, so only posts
+    that committed late get a new split job.
+    """
+    state = await load_splitter_state()
+    last_id = state.get("last_id")
+    # Empty after a restart; the keyed split jobs absorb that one replay of the window
+    queued = set()
+
+    while True:
+        try:
+            after = ObjectId.from_datetime(last_id.generation_time - TAIL_LOOKBACK) if last_id else None
+            if after:
+                # Older `_id`s are settled and can no longer show up in a read
+                queued = {post_id for post_id in queued if post_id > after}
+            newest = last_id
+
+            while True:
+                query = {"_id": {"$gt": after}} if after else {}
+                docs = await posts_collection.find(query, {"_id": 1}).sort("_id", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+
+                for doc in docs:
+                    if doc["_id"] not in queued:
+                        await schedule_split(doc["_id"])
+                        queued.add(doc["_id"])
+                    after = doc["_id"]
+
+                if docs and (newest is None or after > newest):
+                    newest = after
+                if len(docs) < BATCH_SIZE:
+                    break
+
+            if newest != last_id:
+                last_id = newest
+                await save_splitter_state(last_id=last_id)
+
+            await asyncio.sleep(TAIL_INTERVAL)
 
+        except Exception as e:
+            print(f"Post tail error: {e}")
+            await asyncio.sleep(TAIL_INTERVAL)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from pymongo import UpdateOne
+from db.mongodb import match_cache_collection
+
+MATCH_CACHE_TTL = int(os.getenv("MATCH_CACHE_TTL", str(30 * 24 * 3600)))
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "200000"))
+
+# Check the size bound once every this many stored pairs
+EVICT_EVERY = 500
+
+
+def normalize_post(post: dict) -> dict:
+    """The parts of a post that influence a match score, in a stable form."""
+    location = post.get("location") or {}
+    return {
+        "types": (post.get("types") or "").lower(),
+        "title": " ".join((post.get("title") or "").lower().split()),
+        "description": " ".join((post.get("description") or "").lower().split()),
+        "tags": sorted({t.strip().lower() for t in post.get("tags") or [] if t.strip()}),
+        "place": (location.get("place") or "").strip().lower(),
+        "area": (location.get("area") or "").strip().lower(),
+    }
+
+
+def content_hash(post: dict) -> str:
+    data = json.dumps(normalize_post(post), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def pair_key(lost_hash: str, found_hash: str) -> str:
+    return hashlib.sha256(f"{lost_hash}:{found_hash}".encode()).hexdigest()
+
+
+class MatchCache:
+    """
+    Persistent pair-level cache of LLM match scores, keyed by the content
+    hash of the lost and found post. Entries expire after MATCH_CACHE_TTL
+    (TTL index in db.indexes) and the least recently hit entries are
+    evicted past MATCH_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, collection=match_cache_collection, max_entries=MATCH_CACHE_MAX_ENTRIES):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stored_since_check = 0
+
+    async def lookup(self, lost_post: dict, found_posts: List[dict], model: str) -> Tuple[Dict[str, dict], List[dict]]:
+        """
+        Split found posts into cached results (found post id -> entry)
+        and the posts that still need scoring.
+        """
+        lost_hash = content_hash(lost_post)
+        keys = {pair_key(lost_hash, content_hash(found)): found for found in found_posts}
+
+        entries = await self.collection.find(
+            {"_id": {"$in": list(keys)}, "model": model}
+        ).to_list(length=None)
+
+        cached = {}
+        for entry in entries:
+            cached[str(keys[entry["_id"]]["_id"])] = entry
+
+        if entries:
+            await self.collection.update_many(
+                {"_id": {"$in": [entry["_id"] for entry in entries]}},
+                {"$set": {"last_hit_at": datetime.utcnow()}}
+            )
+
+        missing = [found for found in found_posts if str(found["_id"]) not in cached]
+
+        self.hits += len(cached)
+        self.misses += len(missing)
+        return cached, missing
+
+    async def store(self, lost_post: dict, found_posts: List[dict], matches: List[dict], model: str):
+        """
+        Record a score for every found post in the batch; posts the LLM did
+        not return as a match are stored with score 0.
+        """
+        if not found_posts:
+            return
+
+        scores = {str(m.get("found_post_id")): m.get("score", 0) for m in matches}
+        lost_hash = content_hash(lost_post)
+        now = datetime.utcnow()
+
+        ops = []
+        for found in found_posts:
+            found_id = str(found["_id"])
+            ops.append(UpdateOne(
+                {"_id": pair_key(lost_hash, content_hash(found))},
+                {"$set": {
+                    "lost_post_id": str(lost_post["_id"]),
+                    "found_post_id": found_id,
+                    "score": scores.get(found_id, 0),
+                    "model": model,
+                    "created_at": now,
+                    "last_hit_at": now,
+                }},
+                upsert=True,
+            ))
+
+        await self.collection.bulk_write(ops, ordered=False)
+
+        self._stored_since_check += len(ops)
+        if self._stored_since_check >= EVICT_EVERY:
+            self._stored_since_check = 0
+            await self.evict()
+
+    async def evict(self):
+        overflow = await self.collection.estimated_document_count() - self.max_entries
+        if overflow <= 0:
+            return
+
+        oldest = await self.collection.find({}, {"_id": 1}).sort("last_hit_at", 1).limit(overflow).to_list(overflow)
+        result = await self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+        self.evictions += result.deleted_count
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+match_cache = MatchCache()
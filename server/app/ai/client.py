@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from cure.metrics import gemini_request_seconds, gemini_tokens, gemini_errors
+from config.gemini import GEMINI_API_URL, GEMINI_MODEL, GEMINI_CONCURRENCY, GEMINI_RPM, GEMINI_TPM
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute / 60` tokens
+    per second, holding at most `per_minute` tokens.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        # Requests larger than the bucket would never fit; cap them
+        amount = min(amount, self.capacity)
+
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def debit(self, amount: float):
+        """Charge tokens after the fact (e.g. actual usage above the estimate)."""
+        self._refill()
+        self.tokens -= amount
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class GeminiClient:
+    """
+    One configured GenerativeModel shared by all matching calls, with a
+    bounded number of requests in flight and request/token-per-minute limits.
+    Calls go through the SDK's async API, so the event loop keeps serving
+    HTTP and websockets while a batch is being scored.
+    """
+
+    def __init__(
+        self,
+        model_name: str = GEMINI_MODEL,
+        concurrency: int = GEMINI_CONCURRENCY,
+        rpm: int = GEMINI_RPM,
+        tpm: int = GEMINI_TPM,
+    ):
+        self.model_name = model_name
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._model = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(GEMINI_API_URL)
+
+    @property
+    def model(self):
+        # The SDK takes most of a second to import; only pay for it on the first call
+        if self._model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=GEMINI_API_URL)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        estimate = estimate_tokens(prompt)
+
+        async with self.semaphore:
+            await self.requests.acquire()
+            await self.tokens.acquire(estimate)
+
+            started = time.perf_counter()
+            try:
+                response = await self.model.generate_content_async(prompt)
+            except Exception:
+                gemini_request_seconds.observe(time.perf_counter() - started, "error")
+                gemini_errors.inc("request")
+                raise
+            gemini_request_seconds.observe(time.perf_counter() - started, "ok")
+
+        usage = getattr(response, "usage_metadata", None)
+        used = getattr(usage, "total_token_count", 0) or 0
+        if used > estimate:
+            self.tokens.debit(used - estimate)
+        gemini_tokens.inc("prompt", amount=getattr(usage, "prompt_token_count", 0) or 0)
+        gemini_tokens.inc("completion", amount=getattr(usage, "candidates_token_count", 0) or 0)
+
+        return response.text
+
+
+gemini_client = GeminiClient()
@@ -0,0 +1,156 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "by", "for", "from", "i", "in", "is", "it",
+    "my", "near", "of", "on", "or", "the", "this", "to", "was", "with", "lost",
+    "found", "item", "please", "someone",
+}
+
+# Query terms are scored rarest first. Once this many candidate posts have
+# been collected, the remaining (more common) terms such as "room" or
+# "block" only re-rank those candidates instead of pulling in every post
+# they occur in, which keeps a search from touching the whole index.
+MAX_CANDIDATES = 1000
+
+# How much each field counts towards a post's term weights
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "description": 1.0,
+    "tags": 2.5,
+    "place": 1.5,
+    "area": 1.5,
+}
+
+
+def tokenize(text) -> List[str]:
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def post_terms(post: dict) -> Dict[str, float]:
+    """
+    Weighted term frequencies over title, description, tags and location.
+    """
+    location = post.get("location") or {}
+    fields = {
+        "title": post.get("title"),
+        "description": post.get("description"),
+        "tags": " ".join(post.get("tags") or []),
+        "place": location.get("place") if isinstance(location, dict) else None,
+        "area": location.get("area") if isinstance(location, dict) else None,
+    }
+
+    terms: Dict[str, float] = defaultdict(float)
+    for field, text in fields.items():
+        for token, count in Counter(tokenize(text)).items():
+            terms[token] += FIELD_WEIGHTS[field] * (1 + math.log(count))
+    return dict(terms)
+
+
+class CandidateIndex:
+    """
+    In-process TF-IDF inverted index over found posts.
+
+    Built once per matching run and kept up to date with add()/remove(),
+    so only the top-K most similar found posts are sent to the LLM.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, float]] = {}
+        self.posts: Dict[str, dict] = {}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # Document norms depend on every idf, so they are cached until the next change
+        self._norms: Dict[str, float] = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, post_id):
+        return str(post_id) in self.docs
+
+    def add(self, post: dict):
+        post_id = str(post["_id"])
+        if post_id in self.docs:
+            self.remove(post_id)
+
+        terms = post_terms(post)
+        self._norms.clear()
+        self.docs[post_id] = terms
+        self.posts[post_id] = post
+        for term, weight in terms.items():
+            self.postings[term][post_id] = weight
+
+    def add_many(self, posts: List[dict]):
+        for post in posts:
+            self.add(post)
+
+    def remove(self, post_id):
+        post_id = str(post_id)
+        terms = self.docs.pop(post_id, None)
+        self.posts.pop(post_id, None)
+        if not terms:
+            return
+
+        self._norms.clear()
+        for term in terms:
+            bucket = self.postings.get(term)
+            if bucket is None:
+                continue
+            bucket.pop(post_id, None)
+            if not bucket:
+                del self.postings[term]
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log((1 + len(self.docs)) / (1 + df)) + 1
+
+    def _norm(self, post_id: str) -> float:
+        norm = self._norms.get(post_id)
+        if norm is None:
+            terms = self.docs[post_id]
+            norm = math.sqrt(sum((w * self.idf(t)) ** 2 for t, w in terms.items())) or 1.0
+            self._norms[post_id] = norm
+        return norm
+
+    def search(self, post: dict, k: int) -> List[Tuple[float, dict]]:
+        """
+        Return up to k (score, found_post) pairs ranked by cosine similarity.
+        Found posts sharing no terms with the query are never returned.
+        """
+        query = post_terms(post)
+        if not query or not self.docs:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        query_norm = 0.0
+        for term in sorted(query, key=lambda t: len(self.postings.get(t, ()))):
+            bucket = self.postings.get(term)
+            idf = self.idf(term)
+            q = query[term] * idf
+            query_norm += q * q
+            if not bucket:
+                continue
+
+            if len(scores) >= MAX_CANDIDATES:
+                for post_id in scores.keys() & bucket.keys():
+                    scores[post_id] += q * bucket[post_id] * idf
+            else:
+                for post_id, d_weight in bucket.items():
+                    scores[post_id] += q * d_weight * idf
+
+        query_norm = math.sqrt(query_norm) or 1.0
+        ranked = heapq.nlargest(
+            k,
+            ((score / (query_norm * self._norm(pid)), pid) for pid, score in scores.items()),
+        )
+        return [(score, self.posts[pid]) for score, pid in ranked]
+
+    def top_k(self, post: dict, k: int) -> List[dict]:
+        return [found for _, found in self.search(post, k)]
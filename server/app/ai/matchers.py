@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import time
+from typing import List, Optional
+
+from .index import tokenize
+from .client import gemini_client
+from cure.metrics import send_to_gemini_seconds, gemini_errors
+
+MATCHER_BACKEND = os.getenv("MATCHER_BACKEND", "gemini")
+
+# Local engine: pairs scoring below this are not reported as matches
+LOCAL_MIN_SCORE = float(os.getenv("LOCAL_MIN_SCORE", "0.3"))
+
+
+class Matcher:
+    """
+    Scores one lost post against a batch of found posts.
+
+    match() takes the same payload send_to_gemini always took
+    ({"lost_post": ..., "found_posts": [...]}, ObjectIds already converted)
+    and returns {"matches": [{"found_post_id", "user_email", "score"}]}
+    or None on failure. `version` identifies the scoring model in caches.
+    """
+
+    name = "base"
+    version = "base"
+
+    def __init__(self):
+        self.calls = 0
+        self.pairs_scored = 0
+
+    async def match(self, payload: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "calls": self.calls, "pairs_scored": self.pairs_scored}
+
+
+# ------------------- Gemini -------------------
+
+# Call Google Gemini API to get matches
+async def send_to_gemini(payload: dict):
+    started = time.perf_counter()
+    try:
+        json_template = """
+        {
+          "matches": [
+            {
+              "found_post_id": "string",
+              "user_email": "string",
+              "score": 0.85
+            }
+          ]
+        }
+        """
+
+        prompt = f"""
+            You are a lost-and-found matching AI.
+
+            Compare the LOST post with FOUND posts and return matches in JSON.
+
+            LOST POST:
+            {json.dumps(payload['lost_post'], indent=2, default=str)}
+
+            FOUND POSTS:
+            {json.dumps(payload['found_posts'], indent=2, default=str)}
+
+            Return ONLY valid JSON in this format:
+            {json_template}
+        """
+
+        raw_text = await gemini_client.generate(prompt)
+        clean_text = re.sub(r"```json|```", "", raw_text).strip()
+
+        try:
+            matches_data = json.loads(clean_text)
+        except ValueError:
+            gemini_errors.inc("parse")
+            raise
+
+        send_to_gemini_seconds.observe(time.perf_counter() - started, "ok")
+        return matches_data
+
+    except Exception as e:
+        send_to_gemini_seconds.observe(time.perf_counter() - started, "error")
+        print(f"Gemini SDK error: {e}")
+        return None
+
+
+class GeminiMatcher(Matcher):
+    name = "gemini"
+
+    @property
+    def version(self):
+        return gemini_client.model_name
+
+    async def match(self, payload: dict) -> Optional[dict]:
+        self.calls += 1
+        self.pairs_scored += len(payload["found_posts"])
+        return await send_to_gemini(payload)
+
+
+# ------------------- Local -------------------
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _text_tokens(post: dict) -> set:
+    return set(tokenize(post.get("title"))) | set(tokenize(post.get("description")))
+
+
+def _tags(post: dict) -> set:
+    return {t.strip().lower() for t in post.get("tags") or [] if t.strip()}
+
+
+def _location_similarity(lost: dict, found: dict) -> float:
+    a = lost.get("location") or {}
+    b = found.get("location") or {}
+
+    score = 0.0
+    if a.get("area") and (a.get("area") or "").strip().lower() == (b.get("area") or "").strip().lower():
+        score += 0.6
+    score += 0.4 * _jaccard(set(tokenize(a.get("place"))), set(tokenize(b.get("place"))))
+    return score
+
+
+class LocalMatcher(Matcher):
+    """
+    Deterministic offline engine: weighted token overlap on title and
+    description, tag Jaccard and location similarity. No network access,
+    so it can drive load tests and regression tests of the pipeline.
+    """
+
+    name = "local"
+    version = "local-v1"
+
+    TEXT_WEIGHT = 0.45
+    TAG_WEIGHT = 0.35
+    LOCATION_WEIGHT = 0.20
+
+    def score(self, lost: dict, found: dict) -> float:
+        return (
+            self.TEXT_WEIGHT * _overlap(_text_tokens(lost), _text_tokens(found))
+            + self.TAG_WEIGHT * _jaccard(_tags(lost), _tags(found))
+            + self.LOCATION_WEIGHT * _location_similarity(lost, found)
+        )
+
+    async def match(self, payload: dict) -> Optional[dict]:
+        lost = payload["lost_post"]
+        found_posts: List[dict] = payload["found_posts"]
+
+        self.calls += 1
+        self.pairs_scored += len(found_posts)
+
+        matches = []
+        for found in found_posts:
+            score = round(self.score(lost, found), 2)
+            if score < LOCAL_MIN_SCORE:
+                continue
+            matches.append({
+                "found_post_id": str(found.get("_id")),
+                "user_email": (found.get("user") or {}).get("email"),
+                "score": score,
+            })
+
+        return {"matches": matches}
+
+
+MATCHERS = {
+    GeminiMatcher.name: GeminiMatcher,
+    LocalMatcher.name: LocalMatcher,
+}
+
+
+def get_matcher(name: str = MATCHER_BACKEND) -> Matcher:
+    try:
+        return MATCHERS[name]()
+    except KeyError:
+        raise RuntimeError(f"Unknown MATCHER_BACKEND {name!r}, expected one of {sorted(MATCHERS)}")
+
+
+matcher = get_matcher()
@@ -1,15 +1,29 @@
 # app/auth.py
 
 from fastapi import Depends, HTTPException, status, Header
-from firebase_admin import auth
+from cure.firebase_tokens import InvalidToken, verifier
+from config.auth import ADMIN_UIDS, ADMIN_EMAILS
 
-def get_current_user(authorization: str = Header(...)):
+async def get_current_user(authorization: str = Header(...)):
+    # Cached until the token expires; signature checks of new tokens run off the event loop
     try:
         token = authorization.replace("Bearer ", "")
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token
-    except Exception:
+        return await verifier.verify(token)
+    except InvalidToken:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired Firebase token"
         )
+
+async def require_admin(user: dict = Depends(get_current_user)):
+    email = (user.get("email") or "").lower()
+    if (
+        user.get("admin") is True
+        or user.get("uid") in ADMIN_UIDS
+        or (email in ADMIN_EMAILS and user.get("email_verified") is True)
+    ):
+        return user
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Admin only"
+    )
@@ -0,0 +1,65 @@
+"""
+Calls saved vs. recall lost by the candidate pre-filter.
+
+    python -m bench.candidate_index --lost 500 --found 2000 --top-k 5 10 20
+"""
+import argparse
+import json
+import math
+import time
+
+from ai.index import CandidateIndex
+from bench.synthetic import generate
+
+BATCH_SIZE = 5
+
+
+def run(n_lost, n_found, top_ks, seed):
+    lost, found, truth = generate(n_lost, n_found, seed=seed)
+
+    started = time.perf_counter()
+    index = CandidateIndex()
+    index.add_many(found)
+    build_s = time.perf_counter() - started
+
+    baseline_calls = n_lost * math.ceil(n_found / BATCH_SIZE)
+    results = []
+
+    for k in top_ks:
+        calls = 0
+        hits = 0
+        started = time.perf_counter()
+        for post in lost:
+            candidates = index.top_k(post, k)
+            calls += math.ceil(len(candidates) / BATCH_SIZE)
+            expected = truth.get(post["_id"])
+            if expected is not None and any(c["_id"] == expected for c in candidates):
+                hits += 1
+        query_s = time.perf_counter() - started
+
+        results.append({
+            "top_k": k,
+            "llm_calls": calls,
+            "baseline_llm_calls": baseline_calls,
+            "calls_saved_pct": round(100 * (1 - calls / baseline_calls), 2) if baseline_calls else 0.0,
+            "recall": round(hits / len(truth), 4) if truth else 1.0,
+            "query_ms_per_lost_post": round(1000 * query_s / max(n_lost, 1), 3),
+        })
+
+    return {
+        "lost": n_lost,
+        "found": n_found,
+        "index_build_ms": round(1000 * build_s, 2),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lost", type=int, default=500)
+    parser.add_argument("--found", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.lost, args.found, args.top_k, args.seed), indent=2))
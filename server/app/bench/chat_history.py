@@ -0,0 +1,166 @@
+"""
+Chat history windows on one very long thread.
+
+    MONGO_URL=mongodb://localhost:27017 python -m bench.chat_history --messages 100000 --depths 0 1000 10000 50000 99000
+
+Needs a real MongoDB (the in-memory stand-in scans everything, so it
+cannot show the difference). One post's thread between two users is
+seeded once into a separate database, next to other threads, and reused
+on later runs; --reseed starts over. For each depth (how many messages
+back from the newest the window starts) it times the window query
+GET /messages runs now and reports the keys / documents Mongo examined.
+It also times the single unbounded query the route used to run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+SEED_BATCH = 10_000
+
+POST_ID = "bench-thread"
+USERS = ("owner", "finder")
+
+# Other threads seeded next to the long one, so the index has neighbours
+NOISE_THREADS = 200
+NOISE_MESSAGES = 50
+
+
+def _message(post_id: str, sender: str, receiver: str, created_at: datetime, i: int) -> dict:
+    return {
+        "post_id": post_id,
+        "message": f"message {i} " + "lorem ipsum " * 4,
+        "sender": {"uid": sender, "name": sender},
+        "receiver": {"uid": receiver, "name": receiver},
+        "status": "seen",
+        "created_at": created_at,
+        "delivered_at": None,
+        "seen_at": None,
+    }
+
+
+async def seed(collection, messages: int):
+    from db.indexes import INDEXES
+
+    have = await collection.count_documents({"post_id": POST_ID})
+    if have < messages:
+        start = datetime.utcnow() - timedelta(days=90)
+        batch = []
+        for i in range(have, messages):
+            sender, receiver = USERS if i % 2 else USERS[::-1]
+            batch.append(_message(POST_ID, sender, receiver, start + timedelta(milliseconds=50 * i), i))
+            if len(batch) == SEED_BATCH:
+                await collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await collection.insert_many(batch, ordered=False)
+
+        if not await collection.count_documents({"post_id": {"$ne": POST_ID}}, limit=1):
+            await collection.insert_many([
+                _message(f"noise-{t}", f"user-{t}", USERS[0], start + timedelta(seconds=i), i)
+                for t in range(NOISE_THREADS) for i in range(NOISE_MESSAGES)
+            ], ordered=False)
+
+    await collection.create_indexes(INDEXES["messages"])
+    return await collection.count_documents({"post_id": POST_ID})
+
+
+async def _timed(run, explain, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    stats = (await explain()).get("executionStats", {})
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+    }
+
+
+async def bench_window(collection, depth, limit, repeat):
+    from cure.conversations import HISTORY_SORT, history_window, older_than, thread_query
+
+    uid = USERS[0]
+    before = None
+    if depth:
+        # The oldest message of the window above, i.e. what the client sends as `before`
+        anchor = await collection.find(thread_query(POST_ID, uid), {"created_at": 1}) \
+            .sort(HISTORY_SORT).skip(depth - 1).limit(1).to_list(1)
+        if not anchor:
+            return None
+        before = str(anchor[0]["_id"])
+
+    async def run():
+        docs, _ = await history_window(POST_ID, uid, limit, before, collection=collection)
+        assert len(docs) == limit
+
+    async def explain():
+        bound = older_than(anchor[0]) if depth else None
+        return await collection.find(thread_query(POST_ID, uid, bound)).sort(HISTORY_SORT).limit(limit + 1).explain()
+
+    return {"depth": depth, **await _timed(run, explain, repeat)}
+
+
+async def bench_full_thread(collection, repeat):
+    # What GET /messages ran before it was windowed
+    query = {"post_id": POST_ID, "$or": [{"sender.uid": USERS[0]}, {"receiver.uid": USERS[0]}]}
+
+    async def run():
+        await collection.find(query).sort("created_at", 1).to_list(None)
+
+    async def explain():
+        return await collection.find(query).sort("created_at", 1).explain()
+
+    return await _timed(run, explain, repeat)
+
+
+async def run(args) -> dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    url = args.mongo_url or os.getenv("MONGO_URL")
+    if not url:
+        raise SystemExit("Set MONGO_URL or pass --mongo-url")
+
+    client = AsyncIOMotorClient(url)
+    collection = client[args.database]["messages"]
+    if args.reseed:
+        await collection.drop()
+
+    started = time.perf_counter()
+    count = await seed(collection, args.messages)
+    seed_s = time.perf_counter() - started
+
+    windows = [
+        r for r in [await bench_window(collection, d, args.limit, args.repeat) for d in args.depths] if r
+    ]
+    full = await bench_full_thread(collection, max(1, args.repeat // 10))
+
+    client.close()
+    return {
+        "thread_messages": count,
+        "limit": args.limit,
+        "seed_s": round(seed_s, 1),
+        "windows": windows,
+        "full_thread": full,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--database", default="hackzenith_bench")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 50000, 99000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--reseed", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
@@ -0,0 +1,430 @@
+"""
+End-to-end benchmark suite: the whole FastAPI app, in process, on the
+in-memory Mongo stand-in with stub Cloudinary, Gemini and SMTP backends.
+
+    python -m bench.e2e --out results.json
+    python -m bench.e2e --scenarios feed search --baseline results.json
+
+Scenarios:
+    post_create     POST /posts/create with images (decode, resize, stub upload)
+    feed            GET /posts/get_all, first pages (post cache) and cursor pages
+    search          GET /posts/search
+    chat            POST /messages, GET /messages/inbox/{uid}, GET /get/notifications
+    ws_fanout       one message to each of --sockets gateway sockets, per round
+    matching        a full match_lost_found run through the Gemini matcher,
+                    then the notify jobs and the mail queue against the SMTP stub
+
+Requests go through httpx's ASGI transport, so they cover routing,
+validation, middleware and serialization but no network. Each result has
+the same shape: count, errors, wall_s, throughput_per_s and latency_ms
+percentiles. The database is the stand-in, which scans instead of using
+indexes: compare runs of this suite with the same arguments, not with
+production numbers. --baseline compares against an earlier output and
+exits with status 1 if throughput dropped or p99 latency rose by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+SCENARIOS = ("post_create", "feed", "search", "chat", "ws_fanout", "matching")
+
+
+def _setup_env(smtp_port: int):
+    os.environ["MATCHER_BACKEND"] = "gemini"
+    os.environ.setdefault("GEMINI_API_URL", "bench")
+    # Real quotas would make every run take minutes; pass lower ones to reproduce them
+    os.environ.setdefault("GEMINI_RPM", "1000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000")
+    os.environ["SMTP_SERVER"] = "127.0.0.1"
+    os.environ["SMTP_PORT"] = str(smtp_port)
+    os.environ["SMTP_SSL_TLS"] = "false"
+    os.environ["SMTP_STARTTLS"] = "false"
+    os.environ.setdefault("SMTP_EMAIL", "bench@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "bench")
+    os.environ.setdefault("WS_BACKPLANE", "memory")
+
+
+# ------------------- Measuring -------------------
+
+def summarize(latencies_ms, wall: float, errors: int = 0) -> dict:
+    from cure.jobs import percentile
+
+    count = len(latencies_ms)
+    return {
+        "count": count,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(count / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies_ms) / count, 3) if count else 0.0,
+            "p50": percentile(latencies_ms, 50),
+            "p90": percentile(latencies_ms, 90),
+            "p99": percentile(latencies_ms, 99),
+            "max": round(max(latencies_ms), 3) if count else 0.0,
+        },
+    }
+
+
+async def drive(request, total: int, concurrency: int) -> dict:
+    """
+    Run request(i) for i in range(total) from `concurrency` concurrent
+    clients; request returns the httpx response. Failed requests count as
+    errors and are still timed.
+    """
+    latencies, errors = [], 0
+    indexes = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                ok = (await request(i)).is_success
+            except Exception as e:
+                print(f"Request {i} failed: {e}", file=sys.stderr)
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+# ------------------- Data -------------------
+
+def sample_jpeg(width: int = 1600, height: int = 1200, seed: int = 7) -> bytes:
+    """A photo-sized JPEG with enough detail that resizing and encoding do real work."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.frombytes("L", (width // 8, height // 8), rng.randbytes(width * height // 64))
+    image = Image.blend(image, noise.resize((width, height)).convert("RGB"), 0.3)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=88)
+    return out.getvalue()
+
+
+async def seed_posts(count: int, seed: int):
+    from bench.synthetic import generate
+    from db.mongodb import posts_collection
+
+    lost, found, _ = generate(count // 2, count - count // 2, seed=seed)
+    for doc in lost + found:
+        doc["id"] = str(doc["_id"])
+        doc["images"] = [f"https://res.cloudinary.com/bench/image/upload/posts/{doc['_id']}/feed.webp"]
+    await posts_collection.insert_many(lost + found)
+
+
+# ------------------- Scenarios -------------------
+
+async def post_create(client, args, rng) -> dict:
+    from bench.synthetic import ITEMS, COLOURS, AREAS
+
+    image = sample_jpeg(seed=args.seed)
+
+    async def request(i):
+        item, colour = rng.choice(ITEMS), rng.choice(COLOURS)
+        return await client.post("/posts/create", data={
+            "user_uid": f"u{i % 500}",
+            "user_email": f"user{i % 500}@example.com",
+            "user_name": "Bench User",
+            "types": "lost" if i % 2 else "found",
+            "title": f"{colour} {item}",
+            "description": f"{colour} {item} left near the {rng.choice(AREAS)}",
+            "area": rng.choice(AREAS),
+            "tags": f"{item},{colour}",
+        }, files=[("images", (f"{n}.jpg", image, "image/jpeg")) for n in range(args.images)])
+
+    result = await drive(request, args.creates, args.concurrency)
+    result["images_per_post"] = args.images
+    result["image_bytes"] = len(image)
+    return {"post_create": result}
+
+
+async def feed(client, args, rng) -> dict:
+    # Cursors of every page, collected by walking the feed once
+    cursors, cursor = [], None
+    while len(cursors) < 200:
+        response = await client.get("/posts/get_all", params={"limit": args.page_size, **({"cursor": cursor} if cursor else {})})
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        cursors.append(cursor)
+
+    async def first_page(i):
+        return await client.get("/posts/get_all", params={"limit": args.page_size, "page": 1 + i % 3})
+
+    async def cursor_page(i):
+        return await client.get("/posts/get_all", params={"limit": args.page_size, "cursor": rng.choice(cursors)})
+
+    return {
+        "feed_first_pages": await drive(first_page, args.requests, args.concurrency),
+        "feed_cursor_pages": await drive(cursor_page, args.requests, args.concurrency),
+    }
+
+
+async def search(client, args, rng) -> dict:
+    from bench.synthetic import ITEMS, COLOURS, BRANDS
+
+    async def request(i):
+        words = [rng.choice(ITEMS), rng.choice(COLOURS)] if i % 2 else [rng.choice(BRANDS)]
+        return await client.get("/posts/search", params={"query": " ".join(words), "limit": args.page_size})
+
+    return {"search": await drive(request, args.requests, args.concurrency)}
+
+
+async def chat(client, args, rng) -> dict:
+    users = [f"chat-user-{n}" for n in range(args.chat_users)]
+
+    async def send(i):
+        sender, receiver = rng.sample(users, 2)
+        return await client.post("/messages", json={
+            "post_id": f"chat-post-{i % (args.chat_users // 2)}",
+            "message": f"message {i}, is this yours?",
+            "sender": {"uid": sender, "name": sender},
+            "receiver": {"uid": receiver, "name": receiver},
+        })
+
+    async def inbox(i):
+        return await client.get(f"/messages/inbox/{rng.choice(users)}", params={"limit": 20})
+
+    async def unread(i):
+        return await client.get("/get/notifications", params={"user_id": rng.choice(users)})
+
+    return {
+        "chat_send": await drive(send, args.requests, args.concurrency),
+        "chat_inbox": await drive(inbox, args.requests, args.concurrency),
+        "chat_unread": await drive(unread, args.requests, args.concurrency),
+    }
+
+
+class BenchSocket:
+    """Takes what SocketSender writes and times it against the round's publish time."""
+
+    def __init__(self, latencies: list, done):
+        self.latencies = latencies
+        self.done = done
+
+    async def send_text(self, text: str):
+        sent = json.loads(text)["d"]["sent"]
+        self.latencies.append((time.perf_counter() - sent) * 1000)
+        self.done()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def ws_fanout(client, args, rng) -> dict:
+    from cure.realtime import hub
+
+    latencies = []
+    expected = args.sockets * args.rounds
+    finished = asyncio.Event()
+
+    def done():
+        if len(latencies) >= expected:
+            finished.set()
+
+    senders = [hub.gateway.add(f"ws-user-{n}", BenchSocket(latencies, done)) for n in range(args.sockets)]
+
+    started = time.perf_counter()
+    for round_ in range(args.rounds):
+        sent = time.perf_counter()
+        for n in range(args.sockets):
+            await hub.publish("notifications", f"ws-user-{n}", {"type": "bench", "round": round_, "sent": sent})
+        # Let the writers drain before the next round, like messages arriving over time
+        await asyncio.sleep(0)
+    try:
+        await asyncio.wait_for(finished.wait(), timeout=120)
+    except asyncio.TimeoutError:
+        pass
+    wall = time.perf_counter() - started
+
+    for sender in senders:
+        hub.gateway.remove(sender.user_id, sender.websocket)
+        await sender.close()
+
+    result = summarize(latencies, wall, errors=expected - len(latencies))
+    result.update({"sockets": args.sockets, "rounds": args.rounds, "dropped": sum(s.dropped for s in senders)})
+    return {"ws_fanout": result}
+
+
+async def matching(client, args, rng) -> dict:
+    from bench.synthetic import generate
+    from ai import ai
+    from cure.jobs import jobs
+    from cure.mail_queue import mail_worker
+    from db.mongodb import lost_collection, found_collection
+
+    lost, found, _ = generate(args.match_posts // 2, args.match_posts - args.match_posts // 2, seed=args.seed)
+    await lost_collection.insert_many(lost)
+    await found_collection.insert_many(found)
+
+    # Every matcher call: prompt, rate limits, the stub model and parsing
+    latencies, errors = [], 0
+    match = ai.matcher.match
+
+    async def timed_match(payload):
+        nonlocal errors
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await match(payload)
+            return result
+        finally:
+            latencies.append((time.perf_counter() - started) * 1000)
+            # The Gemini matcher answers None for failed or unparseable calls
+            errors += result is None
+
+    ai.matcher.match = timed_match
+    try:
+        started = time.perf_counter()
+        await ai.match_lost_found()
+        wall = time.perf_counter() - started
+    finally:
+        del ai.matcher.match
+
+    result = summarize(latencies, wall, errors)
+    result.update({"posts": len(lost) + len(found), "pairs_scored": ai.matcher.pairs_scored})
+
+    started = time.perf_counter()
+    result["notify_jobs"] = await jobs.drain()
+    result["notify_wall_s"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    result["emails_sent"] = await mail_worker.drain()
+    result["mail_wall_s"] = round(time.perf_counter() - started, 3)
+    await mail_worker.pool.close()
+    return {"matching": result}
+
+
+RUNNERS = {
+    "post_create": post_create,
+    "feed": feed,
+    "search": search,
+    "chat": chat,
+    "ws_fanout": ws_fanout,
+    "matching": matching,
+}
+
+
+# ------------------- Comparing -------------------
+
+def regressions(current: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result["throughput_per_s"] < before["throughput_per_s"] * (1 - tolerance):
+            found.append(f"{name}: throughput {before['throughput_per_s']} -> {result['throughput_per_s']}/s")
+        if result["latency_ms"]["p99"] > before["latency_ms"]["p99"] * (1 + tolerance):
+            found.append(f"{name}: p99 {before['latency_ms']['p99']} -> {result['latency_ms']['p99']}ms")
+    return found
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    from bench.smtp_stub import SMTPStub
+
+    smtp = await SMTPStub().start()
+    _setup_env(smtp.port)
+
+    from bench import memdb
+    memdb.install()
+
+    import httpx
+    from bench import stubs
+    from main import app
+
+    store, model = stubs.install(args.upload_ms, args.gemini_ms, args.seed)
+    await seed_posts(args.posts, args.seed)
+
+    rng = random.Random(args.seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name in args.scenarios:
+            print(f"Running {name}", file=sys.stderr)
+            results.update(await RUNNERS[name](client, args, rng))
+
+    await smtp.stop()
+
+    return {
+        "revision": _revision(),
+        "started_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "out")},
+        "backends": {
+            "image_uploads": store.uploads,
+            "gemini_calls": model.calls,
+            "smtp_messages": len(smtp.messages),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per read scenario")
+    parser.add_argument("--posts", type=int, default=2000, help="posts seeded for feed and search")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--creates", type=int, default=50)
+    parser.add_argument("--images", type=int, default=2, help="images per created post")
+    parser.add_argument("--upload-ms", type=float, default=40, help="stub Cloudinary latency per upload")
+    parser.add_argument("--chat-users", type=int, default=200)
+    parser.add_argument("--sockets", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--match-posts", type=int, default=500)
+    parser.add_argument("--gemini-ms", type=float, default=300, help="stub Gemini latency per call")
+    parser.add_argument("--out", default=None, help="also write the JSON here")
+    parser.add_argument("--baseline", default=None, help="earlier output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # The app logs with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_revision"] = baseline.get("revision")
+        # Results are only comparable between runs with the same arguments
+        report["config_differs"] = sorted(
+            k for k, v in report["config"].items() if baseline.get("config", {}).get(k) != v
+        )
+        report["regressions"] = regressions(report["results"], baseline["results"], args.tolerance)
+        status = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(status)
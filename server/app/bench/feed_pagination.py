@@ -0,0 +1,137 @@
+"""
+Offset vs keyset pagination of the post feed on a seeded collection.
+
+    MONGO_URL=mongodb://localhost:27017 python -m bench.feed_pagination --posts 1000000 --pages 1 10 100 1000
+
+Needs a real MongoDB (the in-memory stand-in scans everything, so it
+cannot show the difference). Posts are seeded once into a separate
+database and reused on later runs; --reseed starts over. For each page it
+times the skip() query the feed used to run against the cursor query it
+runs now, and reports how many index keys / documents Mongo examined.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+SEED_BATCH = 10_000
+
+INDEXES = [
+    [("created_at", -1), ("_id", -1)],
+    [("types", 1), ("is_solved", 1), ("created_at", -1), ("_id", -1)],
+]
+
+SCENARIOS = {
+    "feed": {},
+    "lost_open": {"types": "lost", "is_solved": False},
+}
+
+
+async def seed(collection, posts: int, seed_value: int):
+    import random
+    from bench.synthetic import _random_post
+
+    have = await collection.estimated_document_count()
+    if have >= posts:
+        return have
+
+    rng = random.Random(seed_value)
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(have, posts):
+        kind = "lost" if rng.random() < 0.5 else "found"
+        post = _random_post(kind, start + timedelta(milliseconds=30 * i), rng)
+        post["is_solved"] = rng.random() < 0.2
+        post["images"] = []
+        batch.append(post)
+        if len(batch) == SEED_BATCH:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+    for keys in INDEXES:
+        await collection.create_index(keys)
+    return await collection.estimated_document_count()
+
+
+async def _timed(collection, query, skip, limit, repeat):
+    from db.pagination import FEED_SORT
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await collection.find(query).sort(FEED_SORT).skip(skip).limit(limit).to_list(length=limit)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    plan = await collection.find(query).sort(FEED_SORT).skip(skip).limit(limit).explain()
+    stats = plan.get("executionStats", {})
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+    }
+
+
+async def bench_page(collection, filters, page, limit, repeat):
+    from db.pagination import FEED_SORT, after_cursor, encode_cursor
+
+    skip = (page - 1) * limit
+    offset = await _timed(collection, filters, skip, limit, repeat)
+
+    if page == 1:
+        cursor_query = filters
+    else:
+        # Last post of the previous page, i.e. what its X-Next-Cursor points at
+        previous = await collection.find(filters, {"created_at": 1}).sort(FEED_SORT).skip(skip - 1).limit(1).to_list(1)
+        if not previous:
+            return None
+        cursor_query = after_cursor(filters, encode_cursor(previous[0]))
+    keyset = await _timed(collection, cursor_query, 0, limit, repeat)
+
+    return {"page": page, "offset": offset, "cursor": keyset}
+
+
+async def run(args) -> dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    url = args.mongo_url or os.getenv("MONGO_URL")
+    if not url:
+        raise SystemExit("Set MONGO_URL or pass --mongo-url")
+
+    client = AsyncIOMotorClient(url)
+    collection = client[args.database]["posts"]
+    if args.reseed:
+        await collection.drop()
+
+    started = time.perf_counter()
+    count = await seed(collection, args.posts, args.seed)
+    seed_s = time.perf_counter() - started
+
+    results = {}
+    for name, filters in SCENARIOS.items():
+        results[name] = [
+            r for r in [await bench_page(collection, filters, p, args.limit, args.repeat) for p in args.pages] if r
+        ]
+
+    client.close()
+    return {"posts": count, "limit": args.limit, "seed_s": round(seed_s, 1), "scenarios": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--database", default="hackzenith_bench")
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--reseed", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
@@ -0,0 +1,130 @@
+"""
+Feed throughput before and after the shared serializer.
+
+    python -m bench.feed_serialization --posts 5000 --sizes 10 100 1000
+
+Runs in process against the in-memory Mongo stand-in. "before" is the
+previous /posts/get_all handler (full documents, a dict rebuilt field by
+field, FastAPI's default JSON encoder); "after" is the current route.
+Reports requests/s for each page size, plus the encode-only time per page
+so the database stand-in's own cost can be told apart.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+
+def _setup_env():
+    # Measure encoding, not the post cache in front of it
+    os.environ["FEED_CACHE_PAGES"] = "0"
+    os.environ.setdefault("SMTP_EMAIL", "bench@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "bench")
+
+
+def legacy_item(post: dict) -> dict:
+    return {
+        "id": str(post["_id"]),
+        "types": post["types"],
+        "title": post["title"],
+        "description": post["description"],
+        "images": post["images"],
+        "user": post["user"],
+        "post_number": post["post_number"],
+        "location": post["location"],
+        "tags": post["tags"],
+        "created_at": post["created_at"].isoformat(),
+        "is_solved": post["is_solved"],
+    }
+
+
+def build_app():
+    from fastapi import FastAPI
+    from db.mongodb import posts_collection
+    from db.pagination import FEED_SORT
+    from router import post
+
+    app = FastAPI()
+    app.include_router(post.router)
+
+    @app.get("/legacy/get_all")
+    async def legacy_get_all(page: int = 1, limit: int = 10):
+        skip = (page - 1) * limit
+        posts = []
+        cursor = posts_collection.find().sort(FEED_SORT).skip(skip).limit(limit)
+        async for doc in cursor:
+            posts.append(legacy_item(doc))
+        return posts
+
+    return app
+
+
+async def requests_per_second(client, path: str, limit: int, seconds: float) -> float:
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        r = await client.get(path, params={"limit": limit})
+        r.raise_for_status()
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+def encode_ms(docs, repeat: int = 20) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    from model.serializers import dumps, serialize_post
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        json.dumps(jsonable_encoder([legacy_item(d) for d in docs])).encode()
+    before = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        dumps([serialize_post(d) for d in docs])
+    after = (time.perf_counter() - started) / repeat
+
+    return {"before_ms": round(before * 1000, 3), "after_ms": round(after * 1000, 3)}
+
+
+async def run(posts: int, sizes, seconds: float) -> dict:
+    _setup_env()
+    from bench import memdb
+    memdb.install()
+
+    import httpx
+    from bench.synthetic import generate
+    from db.mongodb import posts_collection
+
+    lost, found, _ = generate(posts // 2, posts - posts // 2)
+    for doc in lost + found:
+        doc["id"] = str(doc["_id"])
+        doc["images"] = [f"https://res.cloudinary.com/demo/image/upload/posts/{doc['_id']}.jpg"]
+    await posts_collection.insert_many(lost + found)
+
+    transport = httpx.ASGITransport(app=build_app())
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in sizes:
+            before = await requests_per_second(client, "/legacy/get_all", size, seconds)
+            after = await requests_per_second(client, "/posts/get_all", size, seconds)
+            page = await posts_collection.find().sort([("created_at", -1)]).limit(size).to_list(size)
+            results.append({
+                "page_size": size,
+                "before_rps": round(before, 1),
+                "after_rps": round(after, 1),
+                "speedup": round(after / before, 2),
+                "encode": encode_ms(page),
+            })
+
+    return {"posts": posts, "seconds_per_run": seconds, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.posts, args.sizes, args.seconds)), indent=2))
@@ -0,0 +1,95 @@
+"""
+End-to-end match_lost_found benchmark on synthetic data with the offline
+matcher and the in-memory Mongo stand-in.
+
+    python -m bench.matching --sizes 1000 10000 100000
+
+Each size runs in its own process so memory numbers are not shared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+def _setup_env():
+    os.environ["MATCHER_BACKEND"] = "local"
+    os.environ.setdefault("SMTP_EMAIL", "bench@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "bench")
+
+
+async def run_one(size: int, seed: int, trace_memory: bool) -> dict:
+    _setup_env()
+
+    from bench import memdb
+    memdb.install()
+
+    from bench.synthetic import generate
+    from ai import ai
+
+    lost, found, _ = generate(size // 2, size - size // 2, seed=seed)
+
+    from db.mongodb import lost_collection, found_collection, jobs_collection
+    await lost_collection.insert_many(lost)
+    await found_collection.insert_many(found)
+
+    if trace_memory:
+        tracemalloc.start()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    await ai.match_lost_found()
+    wall = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result = {
+        "posts": size,
+        "lost": len(lost),
+        "found": len(found),
+        "wall_s": round(wall, 3),
+        "matcher_calls": ai.matcher.calls,
+        "pairs_scored": ai.matcher.pairs_scored,
+        "naive_pairs": len(lost) * len(found),
+        "emails_queued": await jobs_collection.count_documents({"kind": "notify"}),
+        "max_rss_mb": round(rss_after / 1024, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+    }
+
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        result["traced_peak_mb"] = round(peak / 2**20, 1)
+
+    # A second run with nothing new should cost almost nothing
+    started = time.perf_counter()
+    await ai.match_lost_found()
+    result["idle_rerun_s"] = round(time.perf_counter() - started, 3)
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(asyncio.run(run_one(args.sizes[0], args.seed, args.trace_memory))))
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        cmd = [sys.executable, "-m", "bench.matching", "--single", "--sizes", str(size), "--seed", str(args.seed)]
+        if args.trace_memory:
+            cmd.append("--trace-memory")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(json.dumps(results, indent=2))
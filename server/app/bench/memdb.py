@@ -0,0 +1,792 @@
+"""
+In-memory stand-in for the motor collections in db.mongodb.
+
+Supports the subset of the query/update language the app uses, so the
+matching pipeline and routers can run end to end without a Mongo server:
+
+    from bench import memdb
+    memdb.install()        # before importing anything that imports db.mongodb
+"""
+import copy
+import re
+import sys
+import types
+from datetime import datetime
+
+from bson import ObjectId
+
+_MISSING = object()
+
+
+# ------------------- Query matching -------------------
+
+def get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            index = int(part)
+            value = value[index] if index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def unset_path(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _compare(a, b):
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+
+def _values(value):
+    # Array fields match if any element matches
+    if isinstance(value, list):
+        return [value, *value]
+    return [value]
+
+
+def _contains(container, value):
+    try:
+        return value in container
+    except TypeError:
+        return False
+
+
+def _match_operator(value, op, arg):
+    if op == "$eq":
+        return any(v == arg for v in _values(value))
+    if op == "$ne":
+        return not any(v == arg for v in _values(value))
+    if op == "$in":
+        return any(_contains(arg, v) for v in _values(value) if v is not _MISSING) or (value is _MISSING and None in arg)
+    if op == "$nin":
+        return not _match_operator(value, "$in", arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        if value is _MISSING:
+            return False
+        for v in _values(value):
+            c = _compare(v, arg)
+            if c is None:
+                continue
+            if (op == "$gt" and c > 0) or (op == "$gte" and c >= 0) or (op == "$lt" and c < 0) or (op == "$lte" and c <= 0):
+                return True
+        return False
+    if op == "$regex":
+        return isinstance(value, str) and re.search(arg, value) is not None
+    if op == "$size":
+        return isinstance(value, list) and len(value) == arg
+    if op == "$elemMatch":
+        return isinstance(value, list) and any(match(v, arg) for v in value)
+    raise NotImplementedError(f"memdb does not support {op}")
+
+
+def _match_text(doc, search):
+    terms = set(search.lower().split())
+    text = " ".join(
+        str(v) for v in (doc.get("title"), doc.get("description"), " ".join(doc.get("tags") or []))
+        if v
+    ).lower()
+    return any(term in text for term in terms)
+
+
+def match(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(match(doc, q) for q in cond):
+                return False
+        elif key == "$and":
+            if not all(match(doc, q) for q in cond):
+                return False
+        elif key == "$nor":
+            if any(match(doc, q) for q in cond):
+                return False
+        elif key == "$text":
+            if not _match_text(doc, cond["$search"]):
+                return False
+        else:
+            value = get_path(doc, key)
+            if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+                options = cond.get("$options", "")
+                for op, arg in cond.items():
+                    if op == "$options":
+                        continue
+                    if op == "$regex" and "i" in options:
+                        arg = f"(?i){arg}"
+                    if not _match_operator(value, op, arg):
+                        return False
+            elif not _match_operator(value, "$eq", cond):
+                return False
+    return True
+
+
+def prepare(query):
+    """Turn $in/$nin lists into sets once per query instead of once per document."""
+    out = {}
+    for key, cond in query.items():
+        if key in ("$or", "$and", "$nor"):
+            out[key] = [prepare(q) for q in cond]
+        elif isinstance(cond, dict):
+            cond = dict(cond)
+            for op in ("$in", "$nin"):
+                if isinstance(cond.get(op), list):
+                    try:
+                        cond[op] = frozenset(cond[op])
+                    except TypeError:
+                        pass
+            out[key] = cond
+        else:
+            out[key] = cond
+    return out
+
+
+# ------------------- Updates -------------------
+
+def _seed_from_query(query):
+    doc = {}
+    for key, cond in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            continue
+        set_path(doc, key, copy.deepcopy(cond))
+    return doc
+
+
+def apply_update(doc, update, inserting=False):
+    if not any(k.startswith("$") for k in update):
+        # Replacement document
+        _id = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if _id is not None:
+            doc.setdefault("_id", _id)
+        return
+
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                set_path(doc, path, copy.deepcopy(value))
+        elif op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    set_path(doc, path, copy.deepcopy(value))
+        elif op == "$unset":
+            for path in fields:
+                unset_path(doc, path)
+        elif op == "$inc":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                set_path(doc, path, (0 if current is _MISSING else current) + value)
+        elif op == "$max":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                if current is _MISSING or _compare(value, current) == 1:
+                    set_path(doc, path, value)
+        elif op == "$min":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                if current is _MISSING or _compare(value, current) == -1:
+                    set_path(doc, path, value)
+        elif op == "$push":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                items = [] if current is _MISSING else current
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(copy.deepcopy(value["$each"]))
+                    if "$slice" in value:
+                        n = value["$slice"]
+                        items = items[n:] if n < 0 else items[:n]
+                else:
+                    items.append(copy.deepcopy(value))
+                set_path(doc, path, items)
+        elif op == "$addToSet":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                items = [] if current is _MISSING else current
+                if value not in items:
+                    items.append(copy.deepcopy(value))
+                set_path(doc, path, items)
+        elif op == "$pull":
+            for path, value in fields.items():
+                current = get_path(doc, path)
+                if isinstance(current, list):
+                    set_path(doc, path, [v for v in current if v != value])
+        elif op == "$currentDate":
+            for path in fields:
+                set_path(doc, path, datetime.utcnow())
+        else:
+            raise NotImplementedError(f"memdb does not support {op}")
+
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {}
+        for path in include:
+            value = get_path(doc, path)
+            if value is not _MISSING:
+                set_path(out, path, copy.deepcopy(value))
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+
+    out = copy.deepcopy(doc)
+    for path, flag in projection.items():
+        if not flag:
+            unset_path(out, path)
+    return out
+
+
+def _sort_key(field):
+    # Missing and null sort before everything else, as in Mongo
+    def key(doc):
+        value = get_path(doc, field)
+        return (0, 0) if value is _MISSING or value is None else (1, value)
+    return key
+
+
+def _sort(docs, spec):
+    # Stable multi-key sort: apply the least significant key first
+    for field, direction in reversed(spec):
+        docs.sort(key=_sort_key(field), reverse=direction < 0)
+    return docs
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# ------------------- Results -------------------
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+
+class UpdateResult:
+    def __init__(self, matched, modified, upserted_id=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+
+class DeleteResult:
+    def __init__(self, deleted):
+        self.deleted_count = deleted
+        self.acknowledged = True
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.acknowledged = True
+
+
+# ------------------- Cursor & collection -------------------
+
+class Cursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def hint(self, _):
+        return self
+
+    def batch_size(self, _):
+        return self
+
+    def _run(self):
+        docs = self.collection._matching(self.query)
+        if self._sort:
+            _sort(docs, self._sort)
+        if self._skip:
+            docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[: self._limit]
+        return [project(doc, self.projection) for doc in docs]
+
+    def __aiter__(self):
+        self._results = iter(self._run())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        docs = self._run()
+        return docs if not length else docs[:length]
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": self.collection._plan(self.query, self._sort)}}
+
+
+class AggregateCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return self.docs if not length else self.docs[:length]
+
+
+class Collection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.indexes = {}
+        self._unique = []
+
+    def _key(self, _id):
+        return _id if not isinstance(_id, dict) else repr(sorted(_id.items()))
+
+    def _check_unique(self, doc, ignore=None):
+        for fields in self._unique:
+            values = [get_path(doc, f) for f in fields]
+            if any(v is _MISSING for v in values):
+                continue
+            for other in self.docs.values():
+                if other is ignore or other is doc:
+                    continue
+                if [get_path(other, f) for f in fields] == values:
+                    from pymongo.errors import DuplicateKeyError
+                    raise DuplicateKeyError(f"E11000 duplicate key on {self.name} {fields}")
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        key = self._key(doc["_id"])
+        if key in self.docs:
+            from pymongo.errors import DuplicateKeyError
+            raise DuplicateKeyError(f"E11000 duplicate key on {self.name} _id")
+        self._check_unique(doc)
+        self.docs[key] = doc
+        return doc["_id"]
+
+    async def insert_one(self, doc):
+        _id = self._insert(doc)
+        doc.setdefault("_id", _id)
+        return InsertOneResult(_id)
+
+    async def insert_many(self, docs, ordered=True):
+        ids = []
+        for doc in docs:
+            _id = self._insert(doc)
+            doc.setdefault("_id", _id)
+            ids.append(_id)
+        return InsertManyResult(ids)
+
+    def find(self, query=None, projection=None, **kwargs):
+        cursor = Cursor(self, query, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        cursor = Cursor(self, query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = cursor.limit(1)._run()
+        return docs[0] if docs else None
+
+    def _plan(self, query, sort=None):
+        """
+        Rough stand-in for the query planner, enough for db.indexes --check:
+        a query counts as indexed if some index leads with one of its fields
+        (every branch, for $or), or if it has no filter and sorts on one.
+        """
+        leading = {"_id"}
+        text = False
+        for index in self.indexes.values():
+            if any(direction == "text" for _, direction in index["key"]):
+                text = True
+            else:
+                leading.add(index["key"][0][0])
+
+        def indexed(q):
+            if "$text" in q:
+                return text
+            if any(k in leading for k in q if not k.startswith("$")):
+                return True
+            if "$or" in q and all(indexed(c) for c in q["$or"]):
+                return True
+            return any(indexed(c) for c in q.get("$and", []))
+
+        query = query or {}
+        if indexed(query) or (not query and sort and sort[0][0] in leading):
+            if "$text" in query:
+                return {"stage": "TEXT_MATCH", "inputStage": {"stage": "TEXT"}}
+            return {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+        return {"stage": "COLLSCAN"}
+
+    def _matching(self, query):
+        query = prepare(query or {})
+
+        # _id equality / $in is served from the primary key like a real index
+        ids = query.get("_id")
+        if ids is not None and not isinstance(ids, dict):
+            candidates = [self.docs.get(self._key(ids))]
+        elif isinstance(ids, dict) and set(ids) == {"$in"}:
+            candidates = [self.docs.get(self._key(i)) for i in ids["$in"]]
+        else:
+            candidates = self.docs.values()
+
+        return [doc for doc in candidates if doc is not None and match(doc, query)]
+
+    def _update(self, query, update, upsert, many):
+        docs = self._matching(query)
+        if not many:
+            docs = docs[:1]
+
+        if not docs:
+            if not upsert:
+                return UpdateResult(0, 0)
+            doc = _seed_from_query(query)
+            apply_update(doc, update, inserting=True)
+            _id = self._insert(doc)
+            return UpdateResult(0, 0, upserted_id=_id)
+
+        modified = 0
+        for doc in docs:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            self._check_unique(doc, ignore=doc)
+            if doc != before:
+                modified += 1
+        return UpdateResult(len(docs), modified)
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=True)
+
+    async def replace_one(self, query, doc, upsert=False):
+        return self._update(query, doc, upsert, many=False)
+
+    async def find_one_and_update(self, query, update, upsert=False, sort=None, return_document=False, projection=None):
+        docs = self._matching(query)
+        if sort:
+            _sort(docs, _normalize_sort(sort))
+
+        if not docs:
+            if not upsert:
+                return None
+            doc = _seed_from_query(query)
+            apply_update(doc, update, inserting=True)
+            _id = self._insert(doc)
+            return project(self.docs[self._key(_id)], projection) if return_document else None
+
+        doc = docs[0]
+        before = project(doc, projection)
+        apply_update(doc, update)
+        return project(doc, projection) if return_document else before
+
+    async def find_one_and_delete(self, query, sort=None, projection=None):
+        docs = self._matching(query)
+        if sort:
+            _sort(docs, _normalize_sort(sort))
+        if not docs:
+            return None
+        doc = docs[0]
+        del self.docs[self._key(doc["_id"])]
+        return project(doc, projection)
+
+    async def delete_one(self, query):
+        docs = self._matching(query)[:1]
+        for doc in docs:
+            del self.docs[self._key(doc["_id"])]
+        return DeleteResult(len(docs))
+
+    async def delete_many(self, query):
+        docs = self._matching(query)
+        for doc in docs:
+            del self.docs[self._key(doc["_id"])]
+        return DeleteResult(len(docs))
+
+    async def count_documents(self, query, limit=0):
+        count = len(self._matching(query))
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def distinct(self, field, query=None):
+        seen = []
+        for doc in self._matching(query or {}):
+            value = get_path(doc, field)
+            for v in (value if isinstance(value, list) else [value]):
+                if v is not _MISSING and v not in seen:
+                    seen.append(v)
+        return seen
+
+    async def bulk_write(self, ops, ordered=True):
+        result = BulkWriteResult()
+        for op in ops:
+            kind = type(op).__name__
+            doc = getattr(op, "_doc", None)
+            query = getattr(op, "_filter", None)
+            upsert = bool(getattr(op, "_upsert", False))
+            if kind == "InsertOne":
+                self._insert(doc)
+                result.inserted_count += 1
+            elif kind in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+                r = self._update(query, doc, upsert, many=kind == "UpdateMany")
+                result.matched_count += r.matched_count
+                result.modified_count += r.modified_count
+                result.upserted_count += 1 if r.upserted_id is not None else 0
+            elif kind in ("DeleteOne", "DeleteMany"):
+                docs = self._matching(query)
+                if kind == "DeleteOne":
+                    docs = docs[:1]
+                for d in docs:
+                    del self.docs[self._key(d["_id"])]
+                result.deleted_count += len(docs)
+            else:
+                raise NotImplementedError(f"memdb does not support {kind}")
+        return result
+
+    async def create_index(self, keys, unique=False, name=None, **kwargs):
+        spec = _normalize_sort(keys)
+        name = name or "_".join(f"{f}_{d}" for f, d in spec)
+        if name in self.indexes:
+            return name
+        self.indexes[name] = {"key": spec, "unique": unique, **kwargs}
+        if unique:
+            self._unique.append([f for f, _ in spec])
+        return name
+
+    async def create_indexes(self, models):
+        names = []
+        for model in models:
+            document = model.document
+            keys = list(document["key"].items())
+            options = {k: v for k, v in document.items() if k != "key"}
+            names.append(await self.create_index(keys, **options))
+        return names
+
+    async def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}, **self.indexes}
+
+    async def drop(self):
+        self.docs.clear()
+        self.indexes.clear()
+        self._unique.clear()
+
+    def aggregate(self, pipeline):
+        return AggregateCursor(run_pipeline(list(self.docs.values()), pipeline))
+
+    def watch(self, *args, **kwargs):
+        from pymongo.errors import OperationFailure
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+
+def run_pipeline(docs, pipeline):
+    docs = [copy.deepcopy(d) for d in docs]
+    for stage in pipeline:
+        (op, arg), = stage.items()
+        if op == "$match":
+            docs = [d for d in docs if match(d, arg)]
+        elif op == "$sort":
+            _sort(docs, list(arg.items()))
+        elif op == "$limit":
+            docs = docs[:arg]
+        elif op == "$skip":
+            docs = docs[arg:]
+        elif op == "$project":
+            docs = [project(d, arg) for d in docs]
+        elif op == "$count":
+            docs = [{arg: len(docs)}]
+        elif op == "$replaceRoot":
+            path = arg["newRoot"].lstrip("$")
+            docs = [get_path(d, path) for d in docs]
+        elif op == "$group":
+            docs = _group(docs, arg)
+        else:
+            raise NotImplementedError(f"memdb does not support {op}")
+    return docs
+
+
+def _expr(doc, expr):
+    if isinstance(expr, str) and expr.startswith("$$ROOT"):
+        return doc
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = get_path(doc, expr[1:])
+        return None if value is _MISSING else value
+    return expr
+
+
+def _group(docs, spec):
+    groups = {}
+    order = []
+    for doc in docs:
+        key = _expr(doc, spec["_id"])
+        hashable = repr(key)
+        if hashable not in groups:
+            groups[hashable] = {"_id": key}
+            order.append(hashable)
+        group = groups[hashable]
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = acc.items()
+            value = _expr(doc, expr)
+            if op == "$first":
+                group.setdefault(field, value)
+            elif op == "$last":
+                group[field] = value
+            elif op == "$sum":
+                group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif op == "$max":
+                group[field] = value if field not in group else max(group[field], value)
+            elif op == "$min":
+                group[field] = value if field not in group else min(group[field], value)
+            elif op == "$push":
+                group.setdefault(field, []).append(value)
+            else:
+                raise NotImplementedError(f"memdb does not support {op}")
+    return [groups[k] for k in order]
+
+
+class Database:
+    def __init__(self, name):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = Collection(name)
+        return self.collections[name]
+
+    __getattr__ = __getitem__
+
+    async def command(self, *args, **kwargs):
+        return {"ok": 1}
+
+
+class Client:
+    def __init__(self):
+        self.databases = {}
+        self.admin = Database("admin")
+
+    def __getitem__(self, name):
+        if name not in self.databases:
+            self.databases[name] = Database(name)
+        return self.databases[name]
+
+    def close(self):
+        pass
+
+
+def install(database_name="hackzenith"):
+    """
+    Register an in-memory `db.mongodb` module exposing the same names as
+    the real one. Must run before the app modules are imported.
+    """
+    import importlib
+
+    real = None
+    try:
+        # Read the collection names from the real module without connecting
+        import os
+        os.environ.setdefault("MONGO_URL", "mongodb://memdb.invalid:27017")
+        real = importlib.import_module("db.mongodb")
+    except Exception:
+        pass
+
+    client = Client()
+    db = client[database_name]
+
+    module = types.ModuleType("db.mongodb")
+    module.DATABASE_NAME = database_name
+    module.client = client
+    module.db = db
+
+    names = [n for n in dir(real) if n.endswith("_collection")] if real else []
+    for name in names:
+        module.__dict__[name] = db[getattr(real, name).name]
+
+    # Anything else the real module exposes (helpers, constants) stays available
+    if real:
+        for name, value in vars(real).items():
+            if name.startswith("__") or name in module.__dict__:
+                continue
+            module.__dict__[name] = value
+
+    sys.modules["db.mongodb"] = module
+    if "db" in sys.modules:
+        # `from db import mongodb` reads the package attribute
+        sys.modules["db"].mongodb = module
+    return db
+
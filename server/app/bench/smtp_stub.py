@@ -0,0 +1,114 @@
+"""
+Minimal local SMTP server that accepts and records every message.
+
+    python -m bench.smtp_stub --port 1025
+
+Point the app at it with SMTP_SERVER=localhost SMTP_PORT=1025
+SMTP_SSL_TLS=false. Inside a script, use `SMTPStub` directly.
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+
+
+class SMTPStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, fail_first: int = 0, delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.messages = []
+        self.connections = 0
+        # Reject the first N DATA commands to exercise retries
+        self.fail_first = fail_first
+        # Artificial latency per command, to mimic a slow relay
+        self.delay = delay
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _reply(self, writer, line: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await self._reply(writer, "220 smtp-stub ready")
+        sender, recipients = None, []
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                writer.write(b"250-smtp-stub\r\n250-AUTH PLAIN LOGIN\r\n")
+                await self._reply(writer, "250 8BITMIME")
+            elif verb == "HELO":
+                await self._reply(writer, "250 smtp-stub")
+            elif verb == "AUTH":
+                await self._reply(writer, "235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<> "), []
+                await self._reply(writer, "250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<> "))
+                await self._reply(writer, "250 OK")
+            elif verb == "DATA":
+                await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                data = bytearray()
+                while True:
+                    chunk = await reader.readline()
+                    if chunk in (b".\r\n", b".\n", b""):
+                        break
+                    data.extend(chunk[1:] if chunk.startswith(b"..") else chunk)
+
+                if self.fail_first > 0:
+                    self.fail_first -= 1
+                    await self._reply(writer, "451 4.3.0 Try again later")
+                else:
+                    self.messages.append({
+                        "from": sender,
+                        "to": recipients,
+                        "message": message_from_bytes(bytes(data)),
+                    })
+                    await self._reply(writer, "250 OK queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                await self._reply(writer, "250 OK")
+            elif verb == "NOOP":
+                await self._reply(writer, "250 OK")
+            elif verb == "QUIT":
+                await self._reply(writer, "221 Bye")
+                break
+            else:
+                await self._reply(writer, "502 Command not implemented")
+
+        writer.close()
+
+
+async def _serve(host, port):
+    stub = await SMTPStub(host, port).start()
+    print(f"SMTP stub listening on {stub.host}:{stub.port}")
+    while True:
+        await asyncio.sleep(5)
+        if stub.messages:
+            print(f"{len(stub.messages)} messages received over {stub.connections} connections")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
@@ -0,0 +1,101 @@
+"""
+Offline stand-ins for Cloudinary and Gemini, for benchmarks.
+
+    from bench import stubs
+    stubs.install(upload_ms=40, gemini_ms=300)
+
+StubImageStore replaces the configured image store: save() sleeps like a
+blocking SDK upload (it runs on the image executor, as the real one does)
+and returns a Cloudinary-shaped URL. StubGeminiModel replaces the
+GenerativeModel behind gemini_client: it reads the posts back out of the
+prompt, scores them with the local matcher and answers in Gemini's format
+(fenced JSON, usage metadata), so the whole GeminiMatcher path runs. SMTP
+has its own stub in bench.smtp_stub.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from cure.images import ImageStore
+
+_PROMPT_POSTS = re.compile(r"LOST POST:\s*(\{.*\})\s*FOUND POSTS:\s*(\[.*\])\s*Return ONLY", re.DOTALL)
+
+
+def _jitter(rng: random.Random, seconds: float) -> float:
+    # Between half and one and a half times the nominal latency
+    return seconds * (0.5 + rng.random())
+
+
+class StubImageStore(ImageStore):
+    def __init__(self, upload_ms: float = 40, seed: int = 7):
+        self.latency = upload_ms / 1000
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.bytes = 0
+
+    def save(self, key: str, data: bytes) -> str:
+        with self.lock:
+            delay = _jitter(self.rng, self.latency)
+            self.uploads += 1
+            self.bytes += len(data)
+        time.sleep(delay)
+        return f"https://res.cloudinary.com/bench/image/upload/posts/{key}.webp"
+
+
+class _Usage:
+    def __init__(self, prompt: int, completion: int):
+        self.prompt_token_count = prompt
+        self.candidates_token_count = completion
+        self.total_token_count = prompt + completion
+
+
+class _Response:
+    def __init__(self, text: str, usage: _Usage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class StubGeminiModel:
+    def __init__(self, latency_ms: float = 300, seed: int = 7):
+        from ai.matchers import LocalMatcher
+
+        self.latency = latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.scorer = LocalMatcher()
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str) -> _Response:
+        self.calls += 1
+        await asyncio.sleep(_jitter(self.rng, self.latency))
+
+        parsed = _PROMPT_POSTS.search(prompt)
+        if not parsed:
+            raise ValueError("Prompt does not contain the LOST/FOUND sections")
+        lost, found_posts = json.loads(parsed.group(1)), json.loads(parsed.group(2))
+
+        matches = [
+            {
+                "found_post_id": str(found.get("_id")),
+                "user_email": (found.get("user") or {}).get("email"),
+                "score": round(self.scorer.score(lost, found), 2),
+            }
+            for found in found_posts
+        ]
+        text = "```json\n" + json.dumps({"matches": matches}, indent=2) + "\n```"
+        return _Response(text, _Usage(len(prompt) // 4, len(text) // 4))
+
+
+def install(upload_ms: float = 40, gemini_ms: float = 300, seed: int = 7):
+    """Swap the image store and Gemini model of the running app for the stubs; returns both."""
+    from ai.client import gemini_client
+    from cure import images
+
+    store = StubImageStore(upload_ms, seed)
+    model = StubGeminiModel(gemini_ms, seed)
+    images._store = store
+    gemini_client._model = model
+    return store, model
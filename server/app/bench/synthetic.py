@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+ITEMS = [
+    "wallet", "phone", "keys", "backpack", "watch", "umbrella", "earbuds", "bottle",
+    "jacket", "id card", "charger", "spectacles", "laptop", "calculator", "notebook",
+    "headphones", "ring", "bracelet", "scarf", "cap", "helmet", "power bank", "pen drive",
+    "tablet", "purse", "lunch box", "book", "sunglasses", "hoodie", "shoes",
+]
+
+COLOURS = [
+    "black", "white", "red", "blue", "green", "grey", "brown", "pink", "purple", "yellow",
+    "orange", "silver", "gold", "navy", "maroon", "beige", "teal", "olive", "cream", "violet",
+]
+
+BRANDS = [
+    "apple", "samsung", "oneplus", "nike", "adidas", "puma", "casio", "titan", "fastrack",
+    "boat", "jbl", "sony", "lenovo", "hp", "dell", "asus", "milton", "cello", "wildcraft",
+    "skybags", "fossil", "noise", "realme", "xiaomi", "redmi", "vivo", "oppo", "boult",
+    "zebronics", "lavie", "baggit", "ray-ban", "woodland", "bata", "reebok", "decathlon",
+    "tupperware", "classmate", "parker", "sandisk",
+]
+
+DETAILS = [
+    "scratched", "sticker", "cracked", "new", "old", "torn", "engraved", "keychain",
+    "cover", "strap", "zip", "pouch", "initials", "dented", "patterned", "striped",
+    "checked", "leather", "plastic", "metal", "fabric", "rubber", "wooden", "glossy",
+]
+
+AREAS = [
+    "library", "canteen", "hostel", "gym", "parking", "auditorium", "lab", "bus stop",
+    "admin block", "football ground", "basketball court", "seminar hall", "workshop",
+    "main gate", "cafeteria", "chemistry lab", "computer centre", "medical room",
+]
+
+
+def _post(kind, item, colour, brand, details, place, area, created_at, rng):
+    return {
+        "_id": ObjectId(),
+        "types": kind,
+        "title": f"{kind.capitalize()} {colour} {brand} {item}",
+        "description": f"{colour} {item} with {' '.join(details)} near the {area}",
+        "user": {
+            "uid": f"u{rng.randrange(10_000)}",
+            "email": f"user{rng.randrange(10_000)}@example.com",
+            "name": "Bench User",
+        },
+        "post_number": str(rng.randrange(10_000)),
+        "location": {"place": place, "area": area},
+        "tags": [item, colour, brand],
+        "created_at": created_at,
+        "is_solved": False,
+    }
+
+
+def _random_post(kind, created_at, rng):
+    return _post(
+        kind,
+        rng.choice(ITEMS),
+        rng.choice(COLOURS),
+        rng.choice(BRANDS),
+        rng.sample(DETAILS, k=2),
+        f"room {rng.randrange(1, 400)}",
+        rng.choice(AREAS),
+        created_at,
+        rng,
+    )
+
+
+def generate(n_lost: int, n_found: int, seed: int = 7, pair_ratio: float = 0.5):
+    """
+    Build synthetic lost/found posts. A `pair_ratio` share of the lost posts
+    has a true counterpart in the found set; returns (lost, found, truth)
+    where truth maps lost _id -> found _id.
+    """
+    rng = random.Random(seed)
+    start = datetime.utcnow() - timedelta(days=30)
+    lost, found, truth = [], [], {}
+
+    for i in range(n_found):
+        found.append(_random_post("found", start + timedelta(seconds=i), rng))
+
+    for i in range(n_lost):
+        created_at = start + timedelta(seconds=i)
+        if found and rng.random() < pair_ratio:
+            twin = rng.choice(found)
+            item, colour, brand = twin["tags"]
+            # owners remember the item, colour and brand but describe it differently
+            post = _post("lost", item, colour, brand, rng.sample(DETAILS, k=2),
+                         twin["location"]["place"], twin["location"]["area"], created_at, rng)
+            truth[post["_id"]] = twin["_id"]
+        else:
+            post = _random_post("lost", created_at, rng)
+        lost.append(post)
+
+    return lost, found, truth
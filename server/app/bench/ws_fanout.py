@@ -0,0 +1,149 @@
+"""
+Multi-process fan-out throughput through the socket backplane.
+
+    python -m bench.ws_fanout --workers 4 --users 2000 --messages 50000
+
+Starts a BackplaneHub, spawns worker processes that each "hold" the
+sockets of a share of the users, has every worker publish a slice of the
+messages, and checks every connection received exactly its messages.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from collections import Counter
+
+
+def owner(user: int, workers: int) -> int:
+    return user % workers
+
+
+def target(message: int, users: int) -> int:
+    return (message * 7919) % users
+
+
+async def run_worker(address, index, workers, users, messages, sockets_per_user):
+    from cure.backplane import SocketBackplane
+
+    backplane = SocketBackplane(address)
+    local_users = {u for u in range(users) if owner(u, workers) == index}
+    expected = Counter()
+    for m in range(messages):
+        u = target(m, users)
+        if u in local_users:
+            for s in range(sockets_per_user):
+                expected[(u, s)] += 1
+
+    received = Counter()
+    total_expected = sum(expected.values())
+    total_received = 0
+    done = asyncio.Event()
+
+    async def deliver(user_id, payload):
+        nonlocal total_received
+        user = int(user_id)
+        if user not in local_users:
+            return
+        for s in range(sockets_per_user):
+            received[(user, s)] += 1
+        total_received += sockets_per_user
+        if total_received >= total_expected:
+            done.set()
+
+    backplane.subscribe("bench", deliver)
+    await backplane.start()
+    await backplane.connected.wait()
+
+    print("ready", flush=True)
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+
+    started = time.perf_counter()
+    for m in range(index, messages, workers):
+        await backplane.publish("bench", str(target(m, users)), {"n": m})
+
+    if total_expected:
+        try:
+            await asyncio.wait_for(done.wait(), timeout=120)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "worker": index,
+        "elapsed_s": elapsed,
+        "connections": len(local_users) * sockets_per_user,
+        "deliveries": sum(received.values()),
+        "expected": total_expected,
+        "exactly_once": received == expected,
+        "duplicates_dropped": backplane.duplicates,
+        "resent": backplane.resent,
+    }), flush=True)
+    await backplane.stop()
+
+
+async def run(workers, users, messages, sockets_per_user):
+    from cure.backplane import BackplaneHub
+
+    hub = await BackplaneHub("127.0.0.1:0").start()
+    address = f"127.0.0.1:{hub.port}"
+
+    procs = []
+    for i in range(workers):
+        procs.append(await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "bench.ws_fanout", "--worker", str(i),
+            "--address", address, "--workers", str(workers), "--users", str(users),
+            "--messages", str(messages), "--sockets-per-user", str(sockets_per_user),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        ))
+
+    for p in procs:
+        line = await p.stdout.readline()
+        assert line.strip() == b"ready", line
+
+    started = time.perf_counter()
+    for p in procs:
+        p.stdin.write(b"go\n")
+        await p.stdin.drain()
+
+    results = []
+    for p in procs:
+        out = await p.stdout.readline()
+        results.append(json.loads(out))
+        await p.wait()
+    wall = time.perf_counter() - started
+
+    await hub.stop()
+
+    deliveries = sum(r["deliveries"] for r in results)
+    return {
+        "workers": workers,
+        "users": users,
+        "connections": users * sockets_per_user,
+        "messages": messages,
+        "wall_s": round(wall, 3),
+        "messages_per_s": round(messages / wall, 1),
+        "deliveries": deliveries,
+        "deliveries_per_s": round(deliveries / wall, 1),
+        "hub_frames_relayed": hub.relayed,
+        "exactly_once": all(r["exactly_once"] for r in results),
+        "per_worker": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--sockets-per-user", type=int, default=1)
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--address", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        asyncio.run(run_worker(args.address, args.worker, args.workers, args.users,
+                               args.messages, args.sockets_per_user))
+    else:
+        print(json.dumps(asyncio.run(run(args.workers, args.users, args.messages, args.sockets_per_user)), indent=2))
@@ -0,0 +1,35 @@
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "firebase-service-account.json")
+
+
+def _project_id_from_credentials():
+    try:
+        with open(FIREBASE_CREDENTIALS) as f:
+            return json.load(f).get("project_id")
+    except (OSError, ValueError):
+        return None
+
+
+# "google" verifies real Firebase ID tokens, "local" uses a key pair on disk (offline/dev)
+AUTH_KEYS = os.getenv("AUTH_KEYS", "google")
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID") or _project_id_from_credentials() or "local-project"
+
+FIREBASE_CERTS_URL = os.getenv(
+    "FIREBASE_CERTS_URL",
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com",
+)
+AUTH_LOCAL_KEY_FILE = os.getenv("AUTH_LOCAL_KEY_FILE", ".local-auth-key.pem")
+
+# Decoded tokens kept in memory, and threads for the signature checks of cache misses
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+
+# Who may use the /debug endpoints (profiler, slow requests): comma separated Firebase
+# uids and verified emails; tokens carrying an `admin: true` custom claim also pass
+ADMIN_UIDS = {u.strip() for u in os.getenv("ADMIN_UIDS", "").split(",") if u.strip()}
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
@@ -3,4 +3,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-GEMINI_API_URL = os.getenv("GEMINI_API_URL")
\ No newline at end of file
+GEMINI_API_URL = os.getenv("GEMINI_API_URL")
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Matcher dispatch limits
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))
@@ -0,0 +1,16 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "cloudinary" in production, "local" to write files under IMAGE_LOCAL_DIR
+IMAGE_STORE = os.getenv("IMAGE_STORE", "cloudinary")
+IMAGE_LOCAL_DIR = os.getenv("IMAGE_LOCAL_DIR", "media")
+IMAGE_LOCAL_URL = os.getenv("IMAGE_LOCAL_URL", "/media")
+
+# Threads shared by image decoding/resizing and uploads
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "8"))
+
+# Largest accepted upload, and the decoded size beyond which an image is rejected
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
@@ -0,0 +1,19 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SMTP_EMAIL = os.getenv("SMTP_EMAIL")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL_TLS = os.getenv("SMTP_SSL_TLS", "true").lower() == "true"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+
+# Outbound mail queue
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", "2"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+MAIL_BACKOFF_SECONDS = int(os.getenv("MAIL_BACKOFF_SECONDS", "30"))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "2"))
+# Sent and failed messages are removed this long after they finish (TTL index)
+MAIL_RETENTION = int(os.getenv("MAIL_RETENTION_SECONDS", str(7 * 24 * 3600)))
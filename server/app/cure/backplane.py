@@ -0,0 +1,466 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "memory" for a single process, "socket" to fan out through a hub
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memory")
+WS_BACKPLANE_ADDRESS = os.getenv("WS_BACKPLANE_ADDRESS", "127.0.0.1:8765")
+
+# How many recent envelope ids each process remembers to drop redeliveries
+SEEN_LIMIT = 50_000
+
+# Frames a worker keeps until the hub acknowledges them; publish() waits past this
+OUTGOING_LIMIT = int(os.getenv("WS_BACKPLANE_OUTGOING_LIMIT", "10000"))
+
+# Acknowledgements are cumulative, sent every ACK_EVERY frames or ACK_INTERVAL seconds
+ACK_EVERY = 256
+ACK_INTERVAL = 0.05
+
+# The hub keeps frames for a disconnected worker this long, and at most this many
+HUB_SUBSCRIBER_TTL = float(os.getenv("WS_BACKPLANE_SUBSCRIBER_TTL", "60"))
+HUB_OUTBOX_LIMIT = int(os.getenv("WS_BACKPLANE_OUTBOX_LIMIT", "100000"))
+
+RECONNECT_DELAY = 1
+
+# Bytes buffered for one subscriber before the hub waits for it to catch up
+HUB_HIGH_WATER = 1 << 20
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+class Backplane:
+    """
+    Routes websocket pushes to whichever process holds the socket.
+
+    Every process subscribes a local delivery handler per channel
+    ("notifications", "chat", ...). publish() broadcasts an envelope to all
+    processes; each one hands it to its handler, which pushes to the user's
+    sockets if they are connected there. Envelope ids are remembered so a
+    redelivered envelope reaches each connection only once.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+        self.published = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.seen: OrderedDict = OrderedDict()
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel] = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @staticmethod
+    def envelope(channel: str, user_id: str, payload: dict) -> dict:
+        return {"id": uuid.uuid4().hex, "channel": channel, "user_id": user_id, "payload": payload}
+
+    async def publish(self, channel: str, user_id: str, payload: dict):
+        raise NotImplementedError
+
+    async def dispatch(self, envelope: dict):
+        message_id = envelope["id"]
+        if message_id in self.seen:
+            self.duplicates += 1
+            return
+
+        self.seen[message_id] = None
+        if len(self.seen) > SEEN_LIMIT:
+            self.seen.popitem(last=False)
+
+        handler = self.handlers.get(envelope["channel"])
+        if handler is None:
+            return
+
+        try:
+            await handler(envelope["user_id"], envelope["payload"])
+            self.delivered += 1
+        except Exception as e:
+            print(f"Backplane handler error on {envelope['channel']}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "delivered": self.delivered,
+            "duplicates": self.duplicates,
+        }
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publish delivers straight to the local handler."""
+
+    async def publish(self, channel: str, user_id: str, payload: dict):
+        self.published += 1
+        await self.dispatch(self.envelope(channel, user_id, payload))
+
+
+# ------------------- Socket hub -------------------
+
+def parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class _Subscriber:
+    """Hub-side state of one worker, kept across its reconnects."""
+
+    def __init__(self):
+        self.writer = None
+        # seq -> frame line, until the worker acknowledges it
+        self.outbox: OrderedDict = OrderedDict()
+        self.next_seq = 1
+        # Highest publish number relayed for this worker, and the last one acknowledged to it
+        self.accepted = 0
+        self.acked = 0
+        self.gone_at: Optional[float] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    def confirm(self, seq: int):
+        while self.outbox and next(iter(self.outbox)) <= seq:
+            self.outbox.popitem(last=False)
+
+    def ack(self):
+        if self.acked != self.accepted and self.connected:
+            self.writer.write(f'{{"acked":{self.accepted}}}\n'.encode())
+            self.acked = self.accepted
+
+
+class BackplaneHub:
+    """
+    Relay every envelope a worker publishes to all connected workers,
+    including the sender. Run one per deployment:
+
+        python -m cure.backplane --hub --address 0.0.0.0:8765
+
+    Both hops are acknowledged. A worker numbers what it publishes and keeps
+    each frame until the hub acknowledges it; the hub numbers what it sends
+    each worker and keeps it in that worker's outbox until the worker
+    acknowledges it. Workers identify themselves on connect, so after a
+    dropped connection both sides resend what the other has not confirmed
+    and skip what it already has. A worker away longer than
+    HUB_SUBSCRIBER_TTL, or more than HUB_OUTBOX_LIMIT frames behind, is
+    forgotten and starts over when it comes back; so does everyone if the
+    hub itself restarts, minus the unacknowledged frames workers resend.
+    """
+
+    def __init__(self, address: str = WS_BACKPLANE_ADDRESS):
+        self.host, self.port = parse_address(address)
+        self.subscribers: Dict[str, _Subscriber] = {}
+        self.server = None
+        self._expiry = None
+        self.relayed = 0
+        self.duplicates = 0
+        self.forgotten = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._expiry = asyncio.create_task(self._expire())
+        return self
+
+    async def stop(self):
+        if self._expiry:
+            self._expiry.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for subscriber in self.subscribers.values():
+            if subscriber.writer:
+                subscriber.writer.close()
+
+    async def _handle(self, reader, writer):
+        subscriber = acker = None
+        try:
+            hello = json.loads(await reader.readline() or "null")
+            if not isinstance(hello, dict) or "hello" not in hello:
+                return
+
+            worker = hello["hello"]
+            subscriber = self.subscribers.get(worker)
+            resumed = subscriber is not None
+            if subscriber is None:
+                subscriber = self.subscribers[worker] = _Subscriber()
+            elif subscriber.writer is not None:
+                subscriber.writer.close()
+
+            # Resend what the worker has not confirmed before anything new is relayed to it
+            subscriber.confirm(hello.get("received", 0))
+            subscriber.writer, subscriber.gone_at = writer, None
+            subscriber.acked = subscriber.accepted
+            writer.write((json.dumps({"welcome": subscriber.accepted, "resumed": resumed}) + "\n").encode())
+            for line in subscriber.outbox.values():
+                writer.write(line)
+            await writer.drain()
+
+            acker = asyncio.create_task(self._ack_periodically(subscriber))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if "pub" in message:
+                    await self._relay(subscriber, message)
+                elif "ack" in message:
+                    subscriber.confirm(message["ack"])
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            if acker:
+                acker.cancel()
+            if subscriber is not None and subscriber.writer is writer:
+                subscriber.writer, subscriber.gone_at = None, time.monotonic()
+            writer.close()
+
+    async def _relay(self, publisher: _Subscriber, message: dict):
+        if message["pub"] <= publisher.accepted:
+            # Resent after a reconnect, already relayed
+            self.duplicates += 1
+            return
+        publisher.accepted = message["pub"]
+        self.relayed += 1
+
+        # Serialized once, framed per worker with its own sequence number
+        envelope = json.dumps(message["env"], separators=(",", ":"))
+        for worker, subscriber in list(self.subscribers.items()):
+            seq = subscriber.next_seq
+            subscriber.next_seq += 1
+            line = f'{{"seq":{seq},"env":{envelope}}}\n'.encode()
+            subscriber.outbox[seq] = line
+            if len(subscriber.outbox) > HUB_OUTBOX_LIMIT:
+                self._forget(worker, "too far behind")
+                continue
+            if not subscriber.connected:
+                continue
+            subscriber.writer.write(line)
+            # Only wait on subscribers that are falling behind
+            if subscriber.writer.transport.get_write_buffer_size() > HUB_HIGH_WATER:
+                try:
+                    await subscriber.writer.drain()
+                except ConnectionError:
+                    pass
+
+        if publisher.accepted - publisher.acked >= ACK_EVERY:
+            publisher.ack()
+
+    async def _ack_periodically(self, subscriber: _Subscriber):
+        while True:
+            await asyncio.sleep(ACK_INTERVAL)
+            subscriber.ack()
+
+    def _forget(self, worker: str, reason: str):
+        subscriber = self.subscribers.pop(worker, None)
+        if subscriber is None:
+            return
+        self.forgotten += 1
+        print(f"Backplane hub dropped worker {worker} ({reason}), {len(subscriber.outbox)} frame(s) undelivered")
+        if subscriber.writer:
+            subscriber.writer.close()
+
+    async def _expire(self):
+        while True:
+            await asyncio.sleep(max(HUB_SUBSCRIBER_TTL / 4, ACK_INTERVAL))
+            cutoff = time.monotonic() - HUB_SUBSCRIBER_TTL
+            for worker, subscriber in list(self.subscribers.items()):
+                if subscriber.gone_at is not None and subscriber.gone_at < cutoff:
+                    self._forget(worker, "disconnected")
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.subscribers),
+            "connected": sum(s.connected for s in self.subscribers.values()),
+            "relayed": self.relayed,
+            "duplicates": self.duplicates,
+            "forgotten": self.forgotten,
+            "undelivered": sum(len(s.outbox) for s in self.subscribers.values()),
+        }
+
+
+class SocketBackplane(Backplane):
+    """
+    Multi-process backplane: every worker keeps one TCP connection to a
+    BackplaneHub, publishes envelopes to it and dispatches everything the
+    hub relays back. Reconnects automatically if the hub restarts.
+
+    Published frames are kept until the hub acknowledges them and resent
+    after a reconnect; publish() waits while OUTGOING_LIMIT of them are
+    outstanding instead of dropping. Frames from the hub are acknowledged
+    once dispatched, and any the hub sends again are skipped by sequence
+    number or envelope id, so each reaches the local sockets once.
+    """
+
+    def __init__(self, address: str = WS_BACKPLANE_ADDRESS):
+        super().__init__()
+        self.host, self.port = parse_address(address)
+        self.worker_id = uuid.uuid4().hex
+        # publish number -> frame line, until the hub acknowledges it
+        self.unacked: OrderedDict = OrderedDict()
+        self.last_published = 0
+        self.room = asyncio.Event()
+        self.room.set()
+        # Publish numbers to write on the current connection
+        self.outgoing: asyncio.Queue = asyncio.Queue()
+        # Last hub sequence number dispatched, and the last one acknowledged to the hub
+        self.received = 0
+        self.confirmed = 0
+        self.resent = 0
+        self.connections = 0
+        self.connected = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.connected.clear()
+
+    async def publish(self, channel: str, user_id: str, payload: dict):
+        while len(self.unacked) >= OUTGOING_LIMIT:
+            self.room.clear()
+            await self.room.wait()
+
+        self.published += 1
+        self.last_published += 1
+        envelope = self.envelope(channel, user_id, payload)
+        line = json.dumps({"pub": self.last_published, "env": envelope}, default=str) + "\n"
+        self.unacked[self.last_published] = line.encode()
+        self.outgoing.put_nowait(self.last_published)
+
+    def _acked(self, number: int):
+        while self.unacked and next(iter(self.unacked)) <= number:
+            self.unacked.popitem(last=False)
+        if len(self.unacked) < OUTGOING_LIMIT:
+            self.room.set()
+
+    def _confirm(self, writer):
+        if self.received != self.confirmed:
+            writer.write(f'{{"ack":{self.received}}}\n'.encode())
+            self.confirmed = self.received
+
+    async def _send(self, writer):
+        while True:
+            number = await self.outgoing.get()
+            line = self.unacked.get(number)
+            if line is None:
+                continue
+            writer.write(line)
+            if self.outgoing.empty():
+                await writer.drain()
+
+    async def _confirm_periodically(self, writer):
+        while True:
+            await asyncio.sleep(ACK_INTERVAL)
+            self._confirm(writer)
+
+    async def _run(self):
+        while True:
+            tasks = []
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write((json.dumps({"hello": self.worker_id, "received": self.received}) + "\n").encode())
+                welcome = json.loads(await reader.readline() or "null")
+                if not isinstance(welcome, dict) or "welcome" not in welcome:
+                    raise ConnectionError("no welcome from the hub")
+
+                if not welcome.get("resumed"):
+                    # A hub that does not know this worker numbers its frames from 1
+                    self.received = 0
+                self.confirmed = self.received
+                self._acked(welcome["welcome"])
+
+                # Everything the hub has not acknowledged goes out again, in order, before new frames
+                if self.connections:
+                    self.resent += len(self.unacked)
+                self.connections += 1
+                self.outgoing = asyncio.Queue()
+                for number in self.unacked:
+                    self.outgoing.put_nowait(number)
+
+                self.connected.set()
+                tasks = [
+                    asyncio.create_task(self._send(writer)),
+                    asyncio.create_task(self._confirm_periodically(writer)),
+                ]
+
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = json.loads(line)
+                    if "seq" in message:
+                        if message["seq"] <= self.received:
+                            continue
+                        self.received = message["seq"]
+                        await self.dispatch(message["env"])
+                        if self.received - self.confirmed >= ACK_EVERY:
+                            self._confirm(writer)
+                    elif "acked" in message:
+                        self._acked(message["acked"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Backplane connection to {self.host}:{self.port} failed: {e}")
+            finally:
+                self.connected.clear()
+                for task in tasks:
+                    task.cancel()
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "connected": self.connected.is_set(),
+            "unacked": len(self.unacked),
+            "resent": self.resent,
+        }
+
+
+def create_backplane(kind: str = WS_BACKPLANE) -> Backplane:
+    if kind == "socket":
+        return SocketBackplane()
+    if kind == "memory":
+        return InMemoryBackplane()
+    raise RuntimeError(f"Unknown WS_BACKPLANE {kind!r}, expected 'memory' or 'socket'")
+
+
+backplane = create_backplane()
+
+
+async def _serve_hub(address):
+    hub = await BackplaneHub(address).start()
+    print(f"Backplane hub listening on {hub.host}:{hub.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hub", action="store_true", help="run the relay hub")
+    parser.add_argument("--address", default=WS_BACKPLANE_ADDRESS)
+    args = parser.parse_args()
+
+    if args.hub:
+        asyncio.run(_serve_hub(args.address))
+    else:
+        parser.print_help()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Set
+
+from fastapi import WebSocket
+from dotenv import load_dotenv
+from .metrics import ws_send_seconds, ws_dropped
+
+load_dotenv()
+
+# Messages buffered per socket before the overflow policy kicks in
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+
+# "drop_oldest" keeps the socket and discards the oldest queued message,
+# "disconnect" closes a consumer that cannot keep up
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+
+# Close code sent to slow consumers (1013: try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class SocketSender:
+    """
+    One websocket with its own bounded outbound queue and writer task.
+
+    push() never waits on the network, so whoever triggers a message (an
+    HTTP handler, the matcher, a broadcast) is never slowed down by a slow
+    client; the writer task drains the queue at the client's pace.
+    """
+
+    def __init__(self, user_id: str, websocket: WebSocket, on_close, maxsize: int = WS_QUEUE_SIZE,
+                 policy: str = WS_OVERFLOW_POLICY, on_sent=None):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.on_close = on_close
+        # on_sent(sender, message) runs once a message was actually written to the socket
+        self.on_sent = on_sent
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+        self.task = asyncio.create_task(self._writer())
+
+    def push(self, message: dict) -> bool:
+        if self.closed:
+            return False
+
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "disconnect":
+            print(f"Disconnecting slow websocket consumer {self.user_id}")
+            asyncio.create_task(self.close(code=SLOW_CONSUMER_CLOSE_CODE))
+            return False
+
+        # drop_oldest
+        self.queue.get_nowait()
+        self.dropped += 1
+        ws_dropped.inc()
+        self.queue.put_nowait(message)
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                started = time.perf_counter()
+                await self.websocket.send_text(json.dumps(message, separators=(",", ":"), default=str))
+                ws_send_seconds.observe(time.perf_counter() - started)
+                self.sent += 1
+                if self.on_sent:
+                    self.on_sent(self, message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Websocket send to user {self.user_id} failed: {e}")
+        finally:
+            self.closed = True
+            self.on_close(self)
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self.task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionRegistry:
+    """
+    All sockets held by this process, several per user (one per tab or
+    device). Pushing to a user enqueues on each of their sockets.
+    """
+
+    def __init__(self, maxsize: int = WS_QUEUE_SIZE, policy: str = WS_OVERFLOW_POLICY, on_sent=None):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_sent = on_sent
+        self.sockets: Dict[str, Set[SocketSender]] = {}
+
+    def add(self, user_id: str, websocket: WebSocket) -> SocketSender:
+        sender = SocketSender(user_id, websocket, self._discard, self.maxsize, self.policy, self.on_sent)
+        self.sockets.setdefault(user_id, set()).add(sender)
+        return sender
+
+    def _discard(self, sender: SocketSender):
+        senders = self.sockets.get(sender.user_id)
+        if not senders:
+            return
+        senders.discard(sender)
+        if not senders:
+            del self.sockets[sender.user_id]
+
+    def remove(self, user_id: str, websocket: WebSocket):
+        for sender in list(self.sockets.get(user_id, ())):
+            if sender.websocket is websocket:
+                sender.task.cancel()
+                self._discard(sender)
+
+    def push(self, user_id: str, message: dict) -> int:
+        """Queue a message on every socket of the user; returns how many accepted it."""
+        return sum(sender.push(message) for sender in list(self.sockets.get(user_id, ())))
+
+    def broadcast(self, message: dict) -> int:
+        return sum(self.push(user_id, message) for user_id in list(self.sockets))
+
+    def is_online(self, user_id: str) -> bool:
+        return bool(self.sockets.get(user_id))
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.is_online(user_id)
+
+    @property
+    def user_count(self) -> int:
+        return len(self.sockets)
+
+    @property
+    def socket_count(self) -> int:
+        return sum(len(s) for s in self.sockets.values())
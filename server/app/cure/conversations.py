@@ -0,0 +1,221 @@
+"""
+One document per conversation (a post and the two people talking about
+it), kept up to date on every write so the inbox is an indexed read
+instead of an aggregation over the whole message history:
+
+    {
+        "key": "<post_id>:<uid>:<uid>",
+        "post_id": ...,
+        "participants": [uid, uid],
+        "members": {uid: {uid, name, email, phone}},
+        "last_message": {...},
+        "unread": {uid: count},
+        "updated_at": <last_message.created_at>,
+    }
+
+Existing messages are folded in once with:
+
+    python -m cure.conversations --backfill
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from db.mongodb import conversations_collection, messages_collection
+from db.pagination import after_cursor, next_cursor
+
+INBOX_SORT = [("updated_at", -1), ("_id", -1)]
+
+# Newest first; _id orders messages sent in the same millisecond
+HISTORY_SORT = [("created_at", -1), ("_id", -1)]
+
+BACKFILL_BATCH = 1000
+
+
+def conversation_key(post_id: str, a: str, b: str) -> str:
+    first, second = sorted((a, b))
+    return f"{post_id}:{first}:{second}"
+
+
+def last_message_of(message: dict) -> dict:
+    return {
+        "_id": message["_id"],
+        "post_id": message["post_id"],
+        "message": message["message"],
+        "sender": message["sender"],
+        "receiver": message["receiver"],
+        "status": message["status"],
+        "created_at": message["created_at"],
+        "delivered_at": message.get("delivered_at"),
+        "seen_at": message.get("seen_at"),
+    }
+
+
+# ------------------- Writes -------------------
+
+async def record_message(message: dict):
+    """Fold a newly inserted message into its conversation."""
+    sender, receiver = message["sender"], message["receiver"]
+    key = conversation_key(message["post_id"], sender["uid"], receiver["uid"])
+    # $inc of 0 gives the sender an explicit count too, as the backfill does
+    unread = {f"unread.{sender['uid']}": 0, f"unread.{receiver['uid']}": 1}
+
+    try:
+        # Only move last_message forward; an older message that lands late only counts as unread
+        await conversations_collection.update_one(
+            {"key": key, "updated_at": {"$lte": message["created_at"]}},
+            {
+                "$setOnInsert": {
+                    "post_id": message["post_id"],
+                    "participants": sorted((sender["uid"], receiver["uid"])),
+                    "created_at": message["created_at"],
+                },
+                "$set": {
+                    "last_message": last_message_of(message),
+                    "updated_at": message["created_at"],
+                    f"members.{sender['uid']}": sender,
+                    f"members.{receiver['uid']}": receiver,
+                },
+                "$inc": unread,
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        await conversations_collection.update_one({"key": key}, {"$inc": unread})
+
+
+async def mark_read(post_id: str, uid: str, seen_at: datetime):
+    """Mirror mark_seen: clear `uid`'s unread count and the seen state of the last message."""
+    await conversations_collection.update_many(
+        {"post_id": post_id, "participants": uid},
+        {"$set": {f"unread.{uid}": 0}},
+    )
+    await conversations_collection.update_many(
+        {"post_id": post_id, "last_message.receiver.uid": uid, "last_message.status": {"$ne": "seen"}},
+        {"$set": {"last_message.status": "seen", "last_message.seen_at": seen_at}},
+    )
+
+
+# ------------------- Inbox -------------------
+
+async def inbox_page(uid: str, limit: int, cursor: Optional[str] = None):
+    """
+    Most recently active conversations of `uid` and the cursor of the next
+    page. Raises ValueError for a malformed cursor.
+    """
+    query = after_cursor({"participants": uid}, cursor, field="updated_at")
+    docs = await conversations_collection.find(query).sort(INBOX_SORT).limit(limit).to_list(length=limit)
+    return docs, next_cursor(docs, limit, field="updated_at")
+
+
+# ------------------- History -------------------
+
+def thread_query(post_id: str, uid: str, bound: Optional[dict] = None) -> dict:
+    """
+    Messages of `uid` on a post. Each $or branch has its own
+    (post_id, <side>.uid, created_at, _id) index, so Mongo merges two
+    already sorted index ranges and stops after one window, however long
+    the thread is. `bound` is repeated in both branches for the same reason.
+    """
+    branches = [{"post_id": post_id, "sender.uid": uid}, {"post_id": post_id, "receiver.uid": uid}]
+    if bound:
+        for branch in branches:
+            branch.update(bound)
+    return {"$or": branches}
+
+
+def older_than(anchor: dict) -> dict:
+    # The range on created_at bounds the index scan; $nor drops the anchor's own tie
+    return {
+        "created_at": {"$lte": anchor["created_at"]},
+        "$nor": [{"created_at": anchor["created_at"], "_id": {"$gte": anchor["_id"]}}],
+    }
+
+
+def newer_than(anchor: dict) -> dict:
+    return {
+        "created_at": {"$gte": anchor["created_at"]},
+        "$nor": [{"created_at": anchor["created_at"], "_id": {"$lte": anchor["_id"]}}],
+    }
+
+
+async def find_anchor(message_id: str, collection=messages_collection) -> dict:
+    """The message a window is relative to; raises ValueError if it does not exist."""
+    if not ObjectId.is_valid(message_id):
+        raise ValueError("Invalid message id")
+    anchor = await collection.find_one({"_id": ObjectId(message_id)}, {"created_at": 1})
+    if not anchor:
+        raise ValueError("Unknown message id")
+    return anchor
+
+
+async def history_window(post_id: str, uid: str, limit: int, before: Optional[str] = None,
+                         collection=messages_collection) -> Tuple[List[dict], bool]:
+    """
+    The `limit` latest messages of the thread, or the `limit` just before
+    message `before`, oldest first; plus whether older messages remain.
+    """
+    bound = older_than(await find_anchor(before, collection)) if before else None
+    docs = await collection.find(thread_query(post_id, uid, bound)).sort(HISTORY_SORT).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    return docs[:limit][::-1], has_more
+
+
+async def history_since(post_id: str, uid: str, since: str, limit: int,
+                        collection=messages_collection) -> Tuple[List[dict], bool]:
+    """Messages after `since`, oldest first, for a client catching up after a reconnect."""
+    bound = newer_than(await find_anchor(since, collection))
+    sort = [(field, -direction) for field, direction in HISTORY_SORT]
+    docs = await collection.find(thread_query(post_id, uid, bound)).sort(sort).limit(limit + 1).to_list(limit + 1)
+    return docs[:limit], len(docs) > limit
+
+
+# ------------------- Backfill -------------------
+
+async def backfill() -> int:
+    """
+    Rebuild every conversation from `messages`. Safe to re-run: each
+    conversation is overwritten with what the messages say.
+    """
+    conversations = {}
+
+    async for message in messages_collection.find().sort([("created_at", 1), ("_id", 1)]):
+        sender, receiver = message["sender"], message["receiver"]
+        key = conversation_key(message["post_id"], sender["uid"], receiver["uid"])
+        conversation = conversations.setdefault(key, {
+            "post_id": message["post_id"],
+            "participants": sorted((sender["uid"], receiver["uid"])),
+            "members": {},
+            "unread": {sender["uid"]: 0, receiver["uid"]: 0},
+            "created_at": message["created_at"],
+        })
+        conversation["members"][sender["uid"]] = sender
+        conversation["members"][receiver["uid"]] = receiver
+        conversation["last_message"] = last_message_of(message)
+        conversation["updated_at"] = message["created_at"]
+        if message.get("status") != "seen":
+            conversation["unread"][receiver["uid"]] += 1
+
+    ops = [
+        UpdateOne({"key": key}, {"$set": conversation}, upsert=True)
+        for key, conversation in conversations.items()
+    ]
+    for start in range(0, len(ops), BACKFILL_BATCH):
+        await conversations_collection.bulk_write(ops[start:start + BACKFILL_BATCH], ordered=False)
+
+    return len(conversations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", action="store_true", help="rebuild conversations from messages")
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.error("nothing to do, pass --backfill")
+    print(f"{asyncio.run(backfill())} conversations written")
@@ -0,0 +1,310 @@
+"""
+Firebase ID token verification that stays off the event loop.
+
+Decoded tokens are cached by the SHA-256 of the token until their `exp`,
+so a client repeating the same bearer token costs one dict lookup. Misses
+verify the RS256 signature on a small thread pool. The signing keys are
+held in memory and refreshed in the background before Google's
+Cache-Control max-age runs out, or right away when a token names a key
+id we have not seen yet.
+
+AUTH_KEYS=local swaps Google's keys for a key pair stored on disk, so the
+whole path can be exercised offline. Mint a token for it with:
+
+    AUTH_KEYS=local python -m cure.firebase_tokens --issue <uid> [--email you@example.com]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import jwt
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509 import load_pem_x509_certificate
+
+from config.auth import (
+    AUTH_KEYS, FIREBASE_PROJECT_ID, FIREBASE_CERTS_URL, AUTH_LOCAL_KEY_FILE, AUTH_CACHE_SIZE, AUTH_WORKERS,
+)
+
+ALGORITHM = "RS256"
+
+# Clock difference tolerated on exp/iat
+LEEWAY = 10
+
+# Rejected tokens are remembered briefly so a client retrying a bad token costs no signature check
+FAILURE_TTL = 30
+
+# Refresh keys this long before they expire; a forced refresh (unknown kid) at most this often
+REFRESH_MARGIN = 300
+MIN_FORCED_REFRESH = 30
+DEFAULT_KEYS_MAX_AGE = 3600
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+# ------------------- Key sources -------------------
+
+class KeySource:
+    """Where the public keys come from. fetch() returns ({kid: public key}, max_age_seconds)."""
+
+    async def fetch(self) -> Tuple[Dict[str, object], float]:
+        raise NotImplementedError
+
+
+class GoogleKeySource(KeySource):
+    def __init__(self, url: str = FIREBASE_CERTS_URL):
+        self.url = url
+
+    async def fetch(self):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+
+        keys = {
+            kid: load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in response.json().items()
+        }
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        return keys, float(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE
+
+
+class LocalKeyPair(KeySource):
+    """
+    Stand-in for Google's signing keys: an RSA key pair kept in `path`
+    (created on first use), whose tokens look exactly like Firebase ones.
+    """
+
+    def __init__(self, path: str = AUTH_LOCAL_KEY_FILE, project_id: str = FIREBASE_PROJECT_ID):
+        self.project_id = project_id
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.private_key = serialization.load_pem_private_key(f.read(), password=None)
+        else:
+            self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                f.write(self.private_key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                ))
+
+        self.public_key = self.private_key.public_key()
+        der = self.public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        digest = hashes.Hash(hashes.SHA256())
+        digest.update(der)
+        self.kid = "local-" + digest.finalize().hex()[:16]
+
+    async def fetch(self):
+        return {self.kid: self.public_key}, 24 * 3600
+
+    def issue(self, uid: str, ttl: int = 3600, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "sub": uid,
+            "user_id": uid,
+            "iat": now,
+            "auth_time": now,
+            "exp": now + ttl,
+            **claims,
+        }
+        return jwt.encode(payload, self.private_key, algorithm=ALGORITHM, headers={"kid": self.kid})
+
+
+def create_key_source(kind: str = AUTH_KEYS) -> KeySource:
+    if kind == "google":
+        return GoogleKeySource()
+    if kind == "local":
+        return LocalKeyPair()
+    raise RuntimeError(f"Unknown AUTH_KEYS {kind!r}, expected 'google' or 'local'")
+
+
+# ------------------- Verifier -------------------
+
+class TokenVerifier:
+    def __init__(self, source: KeySource, project_id: str = FIREBASE_PROJECT_ID,
+                 max_entries: int = AUTH_CACHE_SIZE, workers: int = AUTH_WORKERS):
+        self.source = source
+        self.project_id = project_id
+        self.max_entries = max_entries
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+
+        # sha256(token) -> (valid until, claims or None for a rejected token, error)
+        self.cache: OrderedDict = OrderedDict()
+        self.in_flight: Dict[bytes, asyncio.Future] = {}
+
+        self.keys: Dict[str, object] = {}
+        self.keys_expire_at = 0.0
+        self.keys_fetched_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.key_refreshes = 0
+
+    # ------------------- Keys -------------------
+
+    async def refresh_keys(self, force: bool = False):
+        if force and time.monotonic() - self.keys_fetched_at < MIN_FORCED_REFRESH:
+            return
+        # Concurrent callers share one fetch
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._fetch_keys())
+        task = self._refreshing
+        try:
+            await asyncio.shield(task)
+        finally:
+            if self._refreshing is task and task.done():
+                self._refreshing = None
+
+    async def _fetch_keys(self):
+        keys, max_age = await self.source.fetch()
+        now = time.monotonic()
+        self.keys = keys
+        self.keys_fetched_at = now
+        self.keys_expire_at = now + max_age
+        self.key_refreshes += 1
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh_keys()
+                delay = max(self.keys_expire_at - time.monotonic() - REFRESH_MARGIN, MIN_FORCED_REFRESH)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Refreshing token signing keys failed: {e}")
+                delay = MIN_FORCED_REFRESH
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # ------------------- Verify -------------------
+
+    async def verify(self, token: str) -> dict:
+        """Decoded claims of a valid Firebase ID token; raises InvalidToken otherwise."""
+        key = hashlib.sha256(token.encode()).digest()
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            valid_until, claims, error = entry
+            if valid_until > time.time():
+                self.cache.move_to_end(key)
+                self.hits += 1
+                if claims is None:
+                    raise InvalidToken(error)
+                return dict(claims)
+            del self.cache[key]
+
+        # The same token arriving on several requests at once is verified once
+        pending = self.in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._verify_miss(key, token))
+            self.in_flight[key] = pending
+            pending.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return dict(await asyncio.shield(pending))
+
+    async def _verify_miss(self, key: bytes, token: str) -> dict:
+        self.misses += 1
+        try:
+            signing_key = await self._signing_key(token)
+            loop = asyncio.get_running_loop()
+            claims = await loop.run_in_executor(self.executor, self._decode, token, signing_key)
+        except InvalidToken as e:
+            self.rejected += 1
+            self._store(key, time.time() + FAILURE_TTL, None, str(e))
+            raise
+
+        self._store(key, claims["exp"], claims, None)
+        return claims
+
+    async def _signing_key(self, token: str):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.PyJWTError:
+            raise InvalidToken("Malformed token")
+
+        if kid not in self.keys or self.keys_expire_at < time.monotonic():
+            try:
+                await self.refresh_keys(force=bool(self.keys))
+            except Exception as e:
+                if not self.keys:
+                    raise InvalidToken(f"Signing keys unavailable: {e}")
+        if kid not in self.keys:
+            raise InvalidToken("Unknown signing key")
+        return self.keys[kid]
+
+    def _decode(self, token: str, signing_key) -> dict:
+        # Runs on the auth executor: the RSA check is the expensive part
+        try:
+            claims = jwt.decode(
+                token,
+                signing_key,
+                algorithms=[ALGORITHM],
+                audience=self.project_id,
+                issuer=f"https://securetoken.google.com/{self.project_id}",
+                leeway=LEEWAY,
+                options={"require": ["exp", "iat", "sub", "aud", "iss"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidToken(str(e))
+
+        if not claims["sub"] or claims.get("auth_time", 0) > time.time() + LEEWAY:
+            raise InvalidToken("Invalid subject or auth_time")
+        # Same shape as firebase_admin.auth.verify_id_token
+        claims["uid"] = claims["sub"]
+        return claims
+
+    def _store(self, key: bytes, valid_until: float, claims: Optional[dict], error: Optional[str]):
+        self.cache[key] = (valid_until, claims, error)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "keys": len(self.keys),
+            "key_refreshes": self.key_refreshes,
+        }
+
+
+verifier = TokenVerifier(create_key_source())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issue", metavar="UID", required=True, help="print a token signed by the local key pair")
+    parser.add_argument("--email", default=None)
+    parser.add_argument("--ttl", type=int, default=3600)
+    args = parser.parse_args()
+
+    if not isinstance(verifier.source, LocalKeyPair):
+        parser.error("tokens can only be issued with AUTH_KEYS=local")
+    extra = {"email": args.email} if args.email else {}
+    print(verifier.source.issue(args.issue, ttl=args.ttl, **extra))
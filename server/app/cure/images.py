@@ -0,0 +1,149 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config.images import (
+    IMAGE_STORE, IMAGE_LOCAL_DIR, IMAGE_LOCAL_URL, IMAGE_WORKERS, IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS,
+)
+
+# Variant name -> longest side in pixels. "full" replaces the original upload.
+VARIANTS = {
+    "full": 1600,
+    "feed": 640,
+    "thumb": 200,
+}
+
+OUTPUT_FORMAT = "WEBP"
+OUTPUT_QUALITY = 82
+
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# ------------------- Processing -------------------
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Decode once, apply the EXIF orientation, and re-encode every variant.
+    Only pixels are written back, so EXIF (GPS, camera serials...) is dropped.
+    """
+    if len(data) > IMAGE_MAX_BYTES:
+        raise InvalidImage("Image too large")
+
+    # Pillow decodes lazily, so corrupt data can fail anywhere up to the last save;
+    # truncated or malformed files raise OSError, SyntaxError or ValueError
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # JPEGs can be decoded straight at a reduced scale, far cheaper than full size
+            longest = max(VARIANTS.values())
+            source.draft("RGB", (longest, longest))
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        variants = {}
+        # Largest first, each one resized from the previous to keep resampling cheap
+        for name, size in sorted(VARIANTS.items(), key=lambda v: -v[1]):
+            image.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, OUTPUT_FORMAT, quality=OUTPUT_QUALITY, method=4)
+            variants[name] = out.getvalue()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise InvalidImage("Unreadable image")
+
+    return variants
+
+
+# ------------------- Stores -------------------
+
+class ImageStore:
+    """Where processed variants go. save() is blocking and runs on the image executor."""
+
+    def save(self, key: str, data: bytes) -> str:
+        raise NotImplementedError
+
+
+class CloudinaryStore(ImageStore):
+    def __init__(self, folder: str = "posts"):
+        import config.cloudinary  # noqa: F401  (applies credentials)
+        import cloudinary.uploader
+
+        self.uploader = cloudinary.uploader
+        self.folder = folder
+
+    def save(self, key: str, data: bytes) -> str:
+        result = self.uploader.upload(
+            io.BytesIO(data),
+            folder=self.folder,
+            public_id=key,
+            resource_type="image",
+            overwrite=True,
+        )
+        return result["secure_url"]
+
+
+class LocalStore(ImageStore):
+    """Writes variants under `root`; serve `root` at `base_url` (main.py mounts it)."""
+
+    def __init__(self, root: str = IMAGE_LOCAL_DIR, base_url: str = IMAGE_LOCAL_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def save(self, key: str, data: bytes) -> str:
+        path = os.path.join(self.root, f"{key}.webp")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return f"{self.base_url}/{key}.webp"
+
+
+def create_store(kind: str = IMAGE_STORE) -> ImageStore:
+    if kind == "cloudinary":
+        return CloudinaryStore()
+    if kind == "local":
+        return LocalStore()
+    raise RuntimeError(f"Unknown IMAGE_STORE {kind!r}, expected 'cloudinary' or 'local'")
+
+
+_store: Optional[ImageStore] = None
+
+
+def get_store() -> ImageStore:
+    """The configured store, created on first upload (the Cloudinary SDK is not imported before)."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+
+# ------------------- Pipeline -------------------
+
+async def ingest_image(data: bytes, key: str, image_store: ImageStore = None) -> Dict[str, str]:
+    """Process one upload and store all its variants; returns variant name -> URL."""
+    image_store = image_store or get_store()
+    loop = asyncio.get_running_loop()
+
+    variants = await loop.run_in_executor(executor, render_variants, data)
+    urls = await asyncio.gather(*(
+        loop.run_in_executor(executor, image_store.save, f"{key}/{name}", body)
+        for name, body in variants.items()
+    ))
+    return dict(zip(variants, urls))
+
+
+async def ingest_images(uploads: List[bytes], prefix: str, image_store: ImageStore = None) -> List[Dict[str, str]]:
+    """
+    Process and upload every image of a post in parallel, off the event
+    loop. Returns one {"full", "feed", "thumb"} URL map per image, in order.
+    """
+    return list(await asyncio.gather(*(
+        ingest_image(data, f"{prefix}/{index}", image_store) for index, data in enumerate(uploads)
+    )))
@@ -0,0 +1,297 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db.mongodb import jobs_collection
+from .metrics import job_run_seconds, job_wait_seconds
+
+load_dotenv()
+
+# Jobs one process runs at the same time
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+
+# A running job is handed to another worker if its lease runs out
+JOB_LEASE = timedelta(seconds=int(os.getenv("JOB_LEASE_SECONDS", "300")))
+
+MAX_BACKOFF = timedelta(minutes=30)
+
+# Finished and failed jobs are kept this long (TTL index on finished_at)
+JOB_RETENTION = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Finished jobs used for the latency figures on the dashboard
+LATENCY_WINDOW = 500
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Durable background jobs in the `jobs` collection.
+
+    enqueue() writes a pending job; workers claim due jobs with a lease,
+    run the handler registered for the job kind, and retry failures with
+    exponential backoff up to max_attempts. A job whose worker died is
+    picked up again once its lease expires, so handlers must be idempotent.
+
+    `key` makes enqueueing idempotent: a second job with the same key is
+    dropped (unique index, db.indexes). `coalesce` keeps at most one
+    pending job of a kind, for work like a matching run where one more
+    pass covers any number of triggers; a trigger merged into a pending
+    job brings its run_at forward to the trigger's own (now, by default).
+    """
+
+    def __init__(self, collection=jobs_collection, concurrency: int = JOB_CONCURRENCY,
+                 poll_seconds: float = JOB_POLL_SECONDS):
+        self.collection = collection
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.handlers: Dict[str, Handler] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.wakeup = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._stopping = False
+        self._task = None
+
+    def register(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    # ------------------- Enqueue -------------------
+
+    async def enqueue(self, kind: str, payload: dict = None, key: Optional[str] = None, coalesce: bool = False,
+                      delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> bool:
+        """Returns False when an equivalent job already exists."""
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "payload": payload or {},
+            "status": "pending",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+        }
+        if key:
+            job["key"] = key
+
+        try:
+            if coalesce:
+                # A job waiting out a delay or a retry backoff runs no later than this trigger asks
+                run_at = job.pop("run_at")
+                result = await self.collection.update_one(
+                    {"kind": kind, "status": "pending"},
+                    {"$setOnInsert": job, "$min": {"run_at": run_at}},
+                    upsert=True,
+                )
+                created = result.upserted_id is not None
+                due_sooner = result.modified_count > 0
+            else:
+                await self.collection.insert_one(job)
+                created = True
+                due_sooner = False
+        except DuplicateKeyError:
+            created = due_sooner = False
+
+        if created or due_sooner:
+            self.wakeup.set()
+        return created
+
+    # ------------------- Worker -------------------
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": "pending", "run_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": "running",
+                    "claim": ObjectId(),
+                    "worker": self.worker_id,
+                    "started_at": now,
+                    "lease_until": now + JOB_LEASE,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def release_expired(self):
+        await self.collection.update_many(
+            {"status": "running", "lease_until": {"$lt": datetime.utcnow()}},
+            {"$set": {"status": "pending"}, "$unset": {"claim": "", "lease_until": ""}}
+        )
+
+    async def execute(self, job: dict):
+        # Only the current claim may settle the job; a stale worker whose lease expired may not
+        owner = {"_id": job["_id"], "claim": job["claim"]}
+        handler = self.handlers.get(job["kind"])
+
+        job_wait_seconds.observe(max((job["started_at"] - job["run_at"]).total_seconds(), 0), job["kind"])
+        heartbeat = asyncio.create_task(self._extend_lease(owner))
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind {job['kind']!r}")
+            await handler(job["payload"])
+        except Exception as e:
+            job_run_seconds.observe(time.perf_counter() - started, job["kind"], "error")
+            print(f"Job {job['kind']} {job['_id']} failed (attempt {job['attempts']}): {e}")
+
+            if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+                self.failed += 1
+                update = {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}}
+            else:
+                self.retried += 1
+                delay = min(timedelta(seconds=JOB_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)), MAX_BACKOFF)
+                update = {"$set": {"status": "pending", "run_at": datetime.utcnow() + delay, "error": str(e)}}
+            update["$unset"] = {"claim": "", "lease_until": ""}
+            await self.collection.update_one(owner, update)
+            return
+        finally:
+            heartbeat.cancel()
+
+        job_run_seconds.observe(time.perf_counter() - started, job["kind"], "ok")
+        self.completed += 1
+        await self.collection.update_one(owner, {
+            "$set": {"status": "done", "finished_at": datetime.utcnow()},
+            "$unset": {"claim": "", "lease_until": "", "error": ""},
+        })
+
+    async def _extend_lease(self, owner: dict):
+        # Long handlers (a full matching run) keep their claim while they make progress
+        while True:
+            await asyncio.sleep(JOB_LEASE.total_seconds() / 3)
+            await self.collection.update_one(owner, {"$set": {"lease_until": datetime.utcnow() + JOB_LEASE}})
+
+    async def fill(self, in_flight: set) -> int:
+        """Claim due jobs until `in_flight` holds `concurrency` of them; returns how many were started."""
+        started = 0
+        while len(in_flight) < self.concurrency and not self._stopping:
+            job = await self.claim()
+            if not job:
+                break
+
+            started += 1
+            task = asyncio.create_task(self.execute(job))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            # A freed slot is refilled right away instead of on the next poll
+            task.add_done_callback(lambda _: self.wakeup.set())
+        return started
+
+    async def drain(self) -> int:
+        """Run every job that is currently due and wait for them; returns how many ran."""
+        await self.release_expired()
+
+        started = 0
+        in_flight = set()
+        while True:
+            started += await self.fill(in_flight)
+            if not in_flight:
+                return started
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+    async def run(self):
+        in_flight = set()
+        polls = 0
+        while not self._stopping:
+            self.wakeup.clear()
+            try:
+                if polls % 30 == 0:
+                    await self.release_expired()
+                await self.fill(in_flight)
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            polls += 1
+
+            # Enqueues and finished jobs in this process wake the worker early;
+            # jobs enqueued by other processes are seen on the next poll
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self):
+        self._stopping = True
+        self.wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    # ------------------- Dashboard -------------------
+
+    async def stats(self) -> dict:
+        depth = {}
+        async for row in self.collection.aggregate([
+            {"$match": {"status": {"$in": ["pending", "running", "failed"]}}},
+            {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}},
+        ]):
+            depth.setdefault(row["_id"]["kind"], {})[row["_id"]["status"]] = row["count"]
+
+        recent = await self.collection.find(
+            {"status": "done"},
+            {"kind": 1, "created_at": 1, "started_at": 1, "finished_at": 1},
+        ).sort("finished_at", -1).limit(LATENCY_WINDOW).to_list(LATENCY_WINDOW)
+
+        samples = {}
+        for job in recent:
+            kind = samples.setdefault(job["kind"], {"wait": [], "run": []})
+            kind["wait"].append((job["started_at"] - job["created_at"]).total_seconds())
+            kind["run"].append((job["finished_at"] - job["started_at"]).total_seconds())
+
+        latency = {
+            kind: {
+                "jobs": len(values["run"]),
+                "wait_p50_s": percentile(values["wait"], 50),
+                "wait_p95_s": percentile(values["wait"], 95),
+                "run_p50_s": percentile(values["run"], 50),
+                "run_p95_s": percentile(values["run"], 95),
+            }
+            for kind, values in samples.items()
+        }
+
+        return {
+            "depth": depth,
+            "latency": latency,
+            "worker": {
+                "id": self.worker_id,
+                "completed": self.completed,
+                "retried": self.retried,
+                "failed": self.failed,
+            },
+        }
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))
+    return round(ordered[index], 4)
+
+
+jobs = JobQueue()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Longest a single readiness check may take before it counts as not ready
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "1"))
+
+Check = Callable[[], Awaitable[Tuple[bool, str]]]
+
+
+class Lifecycle:
+    """
+    Startup phases and readiness of the process.
+
+    The app starts serving as soon as its routes are mounted; everything
+    that talks to the network (Mongo, the backplane, signing keys, the
+    matcher) runs afterwards as timed phases, concurrently where they do
+    not depend on each other. /readyz combines the phases with live checks
+    registered through register_check().
+    """
+
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.serving_after = None
+        self.phases: Dict[str, dict] = {}
+        self.checks: Dict[str, Check] = {}
+
+    def mark_serving(self):
+        self.serving_after = time.monotonic() - self.created_at
+
+    async def phase(self, name: str, work: Awaitable):
+        """Run one startup step and record its outcome; failures are reported, not raised."""
+        entry = self.phases[name] = {"status": "running", "seconds": None}
+        started = time.monotonic()
+        try:
+            result = await work
+            entry["status"] = "ok"
+            return result
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+            print(f"Startup phase {name} failed: {e}")
+        finally:
+            entry["seconds"] = round(time.monotonic() - started, 3)
+
+    def phase_ok(self, name: str) -> bool:
+        return self.phases.get(name, {}).get("status") == "ok"
+
+    def report(self) -> str:
+        steps = ", ".join(f"{name} {p['seconds']}s ({p['status']})" for name, p in self.phases.items())
+        serving = f"{self.serving_after:.3f}s" if self.serving_after is not None else "not yet"
+        return f"Startup: serving after {serving}; {steps}"
+
+    # ------------------- Probes -------------------
+
+    def register_check(self, name: str, check: Check):
+        """check() returns (ready, detail); it is run on every /readyz with READY_CHECK_TIMEOUT."""
+        self.checks[name] = check
+
+    async def _run_check(self, check: Check) -> dict:
+        try:
+            ready, detail = await asyncio.wait_for(check(), READY_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            ready, detail = False, f"no answer within {READY_CHECK_TIMEOUT}s"
+        except Exception as e:
+            ready, detail = False, str(e)
+        return {"ready": ready, "detail": detail}
+
+    async def readiness(self) -> dict:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(self.checks[n]) for n in names))
+        checks = dict(zip(names, results))
+        return {
+            "ready": all(c["ready"] for c in checks.values()),
+            "checks": checks,
+            "startup": {"serving_after_s": self.serving_after, "phases": self.phases},
+        }
+
+    def liveness(self) -> dict:
+        return {"status": "ok", "uptime_s": round(time.monotonic() - self.created_at, 3)}
+
+
+lifecycle = Lifecycle()
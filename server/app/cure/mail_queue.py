@@ -0,0 +1,271 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List
+
+import aiosmtplib
+from bson import ObjectId
+from pymongo import ReturnDocument
+from db.mongodb import mail_queue_collection
+from .metrics import mail_send_seconds, mail_queue_wait_seconds, mail_messages
+from config.mail import (
+    SMTP_EMAIL, SMTP_PASSWORD, SMTP_SERVER, SMTP_PORT, SMTP_SSL_TLS, SMTP_STARTTLS,
+    MAIL_POOL_SIZE, MAIL_MAX_ATTEMPTS, MAIL_BACKOFF_SECONDS, MAIL_POLL_SECONDS,
+)
+
+# A claimed message is handed back to the queue if its worker dies
+LEASE = timedelta(minutes=5)
+
+# Most messages folded into one digest email
+MAX_DIGEST = 20
+
+MAX_BACKOFF = timedelta(hours=1)
+
+
+# ------------------- Enqueue -------------------
+
+async def enqueue_email(recipient: str, subject: str, body: str):
+    """Queue an email for the mail worker; returns immediately."""
+    now = datetime.utcnow()
+    await mail_queue_collection.insert_one({
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    })
+    # Workers elsewhere see it on their next poll; this one picks it up now
+    mail_worker.wakeup.set()
+
+
+# ------------------- SMTP connection pool -------------------
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP sessions open and hands them out
+    one at a time, so a burst of emails pays for the TLS handshake and
+    login once per connection instead of once per message.
+    """
+
+    def __init__(self, size: int = MAIL_POOL_SIZE, hostname=SMTP_SERVER, port=SMTP_PORT,
+                 username=SMTP_EMAIL, password=SMTP_PASSWORD, use_tls=SMTP_SSL_TLS, start_tls=SMTP_STARTTLS):
+        self.size = size
+        self.options = {"hostname": hostname, "port": port, "use_tls": use_tls, "start_tls": start_tls}
+        self.username = username
+        self.password = password
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(size)
+
+    async def _open(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(**self.options)
+        await smtp.connect()
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self.slots:
+            smtp = None
+            while not self.idle.empty():
+                candidate = self.idle.get_nowait()
+                if candidate.is_connected:
+                    smtp = candidate
+                    break
+
+            if smtp is None:
+                smtp = await self._open()
+
+            try:
+                yield smtp
+            except Exception:
+                # Don't reuse a session that failed mid-conversation
+                smtp.close()
+                raise
+            else:
+                self.idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self.idle.empty():
+            smtp = self.idle.get_nowait()
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+# ------------------- Worker -------------------
+
+def build_message(recipient: str, items: List[dict]) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = SMTP_EMAIL
+    message["To"] = recipient
+
+    if len(items) == 1:
+        message["Subject"] = items[0]["subject"]
+        message.set_content(items[0]["body"])
+    else:
+        message["Subject"] = f"{len(items)} new updates from FindIn"
+        message.set_content("\n\n---\n\n".join(f"{i['subject']}\n{i['body']}" for i in items))
+
+    return message
+
+
+class MailWorker:
+    """
+    Drains mail_queue: claims due messages, folds everything pending for
+    the same recipient into one digest, sends it over a pooled SMTP
+    connection and retries failures with exponential backoff.
+    """
+
+    def __init__(self, pool: SMTPPool = None, poll_seconds: float = MAIL_POLL_SECONDS):
+        self.pool = pool or SMTPPool()
+        self.poll_seconds = poll_seconds
+        self.sent = 0
+        self.failed = 0
+        self.wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    async def claim(self):
+        now = datetime.utcnow()
+        claim_id = ObjectId()
+        claimed = {"status": "sending", "claim": claim_id, "lease_until": now + LEASE}
+
+        first = await mail_queue_collection.find_one_and_update(
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"$set": claimed},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if not first:
+            return None, []
+
+        await mail_queue_collection.update_many(
+            {"status": "pending", "recipient": first["recipient"], "next_attempt_at": {"$lte": now}},
+            {"$set": claimed}
+        )
+        items = await mail_queue_collection.find({"claim": claim_id}).sort("created_at", 1).to_list(None)
+
+        # Anything past the digest limit goes back for the next round
+        if len(items) > MAX_DIGEST:
+            await mail_queue_collection.update_many(
+                {"_id": {"$in": [i["_id"] for i in items[MAX_DIGEST:]]}},
+                {"$set": {"status": "pending"}, "$unset": {"claim": "", "lease_until": ""}}
+            )
+            items = items[:MAX_DIGEST]
+
+        return first["recipient"], items
+
+    async def release_expired(self):
+        await mail_queue_collection.update_many(
+            {"status": "sending", "lease_until": {"$lt": datetime.utcnow()}},
+            {"$set": {"status": "pending"}, "$unset": {"claim": "", "lease_until": ""}}
+        )
+
+    async def deliver(self, recipient: str, items: List[dict]):
+        ids = [i["_id"] for i in items]
+        started = time.perf_counter()
+        try:
+            async with self.pool.connection() as smtp:
+                await smtp.send_message(build_message(recipient, items))
+        except Exception as e:
+            mail_send_seconds.observe(time.perf_counter() - started, "error")
+            attempts = max(i.get("attempts", 0) for i in items) + 1
+            self.failed += 1
+            print(f"Failed to send email to {recipient} (attempt {attempts}): {e}")
+
+            if attempts >= MAIL_MAX_ATTEMPTS:
+                mail_messages.inc("failed", amount=len(items))
+                update = {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}}
+            else:
+                mail_messages.inc("retried", amount=len(items))
+                delay = min(timedelta(seconds=MAIL_BACKOFF_SECONDS * 2 ** (attempts - 1)), MAX_BACKOFF)
+                update = {"$set": {
+                    "status": "pending",
+                    "next_attempt_at": datetime.utcnow() + delay,
+                    "error": str(e),
+                }}
+            update["$set"]["attempts"] = attempts
+            update["$unset"] = {"claim": "", "lease_until": ""}
+            await mail_queue_collection.update_many({"_id": {"$in": ids}}, update)
+            return
+
+        mail_send_seconds.observe(time.perf_counter() - started, "ok")
+        mail_messages.inc("sent", amount=len(items))
+        now = datetime.utcnow()
+        for item in items:
+            mail_queue_wait_seconds.observe((now - item["created_at"]).total_seconds())
+
+        self.sent += 1
+        await mail_queue_collection.update_many(
+            {"_id": {"$in": ids}},
+            {"$set": {"status": "sent", "sent_at": now, "finished_at": now}, "$unset": {"claim": "", "lease_until": ""}}
+        )
+
+    async def drain(self) -> int:
+        """Send everything that is currently due; returns the number of emails sent."""
+        await self.release_expired()
+
+        in_flight = set()
+        sent_before = self.sent
+
+        while True:
+            recipient, items = await self.claim()
+            if not items:
+                break
+
+            task = asyncio.create_task(self.deliver(recipient, items))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+            # Never hold more claims than there are connections to send them
+            if len(in_flight) >= self.pool.size:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        return self.sent - sent_before
+
+    async def run(self):
+        while not self._stopping:
+            self.wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                print(f"Mail worker error: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.pool.username and self.pool.password)
+
+    async def stop(self):
+        # Let the current drain finish before the pool's connections close under it
+        self._stopping = True
+        self.wakeup.set()
+        if self._task:
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.pool.close()
+
+
+mail_worker = MailWorker()
@@ -0,0 +1,308 @@
+"""
+In-process metrics in the Prometheus text exposition format (0.0.4).
+
+Counters, gauges and histograms are plain dicts keyed by label values.
+Recording is a dict lookup, a bisect into the bucket bounds and a few
+additions under an uncontended lock (Mongo listener callbacks run on
+driver threads), about a microsecond, so everything stays on in
+production. Gauges that mirror existing state (open sockets, queue sizes)
+take a callback read at scrape time and cost nothing in between.
+
+GET /metrics serves registry.render().
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Seconds; covers a cached read (sub-millisecond) up to a slow Gemini batch
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in list(self.values.items())]
+
+
+class Gauge(Metric):
+    """
+    set()/inc() for values this process owns; `callback` for ones read
+    from elsewhere at scrape time, returning a number or {label tuple: number}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), callback: Optional[Callable] = None):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        values = self.values
+        if self.callback:
+            current = self.callback()
+            values = current if isinstance(current, dict) else {(): current}
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in list(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        lines = []
+        for labels, (counts, total, count) in list(self.series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.bounds + (float("inf"),), counts):
+                cumulative += bucket
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    """`with histogram.time(*labels):` observes the block's wall time, also when it raises."""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _add(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} registered twice")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), callback=None) -> Gauge:
+        return self._add(Gauge(name, help, labelnames, callback))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        blocks = []
+        for metric in list(self.metrics.values()):
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                # One failing callback gauge must not take the whole scrape down
+                print(f"Rendering metric {metric.name} failed: {e}")
+        return "\n".join(blocks) + "\n"
+
+
+registry = Registry()
+
+
+# ------------------- HTTP -------------------
+
+http_request_seconds = registry.histogram(
+    "http_request_seconds", "Time to serve a request, until the last body byte", ("method", "route", "status"))
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "Requests being served")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task like BaseHTTPMiddleware).
+    Requests are labelled with the route template, e.g. /posts/{post_id},
+    so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.inc(amount=-1)
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status[0],
+            )
+
+
+# ------------------- Mongo -------------------
+
+mongo_command_seconds = registry.histogram(
+    "mongo_command_seconds", "Driver-measured duration of Mongo commands", ("command", "collection"))
+mongo_command_failures = registry.counter(
+    "mongo_command_failures_total", "Mongo commands that returned an error", ("command", "collection"))
+
+
+def command_collection(event) -> str:
+    target = event.command.get(event.command_name)
+    # getMore names its collection separately; the value is the cursor id
+    if not isinstance(target, str):
+        target = event.command.get("collection", "")
+    return target
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Pass to the client's event_listeners; called on driver threads."""
+
+    def __init__(self):
+        # request_id -> collection; started/finished events of one command share it
+        self.collections: Dict[int, str] = {}
+
+    def started(self, event):
+        self.collections[event.request_id] = command_collection(event)
+
+    def succeeded(self, event):
+        collection = self.collections.pop(event.request_id, "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self.collections.pop(event.request_id, "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+        mongo_command_failures.inc(event.command_name, collection)
+
+
+mongo_listener = MongoCommandListener()
+
+
+# ------------------- Gemini -------------------
+
+gemini_request_seconds = registry.histogram(
+    "gemini_request_seconds", "Latency of Gemini generate calls, queueing for rate limits excluded", ("outcome",))
+gemini_tokens = registry.counter("gemini_tokens_total", "Tokens reported by Gemini", ("kind",))
+gemini_errors = registry.counter("gemini_errors_total", "Failed Gemini calls and unparseable answers", ("stage",))
+send_to_gemini_seconds = registry.histogram(
+    "send_to_gemini_seconds", "One matching batch end to end: prompt, rate limits, call and parsing", ("outcome",))
+
+
+# ------------------- Matching and jobs -------------------
+
+matching_run_seconds = registry.histogram("matching_run_seconds", "Duration of a match_lost_found run")
+job_run_seconds = registry.histogram("job_run_seconds", "Handler time of background jobs", ("kind", "outcome"))
+job_wait_seconds = registry.histogram("job_wait_seconds", "Time from a job being due to being claimed", ("kind",))
+
+
+# ------------------- Mail -------------------
+
+mail_send_seconds = registry.histogram("mail_send_seconds", "SMTP time to send one email or digest", ("outcome",))
+mail_queue_wait_seconds = registry.histogram(
+    "mail_queue_wait_seconds", "Time from an email being queued to being sent")
+mail_messages = registry.counter("mail_messages_total", "Queued emails handled by the worker", ("outcome",))
+
+
+# ------------------- Websockets -------------------
+
+ws_send_seconds = registry.histogram("ws_send_seconds", "Time to write one message to a websocket")
+ws_dropped = registry.counter("ws_dropped_total", "Messages dropped for slow websocket consumers")
+
+
+# ------------------- Event loop -------------------
+
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer, sampled every tick of the loop monitor")
+event_loop_blocks = registry.counter(
+    "event_loop_blocks_total", "Times the event loop was blocked past the threshold by a synchronous call")
@@ -0,0 +1,184 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .backplane import backplane
+
+load_dotenv()
+
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", "10000"))
+POST_CACHE_TTL = float(os.getenv("POST_CACHE_TTL", "60"))
+
+# Only the first FEED_CACHE_PAGES offset pages of each filter combination are cached
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "500"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "15"))
+FEED_CACHE_PAGES = int(os.getenv("FEED_CACHE_PAGES", "3"))
+
+# Share invalidations with the other workers through the websocket backplane
+POST_CACHE_SHARED = os.getenv("POST_CACHE_SHARED", "true").lower() == "true"
+
+INVALIDATION_CHANNEL = "post_cache"
+
+
+class LRUCache:
+    """Size-bounded LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def delete_where(self, predicate: Callable):
+        for key in [k for k in self.entries if predicate(k)]:
+            self.delete(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+def feed_key(filters: dict, page: int, limit: int) -> tuple:
+    return tuple(sorted(filters.items())), page, limit
+
+
+def filters_match(filters: tuple, post: dict) -> bool:
+    """Whether a post belongs in the feed selected by `filters` (see router.post.post_filters)."""
+    for field, value in filters:
+        if field == "tags":
+            if value not in (post.get("tags") or []):
+                return False
+        elif field == "location.area":
+            if (post.get("location") or {}).get("area") != value:
+                return False
+        elif post.get(field) != value:
+            return False
+    return True
+
+
+class PostCache:
+    """
+    Read-through cache for the hottest reads: single posts by id and the
+    first FEED_CACHE_PAGES pages of each feed filter combination. Values
+    are the encoded JSON bodies, so a hit skips Mongo and serialization.
+
+    Writes invalidate precisely: the post's own entry, and every cached
+    feed page whose filters the post matches before or after the change.
+    With POST_CACHE_SHARED the invalidation is published on the backplane
+    so every worker drops the same entries.
+    """
+
+    def __init__(self):
+        self.posts = LRUCache(POST_CACHE_SIZE, POST_CACHE_TTL)
+        self.feed = LRUCache(FEED_CACHE_SIZE, FEED_CACHE_TTL)
+        # Bumped on every invalidation; a read that raced one is not stored
+        self.generation = 0
+        backplane.subscribe(INVALIDATION_CHANNEL, self._on_invalidation)
+
+    # ------------------- Reads -------------------
+
+    async def get_post(self, post_id: str, load: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        body = self.posts.get(post_id)
+        if body is not None:
+            return body
+
+        generation = self.generation
+        body = await load()
+        if body is not None and generation == self.generation:
+            self.posts.set(post_id, body)
+        return body
+
+    async def get_feed(self, filters: dict, page: int, limit: int,
+                       load: Callable[[], Awaitable[Tuple[bytes, Optional[str]]]]) -> Tuple[bytes, Optional[str]]:
+        if page > FEED_CACHE_PAGES:
+            return await load()
+
+        key = feed_key(filters, page, limit)
+        cached = self.feed.get(key)
+        if cached is not None:
+            return cached
+
+        generation = self.generation
+        cached = await load()
+        if generation == self.generation:
+            self.feed.set(key, cached)
+        return cached
+
+    # ------------------- Invalidation -------------------
+
+    def _apply(self, post: dict):
+        self.generation += 1
+        self.posts.delete(post["id"])
+        self.feed.delete_where(lambda key: filters_match(key[0], post))
+
+    async def invalidate(self, *posts: dict):
+        """
+        Drop everything a write to these post versions can affect. Pass the
+        document before and after the change when the change can move it
+        between feeds (e.g. is_solved).
+        """
+        for post in posts:
+            event = {
+                "id": str(post.get("id") or post["_id"]),
+                "types": post.get("types"),
+                "is_solved": post.get("is_solved", False),
+                "tags": post.get("tags") or [],
+                "location": {"area": (post.get("location") or {}).get("area")},
+            }
+            # Local first so this worker's next read is already fresh
+            self._apply(event)
+            if POST_CACHE_SHARED:
+                await backplane.publish(INVALIDATION_CHANNEL, event["id"], event)
+
+    async def _on_invalidation(self, post_id: str, event: dict):
+        self._apply(event)
+
+    def stats(self) -> dict:
+        return {"posts": self.posts.stats(), "feed": self.feed.stats(), "shared": POST_CACHE_SHARED}
+
+
+post_cache = PostCache()
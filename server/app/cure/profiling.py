@@ -0,0 +1,364 @@
+"""
+Finding where the time goes inside a running worker.
+
+- SamplingProfiler: on demand, a thread reads the event loop thread's stack
+  (or every thread's) from sys._current_frames() every few milliseconds
+  for N seconds and returns the counts as collapsed stacks, the input of
+  flamegraph.pl / speedscope. Nothing runs between profiles.
+- SlowRequests: every HTTP request carries a RequestTrace in a contextvar;
+  the Mongo command listener appends the commands issued on its behalf
+  (motor copies the context into its driver threads). Requests slower than
+  SLOW_REQUEST_MS are kept in a ring buffer with their Mongo calls.
+- LoopMonitor: a task ticks every LOOP_TICK_MS and records how late it
+  ran; a watchdog thread notices when the loop has not ticked for
+  LOOP_BLOCK_MS and captures the loop thread's stack at that moment, which
+  names the synchronous call (an SDK upload, a blocking HTTP client) that
+  holds the loop.
+
+The /debug endpoints (admin only) expose all three.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+from .metrics import command_collection, event_loop_lag_seconds, event_loop_blocks
+
+load_dotenv()
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+# Mongo calls kept per request; a runaway loop of queries only keeps a count beyond this
+TRACE_MAX_MONGO_CALLS = int(os.getenv("TRACE_MAX_MONGO_CALLS", "200"))
+
+LOOP_TICK_MS = float(os.getenv("LOOP_TICK_MS", "100"))
+LOOP_BLOCK_MS = float(os.getenv("LOOP_BLOCK_MS", "200"))
+LOOP_BLOCK_BUFFER = int(os.getenv("LOOP_BLOCK_BUFFER", "50"))
+
+PROFILE_MAX_SECONDS = 60
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of a thread with nothing to do: the loop waiting in select(),
+# pool workers waiting for work
+_IDLE_LEAVES = {
+    ("selectors", "select"),
+    ("threading", "wait"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+# Requests to these paths are not captured as slow (a profile takes N seconds by design)
+_UNTRACED_PREFIXES = ("/debug/",)
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _stack(frame, with_lines: bool = False) -> List[str]:
+    """Root-first function labels of a thread's stack."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        label = _frame_label(frame)
+        labels.append(f"{label}:{frame.f_lineno}" if with_lines else label)
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+# ------------------- Sampling profiler -------------------
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.runs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval: float = 0.01,
+                      all_threads: bool = False, idle: bool = False) -> dict:
+        """
+        Sample for `seconds` and return {"collapsed", "samples", "seconds"}.
+        By default only the event loop thread is sampled, and samples of it
+        waiting in select() are dropped, so the output is where the loop
+        spends its busy time.
+        """
+        if self.running:
+            raise ProfilerBusy("A profile is already running")
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+
+        async with self._lock:
+            self.runs += 1
+            counts: Counter = Counter()
+            taken = [0]
+            stop = threading.Event()
+            target = None if all_threads else threading.get_ident()
+            sampler = threading.Thread(
+                target=self._sample, args=(counts, taken, stop, interval, target, idle),
+                name="profiler", daemon=True,
+            )
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+        return {
+            "collapsed": collapsed + "\n" if collapsed else "",
+            "samples": taken[0],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _sample(self, counts: Counter, taken: list, stop: threading.Event,
+                interval: float, target: Optional[int], idle: bool):
+        me = threading.get_ident()
+        while not stop.wait(interval):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()} if target is None else {}
+            for ident, frame in frames.items():
+                if ident == me or (target is not None and ident != target):
+                    continue
+                taken[0] += 1
+                if not idle and _is_idle(frame):
+                    continue
+                stack = _stack(frame)
+                if target is None:
+                    stack.insert(0, f"thread:{names.get(ident, ident)}")
+                counts[";".join(stack)] += 1
+            # Frames keep their locals alive; do not hold them until the next sample
+            del frames
+
+
+profiler = SamplingProfiler()
+
+
+# ------------------- Slow requests -------------------
+
+current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    __slots__ = ("method", "path", "route", "status", "started_at", "started", "seconds", "mongo", "mongo_dropped")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = 500
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.mongo: List[dict] = []
+        self.mongo_dropped = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.seconds is not None
+
+    def add_mongo(self, call: dict):
+        if len(self.mongo) < TRACE_MAX_MONGO_CALLS:
+            self.mongo.append(call)
+        else:
+            self.mongo_dropped += 1
+
+    def to_dict(self) -> dict:
+        mongo = list(self.mongo)
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "ms": round(self.seconds * 1000, 2),
+            "mongo_calls": len(mongo) + self.mongo_dropped,
+            "mongo_ms": round(sum(c["ms"] for c in mongo), 2),
+            "mongo": mongo,
+        }
+
+
+class SlowRequests:
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_MS, keep: int = SLOW_REQUEST_BUFFER):
+        self.threshold = threshold_ms / 1000
+        self.traces: deque = deque(maxlen=keep)
+        self.captured = 0
+
+    def record(self, trace: RequestTrace):
+        if trace.seconds >= self.threshold:
+            self.traces.append(trace)
+            self.captured += 1
+
+    def slowest(self, limit: int = 20) -> List[dict]:
+        traces = sorted(self.traces, key=lambda t: t.seconds, reverse=True)
+        return [t.to_dict() for t in traces[:limit]]
+
+    def stats(self) -> dict:
+        return {"threshold_ms": self.threshold * 1000, "captured": self.captured, "kept": len(self.traces)}
+
+
+slow_requests = SlowRequests()
+
+
+class TraceMiddleware:
+    """Pure ASGI middleware giving each HTTP request a RequestTrace; see MetricsMiddleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(_UNTRACED_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        trace = RequestTrace(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            await send(message)
+
+        token = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            trace.seconds = time.perf_counter() - trace.started
+            trace.route = getattr(scope.get("route"), "path", None)
+            slow_requests.record(trace)
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    """
+    Attaches Mongo commands to the RequestTrace of the request that issued
+    them. Runs on driver threads, inside the context motor copied from the
+    awaiting task; commands of background work have no trace and are skipped.
+    """
+
+    def __init__(self):
+        # request_id -> (trace, call)
+        self.pending: Dict[int, tuple] = {}
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is None or trace.finished:
+            return
+        call = {
+            "command": event.command_name,
+            "collection": command_collection(event),
+            "at_ms": round((time.perf_counter() - trace.started) * 1000, 2),
+        }
+        self.pending[event.request_id] = (trace, call)
+
+    def _finish(self, event, ok: bool):
+        entry = self.pending.pop(event.request_id, None)
+        if entry is None:
+            return
+        trace, call = entry
+        call["ms"] = round(event.duration_micros / 1000, 2)
+        call["ok"] = ok
+        trace.add_mongo(call)
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+trace_listener = TraceCommandListener()
+
+
+# ------------------- Event loop monitor -------------------
+
+class LoopMonitor:
+    def __init__(self, tick_ms: float = LOOP_TICK_MS, block_ms: float = LOOP_BLOCK_MS, keep: int = LOOP_BLOCK_BUFFER):
+        self.tick = tick_ms / 1000
+        self.block = block_ms / 1000
+        self.blocks: deque = deque(maxlen=keep)
+        self.last_tick = time.monotonic()
+        self.max_lag = 0.0
+        self.loop_thread: Optional[int] = None
+        self._task = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.loop_thread = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._ticker())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stop.set()
+        await asyncio.to_thread(self._watchdog.join)
+
+    async def _ticker(self):
+        while True:
+            expected = time.monotonic() + self.tick
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self.last_tick = now
+            self.max_lag = max(self.max_lag, lag)
+            event_loop_lag_seconds.observe(lag)
+
+    def _watch(self):
+        # Blocked once the loop is `block` later than its next tick was due
+        limit = self.tick + self.block
+        current = None
+        while not self._stop.wait(min(self.block / 2, self.tick)):
+            last = self.last_tick
+            stalled = time.monotonic() - last
+            if current is None and stalled > limit:
+                frame = sys._current_frames().get(self.loop_thread)
+                stack = _stack(frame, with_lines=True) if frame is not None else []
+                del frame
+                current = {"since": last, "at": time.time() - stalled + self.tick, "stack": stack}
+                event_loop_blocks.inc()
+                print(f"Event loop blocked for over {stalled * 1000:.0f}ms in {stack[-1] if stack else '?'}")
+            elif current is not None and last != current["since"]:
+                # Loop is back; the tick that ended the block was late by about its length
+                blocked = max(last - current.pop("since") - self.tick, 0.0)
+                current["ms"] = round(blocked * 1000, 1)
+                self.blocks.append(current)
+                current = None
+
+    def recent_blocks(self, limit: int = 20) -> List[dict]:
+        return list(self.blocks)[-limit:][::-1]
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "tick_ms": self.tick * 1000,
+            "block_ms": self.block * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "blocks_recorded": len(self.blocks),
+        }
+
+
+loop_monitor = LoopMonitor()
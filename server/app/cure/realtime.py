@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from dotenv import load_dotenv
+
+from .backplane import backplane
+from .connections import ConnectionRegistry, SocketSender
+from .metrics import registry
+
+load_dotenv()
+
+# Server -> client ping interval and how long a gateway client may stay silent
+WS_HEARTBEAT = float(os.getenv("WS_HEARTBEAT", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+
+CHANNELS = ("notifications", "chat", "receipts", "presence", "unread")
+
+# Close code for clients that stopped answering heartbeats (1001: going away)
+IDLE_CLOSE_CODE = 1001
+
+# Presence changes are broadcast to every process; watchers filter locally
+EVERYONE = "*"
+
+ConnectHook = Callable[[str, Callable[[str, dict], None]], Awaitable[None]]
+FrameHandler = Callable[[str, dict], Awaitable[None]]
+DeliveredHook = Callable[[str, str, dict], None]
+
+
+def frame(channel: str, data: dict, type: str = None) -> dict:
+    """Compact gateway envelope: c = channel, t = event type, d = data."""
+    envelope = {"c": channel, "d": data}
+    if type:
+        envelope["t"] = type
+    return envelope
+
+
+class RealtimeHub:
+    """
+    The single realtime subsystem behind every websocket.
+
+    /gateway/{uid} sockets carry all channels over one connection, each
+    message wrapped in a frame(). The legacy /ws/{userId} and
+    /messages/ws/{uid} sockets still work and get their one channel's raw
+    payloads. Cross-process routing goes through the backplane.
+    """
+
+    def __init__(self):
+        self.gateway = ConnectionRegistry(on_sent=self._gateway_sent)
+        self.legacy: Dict[str, ConnectionRegistry] = {
+            c: ConnectionRegistry(on_sent=self._legacy_sent(c)) for c in CHANNELS
+        }
+        self.connect_hooks: List[ConnectHook] = []
+        self.frame_handlers: Dict[str, FrameHandler] = {}
+        self.delivered_hooks: List[DeliveredHook] = []
+        # watched uid -> local uids that asked for its presence
+        self.watchers: Dict[str, Set[str]] = {}
+
+        for channel in CHANNELS:
+            backplane.subscribe(channel, self._handler(channel))
+
+    def _handler(self, channel: str):
+        async def handler(user_id: str, payload: dict):
+            self.deliver(channel, user_id, payload)
+        return handler
+
+    # ------------------- Outbound -------------------
+
+    async def publish(self, channel: str, user_id: str, payload: dict):
+        """Send to every socket of the user, whichever process holds it."""
+        await backplane.publish(channel, user_id, payload)
+
+    def deliver(self, channel: str, user_id: str, payload: dict) -> int:
+        if channel == "presence" and user_id == EVERYONE:
+            return self._deliver_presence(payload)
+
+        pushed = self.gateway.push(user_id, frame(channel, payload, payload.get("type")))
+        pushed += self.legacy[channel].push(user_id, payload)
+        return pushed
+
+    def _deliver_presence(self, payload: dict) -> int:
+        pushed = 0
+        for watcher in list(self.watchers.get(payload["uid"], ())):
+            pushed += self.gateway.push(watcher, frame("presence", payload, "presence"))
+        return pushed
+
+    def is_online(self, user_id: str) -> bool:
+        return self.gateway.is_online(user_id) or any(r.is_online(user_id) for r in self.legacy.values())
+
+    async def _announce(self, user_id: str, online: bool):
+        await backplane.publish("presence", EVERYONE, {"uid": user_id, "online": online})
+
+    # ------------------- Extension points -------------------
+
+    def on_connect(self, hook: ConnectHook):
+        """hook(user_id, push) runs for every new gateway socket; push(channel, payload) targets it."""
+        self.connect_hooks.append(hook)
+
+    def on_frame(self, channel: str, handler: FrameHandler):
+        """handler(user_id, frame) receives client frames sent on `channel`."""
+        self.frame_handlers[channel] = handler
+
+    def on_delivered(self, hook: DeliveredHook):
+        """
+        hook(channel, user_id, payload) runs each time a payload was written
+        to one of the user's sockets. It runs on the socket's writer task, so
+        it must not block.
+        """
+        self.delivered_hooks.append(hook)
+
+    def _delivered(self, channel: str, user_id: str, payload: dict):
+        for hook in self.delivered_hooks:
+            try:
+                hook(channel, user_id, payload)
+            except Exception as e:
+                print(f"Delivered hook failed for {user_id}: {e}")
+
+    def _gateway_sent(self, sender: SocketSender, message: dict):
+        if message.get("c") in CHANNELS:
+            self._delivered(message["c"], sender.user_id, message["d"])
+
+    def _legacy_sent(self, channel: str):
+        def sent(sender: SocketSender, message: dict):
+            self._delivered(channel, sender.user_id, message)
+        return sent
+
+    # ------------------- Gateway -------------------
+
+    async def serve_gateway(self, websocket: WebSocket, user_id: str):
+        await websocket.accept()
+        first = not self.is_online(user_id)
+        sender = self.gateway.add(user_id, websocket)
+
+        def push(channel: str, payload: dict):
+            sender.push(frame(channel, payload, payload.get("type")))
+
+        for hook in self.connect_hooks:
+            try:
+                await hook(user_id, push)
+            except Exception as e:
+                print(f"Gateway connect hook failed for {user_id}: {e}")
+
+        if first:
+            await self._announce(user_id, True)
+
+        heartbeat = asyncio.create_task(self._heartbeat(sender))
+        try:
+            while True:
+                try:
+                    text = await asyncio.wait_for(websocket.receive_text(), WS_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await sender.close(code=IDLE_CLOSE_CODE)
+                    break
+                await self._on_client_frame(user_id, sender, text)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            heartbeat.cancel()
+            self.gateway.remove(user_id, websocket)
+            self._unwatch(user_id)
+            if not self.is_online(user_id):
+                await self._announce(user_id, False)
+
+    async def _heartbeat(self, sender: SocketSender):
+        while not sender.closed:
+            await asyncio.sleep(WS_HEARTBEAT)
+            sender.push(frame("sys", {}, "ping"))
+
+    async def _on_client_frame(self, user_id: str, sender: SocketSender, text: str):
+        try:
+            message = json.loads(text)
+            channel = message.get("c")
+        except (ValueError, AttributeError):
+            sender.push(frame("sys", {"error": "invalid frame"}, "error"))
+            return
+
+        if channel == "sys":
+            if message.get("t") == "ping":
+                sender.push(frame("sys", {}, "pong"))
+            return
+
+        if channel == "presence" and message.get("t") == "watch":
+            uids = (message.get("d") or {}).get("uids") or []
+            for uid in uids:
+                self.watchers.setdefault(uid, set()).add(user_id)
+            sender.push(frame("presence", {"online": {uid: self.is_online(uid) for uid in uids}}, "snapshot"))
+            return
+
+        handler = self.frame_handlers.get(channel)
+        if handler:
+            await handler(user_id, message)
+
+    def _unwatch(self, user_id: str):
+        if self.gateway.is_online(user_id):
+            return
+        for uid in list(self.watchers):
+            self.watchers[uid].discard(user_id)
+            if not self.watchers[uid]:
+                del self.watchers[uid]
+
+    # ------------------- Legacy single-channel sockets -------------------
+
+    async def connect_legacy(self, channel: str, websocket: WebSocket, user_id: str) -> SocketSender:
+        await websocket.accept()
+        return self.legacy[channel].add(user_id, websocket)
+
+    def disconnect_legacy(self, channel: str, websocket: WebSocket, user_id: str):
+        self.legacy[channel].remove(user_id, websocket)
+
+    def stats(self) -> dict:
+        return {
+            "gateway_sockets": self.gateway.socket_count,
+            "legacy_sockets": {c: r.socket_count for c, r in self.legacy.items()},
+            "users_online": len(set(self.gateway.sockets).union(*(r.sockets for r in self.legacy.values()))),
+        }
+
+
+hub = RealtimeHub()
+
+# Read at scrape time. "notifications" is WSManager's /ws socket, "chat" ConnectionManager's
+registry.gauge(
+    "ws_sockets", "Open websockets in this process", ("endpoint",),
+    callback=lambda: {("gateway",): hub.gateway.socket_count,
+                      **{(channel,): r.socket_count for channel, r in hub.legacy.items()}},
+)
+registry.gauge("ws_users_online", "Users with at least one socket in this process",
+               callback=lambda: hub.stats()["users_online"])
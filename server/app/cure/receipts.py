@@ -0,0 +1,168 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateMany
+from db.mongodb import messages_collection, conversations_collection
+from . import conversations
+from .realtime import hub
+from .unread import unread
+
+load_dotenv()
+
+# Deliveries recorded within this window share one bulk write and one push per conversation
+RECEIPT_WINDOW = float(os.getenv("RECEIPT_WINDOW_MS", "250")) / 1000
+
+Conversation = Tuple[str, str, str]  # (post_id, sender uid, receiver uid)
+
+
+class ReceiptBatcher:
+    """
+    Delivery and seen receipts for chat messages.
+
+    A message counts as delivered once a socket of its receiver has actually
+    written it (hub.on_delivered), not when it was published. Deliveries are
+    collected for RECEIPT_WINDOW and flushed together: one bulk write for
+    every message delivered in the window, and one "receipts" push per
+    conversation to the sender, however many messages and sockets were
+    involved. A burst of chat therefore costs a write per window rather than
+    one per message.
+
+    Seen receipts come from mark_seen(), which already updates a whole
+    conversation at once; it pushes the same coalesced event.
+    """
+
+    def __init__(self, window: float = RECEIPT_WINDOW):
+        self.window = window
+        # message_id -> (conversation, delivered_at); several sockets of one user collapse here
+        self.pending: Dict[ObjectId, Tuple[Conversation, datetime]] = {}
+        self._flush_handle = None
+        self.flushes = 0
+        self.recorded = 0
+        self.pushed = 0
+        hub.on_delivered(self.on_delivered)
+        hub.on_frame("receipts", self.on_frame)
+
+    # ------------------- Delivered -------------------
+
+    def on_delivered(self, channel: str, user_id: str, payload: dict):
+        if channel != "chat" or payload.get("type") != "new_message" or not payload.get("message_id"):
+            return
+
+        message_id = ObjectId(payload["message_id"])
+        if message_id in self.pending:
+            return
+
+        conversation = (payload["post_id"], payload["sender"]["uid"], user_id)
+        self.pending[message_id] = (conversation, datetime.utcnow())
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.window, lambda: asyncio.create_task(self.flush()))
+
+    async def flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        by_conversation: Dict[Conversation, List[ObjectId]] = {}
+        delivered_at: Dict[Conversation, datetime] = {}
+        for message_id, (conversation, at) in pending.items():
+            by_conversation.setdefault(conversation, []).append(message_id)
+            delivered_at[conversation] = max(at, delivered_at.get(conversation, at))
+
+        message_ops, conversation_ops = [], []
+        for conversation, ids in by_conversation.items():
+            at = delivered_at[conversation]
+            # Only "sent" moves forward; a message already seen stays seen
+            message_ops.append(UpdateMany(
+                {"_id": {"$in": ids}, "status": "sent"},
+                {"$set": {"status": "delivered", "delivered_at": at}},
+            ))
+            conversation_ops.append(UpdateMany(
+                {"last_message._id": {"$in": ids}, "last_message.status": "sent"},
+                {"$set": {"last_message.status": "delivered", "last_message.delivered_at": at}},
+            ))
+
+        try:
+            await messages_collection.bulk_write(message_ops, ordered=False)
+            await conversations_collection.bulk_write(conversation_ops, ordered=False)
+        except Exception as e:
+            print(f"Recording {len(pending)} delivery receipt(s) failed, retrying: {e}")
+            # Back into the next window; deliveries recorded since keep their own entry
+            for message_id, entry in pending.items():
+                self.pending.setdefault(message_id, entry)
+            self.schedule_flush()
+            return
+
+        self.flushes += 1
+        self.recorded += len(pending)
+        for (post_id, sender_uid, receiver_uid), ids in by_conversation.items():
+            await self.push(sender_uid, "delivered", post_id, receiver_uid, ids, delivered_at[(post_id, sender_uid, receiver_uid)])
+
+    # ------------------- Seen -------------------
+
+    async def mark_seen(self, post_id: str, user_uid: str) -> int:
+        """Mark everything `user_uid` received on the post as seen; returns how many messages changed."""
+        unseen = await messages_collection.find(
+            {"post_id": post_id, "receiver.uid": user_uid, "status": {"$ne": "seen"}},
+            {"sender.uid": 1},
+        ).to_list(None)
+        if not unseen:
+            return 0
+
+        seen_at = datetime.utcnow()
+        result = await messages_collection.update_many(
+            {"_id": {"$in": [m["_id"] for m in unseen]}, "status": {"$ne": "seen"}},
+            {"$set": {"status": "seen", "seen_at": seen_at}},
+        )
+        await conversations.mark_read(post_id, user_uid, seen_at)
+        await unread.add(user_uid, "messages", -result.modified_count)
+
+        by_sender: Dict[str, List[ObjectId]] = {}
+        for message in unseen:
+            self.pending.pop(message["_id"], None)
+            by_sender.setdefault(message["sender"]["uid"], []).append(message["_id"])
+        for sender_uid, ids in by_sender.items():
+            await self.push(sender_uid, "seen", post_id, user_uid, ids, seen_at)
+
+        return result.modified_count
+
+    async def on_frame(self, user_id: str, message: dict):
+        # {"c": "receipts", "t": "seen", "d": {"post_id": ...}} from an open conversation
+        post_id = (message.get("d") or {}).get("post_id")
+        if message.get("t") == "seen" and post_id:
+            await self.mark_seen(post_id, user_id)
+
+    # ------------------- Push -------------------
+
+    async def push(self, sender_uid: str, status: str, post_id: str, by: str, ids: List[ObjectId], at: datetime):
+        self.pushed += 1
+        await hub.publish("receipts", sender_uid, {
+            "type": "receipts",
+            "status": status,
+            "post_id": post_id,
+            "by": by,
+            "message_ids": [str(i) for i in ids],
+            "at": at.isoformat(),
+        })
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": round(self.window * 1000),
+            "pending": len(self.pending),
+            "flushes": self.flushes,
+            "recorded": self.recorded,
+            "pushed": self.pushed,
+        }
+
+
+receipts = ReceiptBatcher()
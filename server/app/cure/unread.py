@@ -0,0 +1,177 @@
+import os
+from datetime import datetime
+from typing import Dict
+
+from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+from db.mongodb import (
+    unread_collection, messages_collection, notifications_collection, users_collection, sync_state_collection,
+)
+from .jobs import jobs
+from .realtime import hub
+
+load_dotenv()
+
+# How often the counters are recounted from messages and notifications
+UNREAD_RECONCILE_SECONDS = float(os.getenv("UNREAD_RECONCILE_SECONDS", "3600"))
+
+FIELDS = ("messages", "notifications")
+
+REKEY_STATE_ID = "unread_rekey_by_uid"
+
+
+def counts_of(doc: dict) -> Dict[str, int]:
+    doc = doc or {}
+    return {field: max(doc.get(field, 0), 0) for field in FIELDS}
+
+
+class UnreadCounters:
+    """
+    Unread messages and notifications per user, one document each in
+    `unread` ({_id: user_id, messages, notifications}). user_id is the
+    Firebase uid everywhere, as in chat messages and notifications.
+
+    Every write that changes what a user has unread adjusts the counter
+    with a single $inc and pushes the new counts on the "unread" channel,
+    so clients are told instead of polling. Reads are one _id lookup.
+    reconcile() recounts from the source collections to fix any drift.
+    """
+
+    def __init__(self):
+        hub.on_connect(self.send_counts)
+
+    async def add(self, user_id: str, field: str, delta: int):
+        if not delta:
+            return
+        doc = await unread_collection.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {field: delta}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        await self.push(user_id, counts_of(doc))
+
+    async def get(self, user_id: str) -> Dict[str, int]:
+        return counts_of(await unread_collection.find_one({"_id": user_id}, {field: 1 for field in FIELDS}))
+
+    async def push(self, user_id: str, counts: Dict[str, int]):
+        await hub.publish("unread", user_id, {"type": "counts", **counts})
+
+    async def send_counts(self, user_id: str, push):
+        # Current counts for every new gateway socket
+        push("unread", {"type": "counts", **await self.get(user_id)})
+
+    # ------------------- Reconciliation -------------------
+
+    async def recount(self) -> Dict[str, Dict[str, int]]:
+        """Counts straight from messages and notifications: user_id -> {field: count}."""
+        actual: Dict[str, Dict[str, int]] = {}
+
+        async for row in messages_collection.aggregate([
+            {"$match": {"status": {"$ne": "seen"}}},
+            {"$group": {"_id": "$receiver.uid", "count": {"$sum": 1}}},
+        ]):
+            actual.setdefault(row["_id"], {})["messages"] = row["count"]
+
+        async for row in notifications_collection.aggregate([
+            {"$match": {"read": False}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        ]):
+            actual.setdefault(row["_id"], {})["notifications"] = row["count"]
+
+        return actual
+
+    async def reconcile(self) -> int:
+        """
+        Rewrite every counter that disagrees with a recount, negative ones
+        included; returns how many users were corrected.
+
+        Counters are read before the recount and each fix only applies if
+        the counter still holds the value that was read, so an $inc that
+        lands while the recount runs makes that user's fix a no-op instead
+        of being overwritten. A write whose source change came before the
+        counters were read but whose $inc lands after the fix is counted
+        twice; the next run corrects it.
+        """
+        stored = {doc["_id"]: doc async for doc in unread_collection.find({}, {field: 1 for field in FIELDS})}
+        actual = await self.recount()
+        ops, corrected = [], {}
+
+        for user_id, doc in stored.items():
+            raw = {field: doc.get(field, 0) for field in FIELDS}
+            counts = actual.pop(user_id, {})
+            expected = {field: counts.get(field, 0) for field in FIELDS}
+            if raw != expected:
+                unchanged = {field: doc[field] if field in doc else {"$exists": False} for field in FIELDS}
+                ops.append(UpdateOne(
+                    {"_id": user_id, **unchanged},
+                    {"$set": {**expected, "updated_at": datetime.utcnow()}},
+                ))
+                corrected[user_id] = expected
+
+        # Users with unread items and no counter yet
+        for user_id, counts in actual.items():
+            expected = {field: counts.get(field, 0) for field in FIELDS}
+            ops.append(UpdateOne(
+                {"_id": user_id},
+                {"$setOnInsert": {**expected, "updated_at": datetime.utcnow()}},
+                upsert=True,
+            ))
+            corrected[user_id] = expected
+
+        if not ops:
+            return 0
+        result = await unread_collection.bulk_write(ops, ordered=False)
+        # Fixes skipped for a concurrent change leave the counter as it is; push what is stored
+        for user_id in corrected:
+            await self.push(user_id, await self.get(user_id))
+        return result.modified_count + result.upserted_count
+
+
+unread = UnreadCounters()
+
+
+async def rekey_by_uid() -> int:
+    """
+    One-off for data from before notifications were keyed by uid, when
+    match notifications used the owner's email. Moves them to the uid of
+    the user with that email and drops the email-keyed counters; the
+    reconcile that follows recounts the uid ones. Recorded in sync_state.
+    """
+    if await sync_state_collection.find_one({"_id": REKEY_STATE_ID}):
+        return 0
+
+    moved = 0
+    async for user in users_collection.find({}, {"uid": 1, "email": 1}):
+        if not user.get("uid") or not user.get("email"):
+            continue
+        result = await notifications_collection.update_many(
+            {"user_id": user["email"]},
+            {"$set": {"user_id": user["uid"], "email": user["email"]}},
+        )
+        moved += result.modified_count
+        await unread_collection.delete_one({"_id": user["email"]})
+
+    await sync_state_collection.update_one(
+        {"_id": REKEY_STATE_ID},
+        {"$set": {"moved": moved, "done_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    print(f"Unread counters: moved {moved} notification(s) from email to uid")
+    return moved
+
+
+async def run_reconcile_job(payload: dict):
+    await rekey_by_uid()
+    corrected = await unread.reconcile()
+    if corrected:
+        print(f"Unread counters: corrected {corrected} user(s)")
+    await schedule_reconcile(delay=UNREAD_RECONCILE_SECONDS)
+
+
+async def schedule_reconcile(delay: float = 0):
+    # One pending run at a time; each run schedules the next
+    await jobs.enqueue("reconcile_unread", coalesce=True, delay=delay)
+
+
+jobs.register("reconcile_unread", run_reconcile_job)
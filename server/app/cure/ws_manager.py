@@ -1,40 +1,37 @@
 from fastapi import WebSocket
-from starlette.websockets import WebSocketDisconnect
-from typing import Dict
 from datetime import datetime
 from db.mongodb import notifications_collection
+from .realtime import hub
+from .unread import unread
 
 class WSManager:
+    """Notifications channel of the realtime hub."""
+
     def __init__(self):
-        self.active: Dict[str, WebSocket] = {}
+        self.active = hub.legacy["notifications"]
+        hub.on_connect(self.send_unread)
 
     async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active[user_id] = websocket
+        sender = await hub.connect_legacy("notifications", websocket, user_id)
+        await self.send_unread(user_id, lambda channel, payload: sender.push(payload))
+
+    def disconnect(self, user_id: str, websocket: WebSocket):
+        hub.disconnect_legacy("notifications", websocket, user_id)
 
+    async def send_unread(self, user_id: str, push):
         # SEND UNREAD NOTIFICATIONS ON CONNECT
         unread_notifications = await notifications_collection.find(
             {"user_id": user_id, "read": False}
         ).sort("created_at", -1).to_list(20)
 
-        try:
-            for n in unread_notifications:
-                await websocket.send_json({
-                    "id": str(n["_id"]),
-                    "type": n.get("type", "notification"),
-                    "title": n["title"],
-                    "message": n["message"],
-                    "created_at": n["created_at"].isoformat(),
-                })
-        except WebSocketDisconnect:
-            print(f"WebSocketDisconnect while sending unread notifications to user {user_id}")
-            self.disconnect(user_id)
-        except Exception as e:
-            print(f"Error sending unread notifications to user {user_id}: {e}")
-            self.disconnect(user_id)
-
-    def disconnect(self, user_id: str):
-        self.active.pop(user_id, None)
+        for n in unread_notifications:
+            push("notifications", {
+                "id": str(n["_id"]),
+                "type": n.get("type", "notification"),
+                "title": n["title"],
+                "message": n["message"],
+                "created_at": n["created_at"].isoformat(),
+            })
 
     async def send(self, user_id: str, payload: dict):
         # STORE IN DB (RELIABILITY)
@@ -46,15 +43,7 @@ class WSManager:
             "read": False,
             "created_at": datetime.utcnow(),
         })
+        await unread.add(user_id, "notifications", 1)
 
-        # PUSH IF USER IS ONLINE
-        ws = self.active.get(user_id)
-        if ws:
-            try:
-                await ws.send_json(payload)
-            except WebSocketDisconnect:
-                print(f"WebSocketDisconnect while sending to user {user_id}")
-                self.disconnect(user_id)
-            except Exception as e:
-                print(f"Unexpected error sending to user {user_id}: {e}")
-                self.disconnect(user_id)
+        # PUSH TO EVERY SOCKET OF THE USER, WHICHEVER PROCESS HOLDS IT
+        await hub.publish("notifications", user_id, payload)
@@ -0,0 +1,227 @@
+"""
+Every index the app relies on, declared in one place and applied at startup.
+
+create_indexes() is idempotent, so applying the registry on every boot only
+builds what is missing. The check mode explains each route's query shape
+and fails if any of them still needs a collection scan:
+
+    python -m db.indexes            # apply
+    python -m db.indexes --check    # apply, then verify the query plans
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from db import mongodb
+from db.pagination import FEED_SORT, after_cursor, encode_cursor
+from ai.cache import MATCH_CACHE_TTL
+from cure.jobs import JOB_RETENTION
+from config.mail import MAIL_RETENTION
+from cure.conversations import HISTORY_SORT, newer_than, older_than, thread_query
+
+
+# ------------------- Registry -------------------
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "posts": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="feed"),
+        IndexModel([("types", ASCENDING), ("is_solved", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="feed_by_type"),
+        IndexModel([("tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="feed_by_tag"),
+        IndexModel([("location.area", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="feed_by_area"),
+        IndexModel([("user.uid", ASCENDING), ("created_at", DESCENDING)], name="by_user"),
+        IndexModel([("title", TEXT), ("description", TEXT), ("tags", TEXT)],
+                   weights={"title": 3, "tags": 2, "description": 1}, name="search"),
+    ],
+    "lost_items": [
+        IndexModel([("id", ASCENDING)], unique=True, name="post_id"),
+    ],
+    "found_items": [
+        IndexModel([("id", ASCENDING)], unique=True, name="post_id"),
+    ],
+    "messages": [
+        # One per side of GET /messages' $or, both in history order
+        IndexModel([("post_id", ASCENDING), ("sender.uid", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="thread_by_sender"),
+        IndexModel([("post_id", ASCENDING), ("receiver.uid", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="thread_by_receiver"),
+        IndexModel([("sender.uid", ASCENDING), ("created_at", DESCENDING)], name="by_sender"),
+        IndexModel([("receiver.uid", ASCENDING), ("created_at", DESCENDING)], name="by_receiver"),
+        IndexModel([("receiver.uid", ASCENDING), ("status", ASCENDING)], name="unread"),
+    ],
+    "conversations": [
+        IndexModel([("key", ASCENDING)], unique=True, name="conversation_key"),
+        IndexModel([("participants", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], name="inbox"),
+        IndexModel([("post_id", ASCENDING)], name="by_post"),
+        IndexModel([("last_message._id", ASCENDING)], name="by_last_message"),
+    ],
+    "notifications": [
+        IndexModel([("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)], name="unread"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="due"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="lease"),
+        IndexModel([("kind", ASCENDING), ("status", ASCENDING)], name="by_kind"),
+        IndexModel([("status", ASCENDING), ("finished_at", DESCENDING)], name="recent"),
+        IndexModel([("key", ASCENDING)], unique=True, sparse=True, name="idempotency_key"),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=JOB_RETENTION, name="ttl"),
+    ],
+    "matches": [
+        IndexModel([("lost_post_id", ASCENDING), ("matches.found_post_id", ASCENDING)], name="by_pair"),
+    ],
+    "match_cache": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=MATCH_CACHE_TTL, name="ttl"),
+        IndexModel([("last_hit_at", ASCENDING)], name="lru"),
+    ],
+    "mail_queue": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="due"),
+        IndexModel([("status", ASCENDING), ("recipient", ASCENDING), ("next_attempt_at", ASCENDING)],
+                   name="due_by_recipient"),
+        IndexModel([("claim", ASCENDING)], sparse=True, name="claim"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="lease"),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=MAIL_RETENTION, name="ttl"),
+    ],
+}
+
+
+async def ensure_indexes(database=None) -> Dict[str, List[str]]:
+    """
+    Create every registered index that does not exist yet. Each index is
+    its own call, so one that fails (an existing index with other options
+    or keys under the name, e.g. a hand-made text index, or duplicates
+    blocking a unique index) is reported and does not stop the others.
+    """
+    database = database if database is not None else mongodb.db
+    created = {}
+
+    for name, models in INDEXES.items():
+        for model in models:
+            index = model.document["name"]
+            try:
+                created.setdefault(name, []).extend(await database[name].create_indexes([model]))
+            except OperationFailure as e:
+                # 85 IndexOptionsConflict, 86 IndexKeySpecsConflict, 11000 duplicate keys
+                print(f"Index bootstrap failed on {name}.{index} (code {e.code}): {e}")
+
+    return created
+
+
+# ------------------- Query plan check -------------------
+
+def _sample_anchor() -> dict:
+    return {"created_at": datetime.utcnow(), "_id": ObjectId()}
+
+
+def _sample_cursor() -> str:
+    return encode_cursor(_sample_anchor())
+
+
+# (route, collection, filter, sort) for every query a request path runs
+QUERY_SHAPES = [
+    ("GET /posts/get_all", "posts", {}, FEED_SORT),
+    ("GET /posts/get_all?cursor", "posts", after_cursor({}, _sample_cursor()), FEED_SORT),
+    ("GET /posts/get_all?types&is_solved", "posts", {"types": "lost", "is_solved": False}, FEED_SORT),
+    ("GET /posts/get_all?tag", "posts", {"tags": "wallet"}, FEED_SORT),
+    ("GET /posts/get_all?area", "posts", {"location.area": "library"}, FEED_SORT),
+    ("GET /posts/search", "posts", {"$text": {"$search": "wallet"}}, FEED_SORT),
+    ("GET /posts/{post_id}", "posts", {"_id": ObjectId()}, None),
+    ("GET /posts/user/{user_uid}", "posts", {"user.uid": "uid"}, [("created_at", -1)]),
+    ("PATCH /posts/{post_id}/mark_solved", "lost_items", {"id": "post"}, None),
+    ("splitter upsert", "found_items", {"id": "post"}, None),
+    ("insert_without_duplicates", "lost_items", {"id": {"$in": ["a", "b"]}}, None),
+    ("splitter tail", "posts", {"_id": {"$gt": ObjectId()}}, [("_id", 1)]),
+    ("GET /messages", "messages", thread_query("post", "uid"), HISTORY_SORT),
+    ("GET /messages?before", "messages", thread_query("post", "uid", older_than(_sample_anchor())), HISTORY_SORT),
+    ("GET /messages?since", "messages", thread_query("post", "uid", newer_than(_sample_anchor())),
+     [("created_at", 1), ("_id", 1)]),
+    ("GET /messages (anchor)", "messages", {"_id": ObjectId()}, None),
+    ("PATCH /messages/seen/{post_id}", "messages",
+     {"post_id": "post", "receiver.uid": "uid", "status": {"$ne": "seen"}}, None),
+    ("GET /messages/inbox/{uid}", "conversations", {"participants": "uid"}, [("updated_at", -1), ("_id", -1)]),
+    ("GET /messages/inbox/{uid}?cursor", "conversations",
+     after_cursor({"participants": "uid"}, _sample_cursor(), field="updated_at"), [("updated_at", -1), ("_id", -1)]),
+    ("POST /messages (conversation)", "conversations", {"key": "post:a:b"}, None),
+    ("PATCH /messages/seen/{post_id} (conversation)", "conversations", {"post_id": "post", "participants": "uid"}, None),
+    ("delivery receipts", "messages", {"_id": {"$in": [ObjectId()]}, "status": "sent"}, None),
+    ("delivery receipts (conversation)", "conversations",
+     {"last_message._id": {"$in": [ObjectId()]}, "last_message.status": "sent"}, None),
+    ("GET /messages/unread-count/{uid}", "messages", {"receiver.uid": "uid", "status": {"$ne": "seen"}}, None),
+    ("websocket connect (unread notifications)", "notifications",
+     {"user_id": "uid", "read": False}, [("created_at", -1)]),
+    ("GET /notifications/{user_id}", "notifications", {"user_id": "uid"}, [("created_at", -1)]),
+    ("PATCH /notifications/read-all/{user_id}", "notifications", {"user_id": "uid", "read": False}, None),
+    ("GET /get/notifications", "unread_counters", {"_id": "uid"}, None),
+    ("POST /test/user", "users", {"email": "user@example.com"}, None),
+    ("mail worker claim", "mail_queue",
+     {"status": "pending", "next_attempt_at": {"$lte": datetime.utcnow()}}, [("next_attempt_at", 1)]),
+    ("mail worker digest", "mail_queue", {"claim": ObjectId()}, [("created_at", 1)]),
+    ("mail worker lease", "mail_queue", {"status": "sending", "lease_until": {"$lt": datetime.utcnow()}}, None),
+    ("cached match already notified", "matches",
+     {"lost_post_id": "post", "matches": {"$elemMatch": {"found_post_id": {"$in": ["a"]}, "score": {"$gt": 0.6}}}},
+     None),
+    ("match cache eviction", "match_cache", {}, [("last_hit_at", 1)]),
+    ("job claim", "jobs", {"status": "pending", "run_at": {"$lte": datetime.utcnow()}}, [("run_at", 1)]),
+    ("job coalesce", "jobs", {"kind": "match", "status": "pending"}, None),
+    ("job lease", "jobs", {"status": "running", "lease_until": {"$lt": datetime.utcnow()}}, None),
+    ("GET /jobs/stats", "jobs", {"status": "done"}, [("finished_at", -1)]),
+]
+
+
+def plan_stages(plan: dict) -> List[str]:
+    """Every stage name in an explain() plan tree."""
+    stages = [plan.get("stage")] if plan.get("stage") else []
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+async def check_query_plans(database=None) -> List[str]:
+    """Explain every QUERY_SHAPES entry; returns the routes that scan a collection."""
+    database = database if database is not None else mongodb.db
+    scans = []
+
+    for route, collection, query, sort in QUERY_SHAPES:
+        cursor = database[collection].find(query).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        explained = await cursor.explain()
+        stages = plan_stages(explained["queryPlanner"]["winningPlan"])
+        print(f"{'COLLSCAN' if 'COLLSCAN' in stages else 'ok':<8} {route:<45} {' <- '.join(stages)}")
+        if "COLLSCAN" in stages:
+            scans.append(route)
+
+    return scans
+
+
+async def _main(check: bool) -> int:
+    for collection, names in (await ensure_indexes()).items():
+        print(f"{collection}: {', '.join(names)}")
+
+    if not check:
+        return 0
+
+    scans = await check_query_plans()
+    if scans:
+        print(f"{len(scans)} route(s) scan a whole collection: {', '.join(scans)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="fail if any route's query does a COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.check)))
@@ -1,14 +1,20 @@
 from pymongo.mongo_client import MongoClient
 from config.mongo import MONGO_URL
 
-client = MongoClient(MONGO_URL)
-
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
+# Synchronous client for scripts. Creating it does not block: pymongo
+# connects in the background, so importing this module costs no round trip.
+client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
 
 db = client.hackzenith
 users_collection = db["users"]
-posts_collection = db["posts"]
\ No newline at end of file
+posts_collection = db["posts"]
+
+
+def ping() -> bool:
+    try:
+        client.admin.command('ping')
+        print("Pinged your deployment. You successfully connected to MongoDB!")
+        return True
+    except Exception as e:
+        print(e)
+        return False
@@ -1,5 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from config.mongo import MONGO_URL
+from cure.metrics import mongo_listener
+from cure.profiling import trace_listener
 
 DATABASE_NAME = "hackzenith"
 
@@ -12,6 +14,7 @@ else:
 client = AsyncIOMotorClient(
     MONGO_URL,
     serverSelectionTimeoutMS=5000,
+    event_listeners=[mongo_listener, trace_listener],
 )
 
 db = client[DATABASE_NAME]
@@ -20,6 +23,12 @@ users_collection = db["users"]
 posts_collection = db["posts"]
 notifications_collection = db["notifications"]
 messages_collection = db["messages"]
+conversations_collection = db["conversations"]
 found_collection = db["found_items"]
 lost_collection = db["lost_items"]
 matches_collection = db["matches"]
+sync_state_collection = db["sync_state"]
+match_cache_collection = db["match_cache"]
+mail_queue_collection = db["mail_queue"]
+jobs_collection = db["jobs"]
+unread_collection = db["unread_counters"]
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+
+# Feed order; _id breaks ties between posts created in the same millisecond
+FEED_SORT = [("created_at", -1), ("_id", -1)]
+
+# Largest page a feed request gets; bigger limits are clamped rather than rejected
+MAX_PAGE_SIZE = 100
+
+
+def page_size(limit: int) -> int:
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def encode_cursor(doc: dict, field: str = "created_at") -> str:
+    """Opaque cursor pointing just after `doc` in (field, _id) descending order."""
+    raw = json.dumps([doc[field].isoformat(), str(doc["_id"])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Returns (timestamp, _id); raises ValueError for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), ObjectId(_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(query: dict, cursor: Optional[str], field: str = "created_at") -> dict:
+    """
+    Restrict `query` to documents after `cursor`. With an index on
+    (field, _id) Mongo seeks straight to the position instead of
+    walking and discarding every earlier document like skip() does.
+    """
+    if not cursor:
+        return query
+
+    value, _id = decode_cursor(cursor)
+    seek = {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "_id": {"$lt": _id}},
+    ]}
+    return {"$and": [query, seek]} if query else seek
+
+
+def next_cursor(docs: list, limit: int, field: str = "created_at") -> Optional[str]:
+    """Cursor for the following page, or None when this page was the last."""
+    if limit <= 0 or len(docs) < limit:
+        return None
+    return encode_cursor(docs[-1], field)
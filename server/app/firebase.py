@@ -1,8 +1,32 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth, messaging
+from config.auth import FIREBASE_CREDENTIALS
 
-cred = credentials.Certificate("firebase-service-account.json")
+# Initialized on first use: importing the Admin SDK and Firestore, reading
+# the service account and building the client used to run at import time.
+_app = None
+_db = None
 
-firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+def get_app():
+    global _app
+    if _app is None:
+        import firebase_admin
+        from firebase_admin import credentials
+
+        _app = firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS))
+    return _app
+
+
+def get_firestore():
+    global _db
+    if _db is None:
+        from firebase_admin import firestore
+
+        _db = firestore.client(get_app())
+    return _db
+
+
+def __getattr__(name):
+    # `from firebase import db` keeps working
+    if name == "db":
+        return get_firestore()
+    raise AttributeError(name)
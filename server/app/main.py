@@ -1,8 +1,27 @@
-from fastapi import FastAPI
+from cure.lifecycle import lifecycle
+from fastapi import FastAPI, Header, Query
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
-from router import user, post, ws, chat
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
+from router import user, post, ws, chat, gateway, notifications, debug, jobs as jobs_router
 import asyncio
-from ai.brack import break_posts_collection, monitor_found_collection
+import os
+from ai.brack import watch_posts_collection, schedule_matching
+from cure.mail_queue import mail_worker
+from cure.backplane import backplane
+from cure.jobs import jobs
+from cure.unread import unread, counts_of, schedule_reconcile
+from auth import get_current_user
+from cure.receipts import receipts
+from cure.firebase_tokens import verifier
+from cure.metrics import MetricsMiddleware, registry, CONTENT_TYPE
+from cure.profiling import TraceMiddleware, loop_monitor
+from db import mongodb
+from db.indexes import ensure_indexes
+from ai.client import gemini_client
+from ai.matchers import matcher
+from config.images import IMAGE_STORE, IMAGE_LOCAL_DIR, IMAGE_LOCAL_URL
 
 app = FastAPI()
 
@@ -12,27 +31,131 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TraceMiddleware)
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+# Liveness: the process is up and its event loop answers
+@app.get("/healthz")
+async def healthz():
+    return lifecycle.liveness()
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+# Readiness: Mongo, the matcher and mail can do their work; 503 until then
+@app.get("/readyz")
+async def readyz():
+    report = await lifecycle.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+# Unread badge counts; gateway sockets also get them pushed on every change.
+# The caller is taken from the Firebase token, else from ?user_id (uid);
+# clients that send neither keep getting the same shape, with zero counts
 @app.get("/get/notifications")
-async def get_notifications():
-    return {"notifications": 5, "messages": 1}
+async def get_notifications(user_id: Optional[str] = Query(None), authorization: Optional[str] = Header(None)):
+    if authorization:
+        user_id = (await get_current_user(authorization))["uid"]
+    if not user_id:
+        return counts_of(None)
+    return await unread.get(user_id)
 
 app.include_router(user.router, prefix="/test")
 app.include_router(post.router)
 app.include_router(ws.router)
 app.include_router(chat.router)
+app.include_router(gateway.router)
+app.include_router(notifications.router)
+app.include_router(jobs_router.router)
+app.include_router(debug.router)
+
+if IMAGE_STORE == "local":
+    os.makedirs(IMAGE_LOCAL_DIR, exist_ok=True)
+    app.mount(IMAGE_LOCAL_URL, StaticFiles(directory=IMAGE_LOCAL_DIR), name="media")
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(start_background())
+    # Nothing here waits on the network, so the app serves right away;
+    # Mongo, keys and the matcher come up in boot() and show in /readyz
+    loop_monitor.start()
+    jobs.start()
+    mail_worker.start()
+    verifier.start()
+    asyncio.create_task(boot())
+    lifecycle.mark_serving()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await jobs.stop()
+    await verifier.stop()
+    await receipts.flush()
+    await mail_worker.stop()
+    await backplane.stop()
+    await loop_monitor.stop()
+
+
+async def wait_for_mongo():
+    delay = 0.5
+    while True:
+        try:
+            await mongodb.db.command("ping")
+            return
+        except Exception as e:
+            print(f"Waiting for MongoDB: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10)
+
+
+async def start_matcher():
+    asyncio.create_task(watch_posts_collection())
+    # Also picks up anything left unmatched when the previous process stopped
+    await schedule_matching()
+    await schedule_reconcile()
+
+
+async def boot():
+    async def database():
+        await lifecycle.phase("mongo", wait_for_mongo())
+        await lifecycle.phase("indexes", ensure_indexes())
+        await lifecycle.phase("matcher", start_matcher())
+
+    await asyncio.gather(
+        database(),
+        lifecycle.phase("backplane", backplane.start()),
+        lifecycle.phase("auth_keys", verifier.refresh_keys()),
+    )
+    print(lifecycle.report())
+
+
+# ------------------- Readiness checks -------------------
+
+async def mongo_ready():
+    await mongodb.db.command("ping")
+    return True, "ping ok"
+
+async def matcher_ready():
+    if not lifecycle.phase_ok("matcher"):
+        return False, "starting"
+    if not jobs.running:
+        return False, "job worker stopped"
+    if matcher.name == "gemini" and not gemini_client.configured:
+        return False, "Gemini API key not set"
+    return True, f"{matcher.name} matcher"
 
+async def mail_ready():
+    if not mail_worker.running:
+        return False, "mail worker stopped"
+    if not mail_worker.configured:
+        return False, "SMTP credentials not set"
+    return True, "worker running"
 
-async def start_background():
-    await asyncio.sleep(30)
-    await break_posts_collection()
-    asyncio.create_task(monitor_found_collection())
+lifecycle.register_check("mongo", mongo_ready)
+lifecycle.register_check("matcher", matcher_ready)
+lifecycle.register_check("mail", mail_ready)
@@ -0,0 +1,88 @@
+from typing import AsyncIterator, Callable, Iterable, Optional, Union
+
+import orjson
+from fastapi.responses import Response, StreamingResponse
+
+# Public post fields; also the Mongo projection, so nothing else is fetched
+POST_FIELDS = (
+    "types", "title", "description", "images", "image_variants", "user", "post_number",
+    "location", "tags", "created_at", "is_solved",
+)
+POST_PROJECTION = {field: 1 for field in POST_FIELDS}
+
+# Posts encoded per chunk of a streamed list
+STREAM_CHUNK = 100
+
+
+def serialize_post(post: dict) -> dict:
+    """
+    The one public shape of a post. created_at stays a datetime; orjson
+    writes it in the same ISO format isoformat() produced.
+    """
+    return {
+        "id": str(post["_id"]),
+        "types": post["types"],
+        "title": post["title"],
+        "description": post.get("description", ""),
+        "images": post.get("images", []),
+        "image_variants": post.get("image_variants", []),
+        "user": post["user"],
+        "post_number": post.get("post_number", ""),
+        "location": post.get("location", {}),
+        "tags": post.get("tags", []),
+        "created_at": post["created_at"],
+        "is_solved": post.get("is_solved", False),
+    }
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=str)
+
+
+def json_response(data, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    Encode once with orjson instead of FastAPI's jsonable_encoder + json.dumps.
+    Already encoded bodies (e.g. from a cache) are sent as they are.
+    """
+    body = data if isinstance(data, bytes) else dumps(data)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+async def _json_array(docs: Union[Iterable, AsyncIterator], serialize: Callable):
+    yield b"["
+    chunk = []
+    first = True
+
+    def flush():
+        nonlocal first
+        body = dumps([serialize(doc) for doc in chunk])[1:-1]
+        chunk.clear()
+        if not first:
+            body = b"," + body
+        first = False
+        return body
+
+    if hasattr(docs, "__aiter__"):
+        async for doc in docs:
+            chunk.append(doc)
+            if len(chunk) >= STREAM_CHUNK:
+                yield flush()
+    else:
+        for doc in docs:
+            chunk.append(doc)
+            if len(chunk) >= STREAM_CHUNK:
+                yield flush()
+
+    if chunk:
+        yield flush()
+    yield b"]"
+
+
+def stream_json_list(docs: Union[Iterable, AsyncIterator], serialize: Callable = serialize_post,
+                     headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Stream a JSON array, encoding STREAM_CHUNK documents at a time. `docs`
+    may be a list or a live Mongo cursor, so long lists are never held
+    in memory as one encoded body.
+    """
+    return StreamingResponse(_json_array(docs, serialize), headers=headers, media_type="application/json")
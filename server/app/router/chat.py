@@ -1,4 +1,4 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime
@@ -7,6 +7,10 @@ from bson import ObjectId
 
 # Assume you have your MongoDB client setup somewhere accessible
 from db.mongodb import messages_collection  # Your messages collection
+from cure.realtime import hub
+from cure import conversations
+from cure.unread import unread
+from cure.receipts import receipts
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
@@ -41,27 +45,31 @@ class MessageResponse(BaseModel):
     delivered_at: Optional[datetime] = None
     seen_at: Optional[datetime] = None
 
+class InboxEntry(MessageResponse):
+    """Last message of a conversation, with the caller's unread count."""
+    conversation_id: str
+    unread: int = 0
+
 
 # ----------------------------
 # WebSocket Connection Manager
 # ----------------------------
 
 class ConnectionManager:
+    """Chat channel of the realtime hub."""
+
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections = hub.legacy["chat"]
 
     async def connect(self, uid: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[uid] = websocket
+        await hub.connect_legacy("chat", websocket, uid)
 
-    def disconnect(self, uid: str):
-        if uid in self.active_connections:
-            self.active_connections.pop(uid)
+    def disconnect(self, uid: str, websocket: WebSocket):
+        hub.disconnect_legacy("chat", websocket, uid)
 
     async def send_personal_message(self, uid: str, message: dict):
-        websocket = self.active_connections.get(uid)
-        if websocket:
-            await websocket.send_json(message)
+        # Reaches the user's chat and gateway sockets in any process
+        await hub.publish("chat", uid, message)
 
 manager = ConnectionManager()
 
@@ -77,7 +85,7 @@ async def websocket_endpoint(websocket: WebSocket, uid: str):
             # Keep connection alive, receive pings or messages (ignored here)
             await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(uid)
+        manager.disconnect(uid, websocket)
 
 
 # ----------------------------
@@ -95,12 +103,15 @@ async def send_message(payload: MessageCreate):
     })
 
     result = await messages_collection.insert_one(data)
+    await conversations.record_message(data)
+    await unread.add(payload.receiver.uid, "messages", 1)
 
     # Send real-time notification to receiver
     await manager.send_personal_message(
         payload.receiver.uid,
         {
             "type": "new_message",
+            "message_id": str(result.inserted_id),
             "post_id": payload.post_id,
             "message": payload.message,
             "sender": payload.sender.dict(),
@@ -117,57 +128,36 @@ async def send_message(payload: MessageCreate):
 
 @router.patch("/seen/{post_id}")
 async def mark_seen(post_id: str, user_uid: str = Query(...)):
-    update_result = await messages_collection.update_many(
-        {
-            "post_id": post_id,
-            "receiver.uid": user_uid,
-            "status": {"$ne": "seen"}
-        },
-        {
-            "$set": {
-                "status": "seen",
-                "seen_at": datetime.utcnow()
-            }
-        }
-    )
-
-    # Optionally, notify sender that messages are seen - implementation depends on your app design
-    # For now, just return success
-
-    return {"success": True, "updated_count": update_result.modified_count}
+    # Senders get one "receipts" push per conversation with the ids that were seen
+    updated = await receipts.mark_seen(post_id, user_uid)
+    return {"success": True, "updated_count": updated}
 
 
 # ----------------------------
 # Get inbox list (latest message per post)
 # ----------------------------
 
-@router.get("/inbox/{uid}", response_model=List[MessageResponse])
-async def get_inbox(uid: str):
-    pipeline = [
-        {
-            "$match": {
-                "$or": [
-                    {"sender.uid": uid},
-                    {"receiver.uid": uid}
-                ]
-            }
-        },
-        {"$sort": {"created_at": -1}},
-        {
-            "$group": {
-                "_id": "$post_id",
-                "last_message": {"$first": "$$ROOT"}
-            }
-        },
-        {"$replaceRoot": {"newRoot": "$last_message"}}
-    ]
-
-    cursor = messages_collection.aggregate(pipeline)
+@router.get("/inbox/{uid}", response_model=List[InboxEntry])
+async def get_inbox(uid: str, response: Response, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
+    """
+    Conversations of `uid`, most recently active first. Pass the
+    X-Next-Cursor header of a page as `cursor` to get the next one.
+    """
+    try:
+        docs, token = await conversations.inbox_page(uid, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if token:
+        response.headers["X-Next-Cursor"] = token
+
     messages = []
-    async for doc in cursor:
-        # Convert ObjectId to string
-        doc["_id"] = str(doc["_id"])
-        messages.append(doc)
+    for doc in docs:
+        entry = dict(doc["last_message"])
+        entry["_id"] = str(entry["_id"])
+        entry["conversation_id"] = str(doc["_id"])
+        entry["unread"] = doc.get("unread", {}).get(uid, 0)
+        messages.append(entry)
 
     return messages
 
@@ -178,32 +168,46 @@ async def get_inbox(uid: str):
 
 @router.get("/unread-count/{uid}")
 async def get_unread_count(uid: str):
-    count = await messages_collection.count_documents({
-        "receiver.uid": uid,
-        "status": {"$ne": "seen"}
-    })
-
-    return {"count": count}
+    # Kept for old clients; gateway sockets get the count pushed on the "unread" channel
+    counts = await unread.get(uid)
+    return {"count": counts["messages"]}
 
-# Add this endpoint to your backend router
+# ----------------------------
+# Chat history, one window at a time
+# ----------------------------
 
 @router.get("")
-async def get_messages(post_id: str = Query(...), user_uid: str = Query(...)):
+async def get_messages(
+    post_id: str = Query(...),
+    user_uid: str = Query(...),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+):
     """
-    Get all messages for a specific post and user.
+    Messages for a specific post and user, oldest first.
+
+    Without `before`/`since` this is the latest `limit` messages; pass the
+    id of the oldest one shown as `before` to load the window above it.
+    `since` returns what arrived after a message id, for a client that
+    reconnects. `has_more` says whether another window exists in that
+    direction.
     """
-    cursor = messages_collection.find({
-        "post_id": post_id,
-        "$or": [
-            {"sender.uid": user_uid},
-            {"receiver.uid": user_uid}
-        ]
-    }).sort("created_at", 1)
-    
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
+
+    try:
+        if since:
+            docs, has_more = await conversations.history_since(post_id, user_uid, since, limit)
+        else:
+            docs, has_more = await conversations.history_window(post_id, user_uid, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     messages = []
-    async for doc in cursor:
+    for doc in docs:
         # Convert ObjectId to string
         doc["_id"] = str(doc["_id"])
         messages.append(doc)
-    
-    return {"messages": messages}
\ No newline at end of file
+
+    return {"messages": messages, "has_more": has_more}
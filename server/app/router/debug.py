@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from auth import require_admin
+from cure.profiling import profiler, ProfilerBusy, slow_requests, loop_monitor, PROFILE_MAX_SECONDS
+
+router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(require_admin)])
+
+
+# Samples this worker for `seconds` and answers with collapsed stacks:
+#   curl -X POST -H "Authorization: Bearer $TOKEN" ".../debug/profile?seconds=15" | flamegraph.pl > out.svg
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    all_threads: bool = False,
+    idle: bool = False,
+):
+    try:
+        result = await profiler.profile(seconds, interval_ms / 1000, all_threads=all_threads, idle=idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        result["collapsed"],
+        headers={"X-Profile-Samples": str(result["samples"]), "X-Profile-Seconds": str(result["seconds"])},
+    )
+
+
+# Slowest of the recently captured requests, each with the Mongo commands it issued
+@router.get("/slow-requests")
+async def get_slow_requests(limit: int = Query(20, ge=1, le=100)):
+    return {**slow_requests.stats(), "requests": slow_requests.slowest(limit)}
+
+
+# Event loop lag and the stacks of recent synchronous calls that blocked it
+@router.get("/loop")
+async def get_loop(limit: int = Query(20, ge=1, le=100)):
+    return {**loop_monitor.stats(), "blocks": loop_monitor.recent_blocks(limit)}
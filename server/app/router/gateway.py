@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, WebSocket
+from auth import require_admin
+from cure.realtime import hub
+from cure.receipts import receipts
+
+router = APIRouter()
+
+# One socket per client for notifications, chat, receipts, presence and unread counts.
+# Frames are {"c": channel, "t": type, "d": data}; send {"c": "sys", "t": "ping"}
+# at least every WS_IDLE_TIMEOUT seconds to stay connected.
+@router.websocket("/gateway/{uid}")
+async def gateway_endpoint(websocket: WebSocket, uid: str):
+    await hub.serve_gateway(websocket, uid)
+
+
+@router.get("/gateway/stats", dependencies=[Depends(require_admin)])
+async def gateway_stats():
+    return {**hub.stats(), "receipts": receipts.stats()}
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+from auth import require_admin
+from cure.jobs import jobs
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+# Queue depth per kind and status, wait/run latency of recent jobs
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def job_stats():
+    return await jobs.stats()
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from db.mongodb import notifications_collection
+from cure.unread import unread
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+
+@router.get("/{user_id}")
+async def get_notifications(user_id: str, unread_only: bool = False, limit: int = Query(20, ge=1, le=100)):
+    query = {"user_id": user_id}
+    if unread_only:
+        query["read"] = False
+
+    notifications = []
+    async for n in notifications_collection.find(query).sort("created_at", -1).limit(limit):
+        n["_id"] = str(n["_id"])
+        notifications.append(n)
+    return {"notifications": notifications}
+
+
+# Declared before /{notification_id}/read so "read-all" is not taken for an id
+@router.patch("/read-all/{user_id}")
+async def mark_all_read(user_id: str):
+    result = await notifications_collection.update_many(
+        {"user_id": user_id, "read": False},
+        {"$set": {"read": True, "read_at": datetime.utcnow()}},
+    )
+    await unread.add(user_id, "notifications", -result.modified_count)
+    return {"success": True, "updated_count": result.modified_count}
+
+
+@router.patch("/{notification_id}/read")
+async def mark_read(notification_id: str, user_id: str = Query(...)):
+    if not ObjectId.is_valid(notification_id):
+        raise HTTPException(status_code=400, detail="Invalid notification id")
+
+    result = await notifications_collection.update_one(
+        {"_id": ObjectId(notification_id), "user_id": user_id, "read": False},
+        {"$set": {"read": True, "read_at": datetime.utcnow()}},
+    )
+    await unread.add(user_id, "notifications", -result.modified_count)
+    return {"success": True, "updated_count": result.modified_count}
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, File, Form, UploadFile, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, status
 from typing import List, Literal, Optional
 from datetime import datetime
 from bson import ObjectId
-from db.mongodb import posts_collection
-import cloudinary.uploader
+from db.mongodb import posts_collection, lost_collection, found_collection
+from db.pagination import FEED_SORT, after_cursor, next_cursor, page_size
+from model.serializers import POST_PROJECTION, serialize_post, dumps, json_response, stream_json_list
+from cure.post_cache import post_cache
+from cure.images import InvalidImage, ingest_images
 from model.post import PostCreateModel, PostResponseModel
-from ai.brack import break_posts_collection
+from ai.ai import forget_post
+from auth import require_admin
 import asyncio
 from fastapi import BackgroundTasks
 
@@ -16,17 +20,6 @@ MAX_IMAGES = 5
 ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp"}
 
 
-# ------------------- Cloudinary -------------------
-
-def upload_to_cloudinary(file: UploadFile) -> str:
-    result = cloudinary.uploader.upload(
-        file.file,
-        folder="posts",
-        resource_type="image",
-    )
-    return result["secure_url"]
-
-
 # ------------------- CREATE POST -------------------
 
 @router.post("/create", status_code=status.HTTP_201_CREATED)
@@ -53,7 +46,9 @@ async def create_post(
     tags: str = Form(""),
     images: List[UploadFile] = File(default=[]),
 ):
-    image_urls = []
+    post_id = ObjectId()
+    inserted_id = str(post_id)
+    image_variants = []
 
     if images:
         if len(images) > MAX_IMAGES:
@@ -63,13 +58,20 @@ async def create_post(
             if img.content_type not in ALLOWED_TYPES:
                 raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid image type")
 
-            image_urls.append(upload_to_cloudinary(img))
+        # Downscaled, EXIF-stripped variants, processed and uploaded in parallel off the loop
+        uploads = [await img.read() for img in images]
+        try:
+            image_variants = await ingest_images(uploads, prefix=inserted_id)
+        except InvalidImage as e:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
 
     post_doc = {
         "types": types,
         "title": title.strip(),
         "description": description.strip(),
-        "images": image_urls,
+        # The feed only ever loads feed-size images; thumb/full are per image in image_variants
+        "images": [v["feed"] for v in image_variants],
+        "image_variants": image_variants,
         "user": {
             "uid": user_uid,
             "email": user_email,
@@ -87,18 +89,14 @@ async def create_post(
         "is_solved": False,
     }
 
-    # Insert post
-    result = await posts_collection.insert_one(post_doc)
-    inserted_id = str(result.inserted_id)
+    # Insert post with its readable `id` in a single write.
+    # The posts watcher (ai.brack.watch_posts_collection) splits it
+    # into lost/found and triggers matching.
+    post_doc["_id"] = post_id
+    post_doc["id"] = inserted_id
 
-    # ✅ Add readable `id` field
-    await posts_collection.update_one(
-        {"_id": result.inserted_id},
-        {"$set": {"id": inserted_id}}
-    )
-
-    # Re-run matcher / breaker
-    await break_posts_collection()
+    await posts_collection.insert_one(post_doc)
+    await post_cache.invalidate(post_doc)
 
     # 🔐 SAFE RESPONSE
     return {
@@ -108,30 +106,104 @@ async def create_post(
     }
 
 
+# ------------------- FEED FILTERS -------------------
+
+def post_filters(
+    types: Optional[Literal["lost", "found"]] = None,
+    is_solved: Optional[bool] = None,
+    tag: Optional[str] = None,
+    area: Optional[str] = None,
+) -> dict:
+    query = {}
+    if types:
+        query["types"] = types
+    if is_solved is not None:
+        query["is_solved"] = is_solved
+    if tag:
+        query["tags"] = tag.strip().lower()
+    if area:
+        query["location.area"] = area
+    return query
+
+
+async def fetch_page(query: dict, page: int, limit: int, cursor: Optional[str]):
+    """
+    One feed page in (created_at, _id) order and the cursor of the page
+    after it. `cursor` (the X-Next-Cursor header of the previous page)
+    seeks directly to the next page; without it the old page/limit offset
+    is used. The body stays a plain list.
+    """
+    if cursor:
+        try:
+            query = after_cursor(query, cursor)
+        except ValueError:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+        skip = 0
+    else:
+        skip = (max(page, 1) - 1) * limit
+
+    docs = await posts_collection.find(query, POST_PROJECTION).sort(FEED_SORT).skip(skip).limit(limit).to_list(length=limit)
+    return docs, next_cursor(docs, limit)
+
+
+def page_response(docs: list, token: Optional[str]):
+    return stream_json_list(docs, serialize_post, headers={"X-Next-Cursor": token} if token else None)
+
+
+async def cached_page(query: dict, page: int, limit: int):
+    """First feed pages come from post_cache as ready-encoded bodies."""
+    async def load():
+        docs, token = await fetch_page(query, page, limit, None)
+        return dumps([serialize_post(doc) for doc in docs]), token
+
+    body, token = await post_cache.get_feed(query, page, limit, load)
+    return json_response(body, headers={"X-Next-Cursor": token} if token else None)
+
+
 # ------------------- GET ALL POSTS -------------------
 
 @router.get("/get_all")
-async def get_all_posts(page: int = 1, limit: int = 10):
-    skip = (page - 1) * limit
-    posts = []
-    cursor = posts_collection.find().sort("created_at", -1).skip(skip).limit(limit)
-
-    async for post in cursor:
-        posts.append({
-            "id": str(post["_id"]),
-            "types": post["types"],
-            "title": post["title"],
-            "description": post["description"],
-            "images": post["images"],
-            "user": post["user"],
-            "post_number": post["post_number"],
-            "location": post["location"],
-            "tags": post["tags"],
-            "created_at": post["created_at"].isoformat(),
-            "is_solved": post["is_solved"],
-        })
-
-    return posts
+async def get_all_posts(
+    page: int = 1,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    types: Optional[Literal["lost", "found"]] = None,
+    is_solved: Optional[bool] = None,
+    tag: Optional[str] = None,
+    area: Optional[str] = None,
+):
+    query = post_filters(types, is_solved, tag, area)
+    limit = page_size(limit)
+    if not cursor:
+        return await cached_page(query, max(page, 1), limit)
+    return page_response(*await fetch_page(query, page, limit, cursor))
+
+
+# ------------------- SEARCH POSTS -------------------
+# Declared before /{post_id} so "search" is not taken for a post id
+
+@router.get("/search")
+async def search_posts(
+    query: str,
+    page: int = 1,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    types: Optional[Literal["lost", "found"]] = None,
+    is_solved: Optional[bool] = None,
+    tag: Optional[str] = None,
+    area: Optional[str] = None,
+):
+    filters = post_filters(types, is_solved, tag, area)
+    filters["$text"] = {"$search": query}
+    limit = page_size(limit)
+    return page_response(*await fetch_page(filters, page, limit, cursor))
+
+
+# ------------------- CACHE STATS -------------------
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def cache_stats():
+    return post_cache.stats()
 
 
 # ------------------- GET SINGLE POST -------------------
@@ -139,101 +211,78 @@ async def get_all_posts(page: int = 1, limit: int = 10):
 @router.get("/{post_id}")
 async def get_post(post_id: str):
     try:
-        post = await posts_collection.find_one({"_id": ObjectId(post_id)})
+        _id = ObjectId(post_id)
     except Exception:
         raise HTTPException(400, "Invalid post ID")
 
-    if not post:
+    async def load():
+        post = await posts_collection.find_one({"_id": _id}, POST_PROJECTION)
+        return dumps(serialize_post(post)) if post else None
+
+    body = await post_cache.get_post(post_id, load)
+    if body is None:
         raise HTTPException(404, "Post not found")
 
-    return {
-        "id": str(post["_id"]),
-        "types": post["types"],
-        "title": post["title"],
-        "description": post["description"],
-        "images": post["images"],
-        "user": post["user"],
-        "post_number": post["post_number"],
-        "location": post["location"],
-        "tags": post["tags"],
-        "created_at": post["created_at"].isoformat(),
-        "is_solved": post["is_solved"],
-    }
+    return json_response(body)
 
 # ------------------- MARK POST AS SOLVED -------------------
 @router.patch("/{post_id}/mark_solved", status_code=status.HTTP_204_NO_CONTENT)
 async def mark_post_as_solved(post_id: str):
     try:
-        result = await posts_collection.update_one(
+        post = await posts_collection.find_one_and_update(
             {"_id": ObjectId(post_id)},
-            {"$set": {"is_solved": True}}
+            {"$set": {"is_solved": True}},
+            projection=POST_PROJECTION,
         )
     except Exception:
         raise HTTPException(400, "Invalid post ID")
 
-    if result.matched_count == 0:
+    if post is None:
         raise HTTPException(404, "Post not found")
 
+    # The post leaves the unsolved feeds and joins the solved ones
+    await post_cache.invalidate(post, {**post, "is_solved": True})
+
+    # Solved posts drop out of the matching working set
+    for collection in (lost_collection, found_collection):
+        await collection.update_one({"id": post_id}, {"$set": {"is_solved": True}})
+    forget_post(post_id)
+
     return None
 
 # ------------------- DELETE POST -------------------
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(post_id: str):
     try:
-        result = await posts_collection.delete_one({"_id": ObjectId(post_id)})
+        post = await posts_collection.find_one_and_delete({"_id": ObjectId(post_id)}, projection=POST_PROJECTION)
     except Exception:
         raise HTTPException(400, "Invalid post ID") 
-    if result.deleted_count == 0:
+    if post is None:
         raise HTTPException(404, "Post not found")
-    return None
+    await post_cache.invalidate(post)
 
-# ------------------- SEARCH POSTS -------------------
-@router.get("/search")
-async def search_posts(
-    query: str,
-    page: int = 1,
-    limit: int = 10,
-):
-    skip = (page - 1) * limit
-    posts = []
-    cursor = posts_collection.find(
-        {"$text": {"$search": query}}
-    ).sort("created_at", -1).skip(skip).limit(limit)
-
-    async for post in cursor:
-        posts.append({ 
-            "id": str(post["_id"]),
-            "types": post["types"],
-            "title": post["title"],
-            "description": post["description"],
-            "images": post["images"],
-            "user": post["user"],
-            "post_number": post["post_number"],
-            "location": post["location"],
-            "tags": post["tags"],
-            "created_at": post["created_at"].isoformat(),
-            "is_solved": post["is_solved"],
-        })
-        
-    return posts
+    # Deleted posts leave the matching working set for good
+    for collection in (lost_collection, found_collection):
+        await collection.delete_one({"id": post_id})
+    forget_post(post_id)
+    return None
 
 @router.get("/user/{user_uid}", response_model=None)
 async def get_user_posts(user_uid: str):
-    cursor = posts_collection.find(
-        {"user.uid": user_uid}
-    ).sort("created_at", -1)
-
-    posts = []
-
-    async for post in cursor:
-        post["_id"] = str(post["_id"])
-        post["created_at"] = post["created_at"].isoformat()
-        posts.append(post)
+    cursor = aiter(posts_collection.find(
+        {"user.uid": user_uid}, POST_PROJECTION
+    ).sort("created_at", -1))
 
-    if not posts:
+    first = await anext(cursor, None)
+    if first is None:
         raise HTTPException(
             status_code=404,
             detail="No posts found for this user"
         )
-   
-    return posts
\ No newline at end of file
+
+    async def posts():
+        yield first
+        async for post in cursor:
+            yield post
+
+    return stream_json_list(posts())
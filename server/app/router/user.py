@@ -34,9 +34,9 @@ async def create_user(user: User):
     result = await users_collection.insert_one(user.dict())
     user_id = str(result.inserted_id)  # ✅ SINGLE SOURCE OF TRUTH
 
-    # SEND WELCOME NOTIFICATION (RELIABLE)
+    # SEND WELCOME NOTIFICATION (RELIABLE), keyed by Firebase uid like every notification
     await manager.send(
-        user_id,
+        user.uid,
         {
             "type": "notification",
             "title": "Welcome",
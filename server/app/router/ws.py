@@ -11,5 +11,5 @@ async def websocket_endpoint(websocket: WebSocket, userId: str):
         while True:
             await websocket.receive_text()  # keep alive
     except WebSocketDisconnect:
-        manager.disconnect(userId)
+        manager.disconnect(userId, websocket)
 